@@ -0,0 +1,142 @@
+# face_recog/embedders.py
+import os
+
+import cv2
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.path.join(PROJECT_ROOT, "model")
+
+# Entry lama (sebelum ada kolom face_model) semuanya dibuat dengan VGG-Face + detector opencv
+LEGACY_FACE_MODEL = "VGG-Face"
+
+# Pilih backend lewat environment, contoh: FACE_EMBEDDER=sface
+FACE_EMBEDDER = os.environ.get("FACE_EMBEDDER", "vgg-face")
+
+
+class FaceEmbedder:
+    """Interface embedder wajah. Input: crop wajah BGR (sudah dilokalisasi YOLO)."""
+
+    model_id = None
+    dim = None
+    threshold = 0.5  # batas cosine similarity untuk dianggap wajah yang sama
+
+    def embed(self, face_bgr):
+        raise NotImplementedError
+
+
+class DeepFaceEmbedder(FaceEmbedder):
+    """
+    Model dari DeepFace (VGG-Face, SFace, Facenet, ...).
+    detector_backend="skip": crop sudah dari YOLO, tidak perlu deteksi wajah kedua.
+    Alignment & crop berbeda dari pipeline lama (detector opencv pada file), jadi vektornya
+    tidak sebanding dengan entry lama -> model_id diberi akhiran detector ("VGG-Face/skip"),
+    dan match_face tidak mencampurnya dengan entry LEGACY_FACE_MODEL.
+    """
+
+    def __init__(self, model_name, threshold=0.5, detector_backend="skip"):
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        self.model_id = f"{model_name}/{detector_backend}"
+        self.threshold = threshold
+
+    def embed(self, face_bgr):
+        from deepface import DeepFace
+
+        embedding_objs = DeepFace.represent(
+            img_path=face_bgr,
+            model_name=self.model_name,
+            detector_backend=self.detector_backend,
+            enforce_detection=False
+        )
+        if not embedding_objs:
+            return None
+
+        embedding = embedding_objs[0]["embedding"]
+        self.dim = len(embedding)
+        return embedding
+
+
+class LegacyVGGFaceEmbedder(DeepFaceEmbedder):
+    """
+    Pipeline lama untuk entry LEGACY_FACE_MODEL (face_model NULL): VGG-Face dengan detector
+    opencv pada file JPEG hasil preprocessing. Round-trip JPEG dilakukan di memori (kualitas
+    default cv2.imwrite), jadi input model sama dengan yang dulu dibaca dari file.
+    Hanya dipakai lane keluar untuk mencocokkan kendaraan yang masuk sebelum upgrade.
+    """
+
+    def __init__(self, threshold=0.5):
+        super().__init__("VGG-Face", threshold=threshold, detector_backend="opencv")
+        self.model_id = LEGACY_FACE_MODEL
+
+    def embed(self, face_bgr):
+        ok, jpeg = cv2.imencode(".jpg", face_bgr)
+        if not ok:
+            return None
+        return super().embed(cv2.imdecode(jpeg, cv2.IMREAD_COLOR))
+
+
+class OnnxArcFaceEmbedder(FaceEmbedder):
+    """ArcFace ONNX (mis. insightface w600k_r50) lewat onnxruntime CPU."""
+
+    def __init__(self, model_path=os.path.join(MODEL_DIR, "arcface.onnx"),
+                 model_id="ArcFace-onnx", threshold=0.35, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.model_id = model_id
+        self.threshold = threshold
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input = self.session.get_inputs()[0]
+        # NCHW [1, 3, 112, 112] atau NHWC [1, 112, 112, 3]
+        self.channels_first = self.input.shape[1] == 3
+        self.dim = self.session.get_outputs()[0].shape[-1]
+
+    def embed(self, face_bgr):
+        face = cv2.resize(face_bgr, (112, 112))
+        face = cv2.cvtColor(face, cv2.COLOR_BGR2RGB).astype(np.float32)
+        face = (face - 127.5) / 127.5
+        if self.channels_first:
+            face = face.transpose(2, 0, 1)
+
+        embedding = self.session.run(None, {self.input.name: face[np.newaxis]})[0][0]
+        embedding = embedding / (np.linalg.norm(embedding) + 1e-12)
+        return embedding.astype(float).tolist()
+
+
+# Threshold bawaan per model; hasil kalibrasi (face_recog/thresholds.json) diutamakan
+DEFAULT_THRESHOLDS = {"VGG-Face": 0.5, "VGG-Face/skip": 0.5, "SFace/skip": 0.4, "ArcFace-onnx": 0.35}
+
+EMBEDDERS = {
+    "vgg-face": lambda: DeepFaceEmbedder("VGG-Face", threshold=DEFAULT_THRESHOLDS["VGG-Face/skip"]),
+    "sface": lambda: DeepFaceEmbedder("SFace", threshold=DEFAULT_THRESHOLDS["SFace/skip"]),
+    "arcface-onnx": lambda: OnnxArcFaceEmbedder(threshold=DEFAULT_THRESHOLDS["ArcFace-onnx"]),
+}
+
+_embedder = None
+_legacy_embedder = None
+
+
+def get_embedder(name=None):
+    """Embedder aktif (dibuat sekali per proses)."""
+    global _embedder
+
+    if name is not None:
+        return EMBEDDERS[name]()
+
+    if _embedder is None:
+        _embedder = EMBEDDERS[FACE_EMBEDDER]()
+        print(f"✅ Face embedder: {_embedder.model_id}")
+    return _embedder
+
+
+def get_legacy_embedder():
+    """Embedder untuk entry lama (LEGACY_FACE_MODEL), dibuat saat pertama dibutuhkan."""
+    global _legacy_embedder
+
+    if _legacy_embedder is None:
+        _legacy_embedder = LegacyVGGFaceEmbedder(threshold=DEFAULT_THRESHOLDS[LEGACY_FACE_MODEL])
+    return _legacy_embedder
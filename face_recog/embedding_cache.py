@@ -0,0 +1,69 @@
+# face_recog/embedding_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class EmbeddingCache:
+    """
+    Cache LRU + TTL untuk face embedding, key = (model, content_hash crop wajah).
+    Hanya crop yang persis sama (retry, file diproses ulang) yang memakai embedding dari cache:
+    di gate verifikasi wajah, embedding orang lain dari crop yang "mirip" bisa membuka palang
+    untuk orang yang salah, jadi tidak ada pencocokan hash yang toleran.
+    """
+
+    def __init__(self, max_size=256, ttl_s=600):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (model, hash) -> (created_at, embedding), urut LRU
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def _purge_expired(self, now):
+        """Buang entry kedaluwarsa (dipanggil dengan lock). created_at tidak urut LRU -> scan penuh."""
+        stale = [key for key, (created_at, _) in self._entries.items() if now - created_at > self.ttl_s]
+        for key in stale:
+            del self._entries[key]
+        self.expired += len(stale)
+
+    def get(self, model, crop_hash):
+        now = time.time()
+        with self._lock:
+            item = self._entries.get((model, crop_hash))
+            if item is not None and now - item[0] > self.ttl_s:
+                self._purge_expired(now)
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end((model, crop_hash))
+            self.hits += 1
+            return list(item[1])
+
+    def put(self, model, crop_hash, embedding):
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            self._entries[(model, crop_hash)] = (now, list(embedding))
+            self._entries.move_to_end((model, crop_hash))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired
+        }
+
+
+embedding_cache = EmbeddingCache()
@@ -1,10 +1,13 @@
 # face_recog/main.py
-from deepface import DeepFace
 import cv2
 import numpy as np
 import uuid
 import os
 from utils.loading import LoadingAnimation
+from face_recog.embedding_cache import embedding_cache
+from utils.image_hash import content_hash
+from face_recog.embedders import get_embedder
+from utils.priority import submit_background
 
 def get_project_root():
     return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -34,7 +37,13 @@ def preprocess_face_manual(face_image):
     # 4. Convert back to BGR
     result = cv2.cvtColor(blurred, cv2.COLOR_GRAY2BGR)
     
-    # BUAT GRID DENGAN SEMUA PROSES
+    # BUAT GRID DENGAN SEMUA PROSES + SIMPAN (kelas background, tidak menahan embedding)
+    submit_background(save_preprocessing_grid, original_image, gray, equalized, blurred, result)
+    
+    loading.stop("Preprocessing wajah selesai")
+    return result
+
+def save_preprocessing_grid(original_image, gray, equalized, blurred, result):
     grid_image = create_preprocessing_grid(original_image, gray, equalized, blurred, result)
     
     # SIMPAN GRID
@@ -49,9 +58,6 @@ def preprocess_face_manual(face_image):
     grid_filename = f"preproc_grid_{face_uuid}.jpg"
     grid_path = os.path.join(grid_dir, grid_filename)
     cv2.imwrite(grid_path, grid_image)
-    
-    loading.stop("Preprocessing wajah selesai")
-    return result
 
 def create_preprocessing_grid(original, gray, equalized, blurred, final):
     """Membuat grid gambar dengan semua tahap preprocessing"""
@@ -97,19 +103,32 @@ def create_preprocessing_grid(original, gray, equalized, blurred, final):
     
     return grid
 
-def generate_face_encoding(face_image_path):
-    """Generate face encoding dengan preprocessing manual"""
+def generate_face_encoding(face_image, embedder=None):
+    """Generate face encoding dengan preprocessing manual.
+    face_image: path file crop wajah, atau crop array BGR langsung dari Detections
+    embedder: default embedder aktif; lane keluar memberi get_legacy_embedder() untuk entry lama
+    """
     try:
         loading = LoadingAnimation("Membaca gambar wajah")
         loading.start()
         
         # Baca gambar wajah asli
-        original_face = cv2.imread(face_image_path)
+        from_array = isinstance(face_image, np.ndarray)
+        original_face = face_image if from_array else cv2.imread(face_image)
         if original_face is None:
             loading.stop("❌ Gagal membaca gambar wajah")
             return None
         
         loading.stop("✅ Gambar wajah terbaca")
+
+        embedder = embedder or get_embedder()
+
+        # Crop persis sama (retry, file diproses ulang) -> pakai embedding dari cache
+        face_hash = content_hash(original_face)
+        cached = embedding_cache.get(embedder.model_id, face_hash)
+        if cached is not None:
+            print(f"✅ Face encoding dari cache ({len(cached)} dimensi) {embedding_cache.stats()}")
+            return cached
         
         # PREPROCESSING MANUAL (sekarang otomatis menyimpan grid)
         preprocessed_face = preprocess_face_manual(original_face)
@@ -119,30 +138,29 @@ def generate_face_encoding(face_image_path):
         preprocessed_dir = os.path.join(root_dir, "face_recog", "img")
         os.makedirs(preprocessed_dir, exist_ok=True)
         
-        # Extract UUID dari filename asli
-        original_filename = os.path.basename(face_image_path)
-        face_uuid = original_filename.replace("face_", "").replace(".jpg", "")
+        # Extract UUID dari filename asli (crop array -> UUID baru)
+        if from_array:
+            face_uuid = str(uuid.uuid4())
+        else:
+            original_filename = os.path.basename(face_image)
+            face_uuid = original_filename.replace("face_", "").replace(".jpg", "")
         
         # Generate filename preprocessing
         preprocessed_filename = f"preproc_face_{face_uuid}.jpg"
         preprocessed_path = os.path.join(preprocessed_dir, preprocessed_filename)
         
-        cv2.imwrite(preprocessed_path, preprocessed_face)
+        submit_background(cv2.imwrite, preprocessed_path, preprocessed_face)
         
         # Generate encoding
         loading = LoadingAnimation("Generating face encoding")
         loading.start()
         
-        embedding_objs = DeepFace.represent(
-            img_path=preprocessed_path,
-            model_name="VGG-Face",
-            detector_backend="opencv",
-            enforce_detection=False
-        )
+        # Crop sudah dari YOLO -> langsung embed array, tanpa deteksi wajah ulang
+        face_encoding = embedder.embed(preprocessed_face)
         
-        if embedding_objs:
-            face_encoding = embedding_objs[0]["embedding"]
-            loading.stop(f"✅ Face encoding berhasil ({len(face_encoding)} dimensi)")
+        if face_encoding is not None:
+            embedding_cache.put(embedder.model_id, face_hash, face_encoding)
+            loading.stop(f"✅ Face encoding berhasil ({embedder.model_id}, {len(face_encoding)} dimensi)")
             return face_encoding
         else:
             loading.stop("❌ Tidak ada encoding yang dihasilkan")
@@ -152,12 +170,16 @@ def generate_face_encoding(face_image_path):
         print(f"\r❌ Error: {e}")
         return None
 
-def process_face_recognition(face_crop_path):
-    """Pure face recognition process"""
+def current_face_model():
+    """Model id embedder aktif, disimpan bersama face_vector di database."""
+    return get_embedder().model_id
+
+def process_face_recognition(face_crop, embedder=None):
+    """Pure face recognition process (face_crop: path atau array BGR)"""
     print("\n🎭 FACE RECOGNITION")
     print("=" * 30)
     
-    face_encoding = generate_face_encoding(face_crop_path)
+    face_encoding = generate_face_encoding(face_crop, embedder)
     
     if face_encoding is not None:
         return face_encoding
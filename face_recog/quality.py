@@ -0,0 +1,140 @@
+# face_recog/quality.py
+# Pemilihan wajah terbaik + quality gate sebelum embedding.
+#
+# Deteksi bisa berisi beberapa wajah (penumpang, orang di belakang, crop blur).
+# Semua wajah diberi skor dari ukuran, posisi terhadap ROI sisi pengemudi, confidence
+# detektor, ketajaman (variance Laplacian) dan pose (simetri kiri-kanan). Wajah di bawah
+# batas minimal tidak di-embed sama sekali (hemat panggilan model, tidak ada vektor jelek di DB).
+import os
+
+import cv2
+import numpy as np
+
+from utils.detections import FACE_CLS
+
+# ROI sisi pengemudi per lane (relatif ke frame). Default seluruh frame;
+# contoh setir kanan, kamera dari depan: DRIVER_ROI_IN="0.0,0.0,0.5,1.0"
+DEFAULT_DRIVER_ROIS = {
+    "in": (0.0, 0.0, 1.0, 1.0),
+    "out": (0.0, 0.0, 1.0, 1.0),
+}
+
+FACE_MIN_SIZE = int(os.environ.get("FACE_MIN_SIZE", "40"))            # px, sisi terpendek box
+FACE_GOOD_SIZE = 112                                                   # px, skor ukuran penuh
+FACE_MIN_CONF = float(os.environ.get("FACE_MIN_CONF", "0.35"))
+FACE_MIN_SHARPNESS = float(os.environ.get("FACE_MIN_SHARPNESS", "30"))  # variance Laplacian @ 96 px
+FACE_GOOD_SHARPNESS = 150.0
+FACE_MIN_QUALITY = float(os.environ.get("FACE_MIN_QUALITY", "0.4"))    # skor gabungan 0..1
+
+QUALITY_SIZE = 96  # crop di-resize dulu agar sharpness / pose sebanding antar ukuran wajah
+
+# Bobot skor gabungan
+WEIGHTS = {"size": 0.3, "position": 0.2, "conf": 0.2, "sharpness": 0.2, "pose": 0.1}
+
+
+def driver_roi(lane):
+    env = os.environ.get(f"DRIVER_ROI_{lane.upper()}") if lane else None
+    if env:
+        return tuple(float(v) for v in env.split(","))
+    return DEFAULT_DRIVER_ROIS.get(lane, (0.0, 0.0, 1.0, 1.0))
+
+
+def crop_quality(crop):
+    """
+    Metrik murah satu crop wajah. Returns (sharpness, pose):
+      sharpness: variance Laplacian grayscale (rendah = blur / motion blur)
+      pose: 0..1, simetri kiri-kanan (1 = frontal, wajah menoleh -> turun)
+    """
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    gray = cv2.resize(gray, (QUALITY_SIZE, QUALITY_SIZE), interpolation=cv2.INTER_AREA)
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    half = QUALITY_SIZE // 2
+    left = gray[:, :half].astype(np.float32)
+    right = gray[:, half:][:, ::-1].astype(np.float32)
+    pose = 1.0 - float(np.abs(left - right).mean()) / 128.0
+    return sharpness, max(0.0, min(1.0, pose))
+
+
+def rank_faces(detections, lane=None):
+    """
+    Skor semua wajah di detections. Ukuran / posisi / confidence dihitung vektor dari array box;
+    sharpness & pose hanya untuk wajah yang lolos batas ukuran & confidence.
+    Returns list dict {index, score, size, position, conf, sharpness, pose, reject} urut skor.
+    """
+    data = detections.data
+    indices = np.nonzero(data["cls"] == FACE_CLS)[0]
+    if len(indices) == 0:
+        return []
+
+    faces = data[indices]
+    h, w = detections.frame.shape[:2]
+    bw = (faces["x2"] - faces["x1"]).astype(np.float32)
+    bh = (faces["y2"] - faces["y1"]).astype(np.float32)
+    side = np.minimum(bw, bh)
+    size_score = np.clip(side / FACE_GOOD_SIZE, 0.0, 1.0)
+
+    # Posisi: 1 kalau pusat box di ROI pengemudi, turun linear dengan jarak (relatif frame) di luar ROI
+    rx1, ry1, rx2, ry2 = driver_roi(lane)
+    cx = (faces["x1"] + faces["x2"]) / (2.0 * w)
+    cy = (faces["y1"] + faces["y2"]) / (2.0 * h)
+    dx = np.maximum(0.0, np.maximum(rx1 - cx, cx - rx2))
+    dy = np.maximum(0.0, np.maximum(ry1 - cy, cy - ry2))
+    position_score = np.clip(1.0 - 2.0 * np.hypot(dx, dy), 0.0, 1.0)
+
+    ranked = []
+    for n, i in enumerate(indices):
+        info = {
+            "index": int(i),
+            "size": int(side[n]),
+            "position": float(position_score[n]),
+            "conf": float(faces["conf"][n]),
+            "sharpness": 0.0,
+            "pose": 0.0,
+            "score": 0.0,
+            "reject": None
+        }
+        if side[n] < FACE_MIN_SIZE:
+            info["reject"] = "too_small"
+        elif info["conf"] < FACE_MIN_CONF:
+            info["reject"] = "low_conf"
+        elif info["position"] == 0.0:
+            info["reject"] = "outside_driver_roi"
+        else:
+            info["sharpness"], info["pose"] = crop_quality(detections.crop(i))
+            if info["sharpness"] < FACE_MIN_SHARPNESS:
+                info["reject"] = "blurry"
+
+        info["score"] = (WEIGHTS["size"] * float(size_score[n])
+                         + WEIGHTS["position"] * info["position"]
+                         + WEIGHTS["conf"] * info["conf"]
+                         + WEIGHTS["sharpness"] * min(1.0, info["sharpness"] / FACE_GOOD_SHARPNESS)
+                         + WEIGHTS["pose"] * info["pose"])
+        if info["reject"] is None and info["score"] < FACE_MIN_QUALITY:
+            info["reject"] = "low_quality"
+        ranked.append(info)
+
+    # Yang lolos dulu, lalu skor tertinggi
+    ranked.sort(key=lambda f: (f["reject"] is not None, -f["score"]))
+    return ranked
+
+
+def select_face(detections, lane=None):
+    """
+    Wajah terbaik yang lolos quality gate.
+    Returns (index atau None, info wajah terbaik atau None kalau tidak ada wajah sama sekali).
+    """
+    ranked = rank_faces(detections, lane)
+    if not ranked:
+        return None, None
+
+    best = ranked[0]
+    if best["reject"] is not None:
+        print(f"⚠️ Wajah ditolak quality gate ({best['reject']}: ukuran {best['size']} px, "
+              f"conf {best['conf']:.2f}, sharpness {best['sharpness']:.0f}, skor {best['score']:.2f})")
+        return None, best
+
+    if len(ranked) > 1:
+        print(f"👤 {len(ranked)} wajah terdeteksi, dipilih skor {best['score']:.2f} "
+              f"(ukuran {best['size']} px, posisi {best['position']:.2f})")
+    return best["index"], best
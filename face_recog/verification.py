@@ -0,0 +1,206 @@
+# face_recog/verification.py
+# Verifikasi wajah 1:N dengan NumPy float32 (pengganti sklearn cosine_similarity).
+#
+# - Vektor dinormalisasi sekali (saat masuk cache), cosine = satu dot product
+# - Satu entry boleh punya beberapa template wajah; skor per entry diagregasi
+# - Threshold per model dikalibrasi dari data berlabel (genuine / impostor):
+#
+#   python face_recog/verification.py --calibrate DIR [--target-far 0.001]
+#     DIR/<nama_orang>/*.jpg -> crop wajah per orang
+import argparse
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+THRESHOLDS_PATH = os.path.join(current_dir, "thresholds.json")
+# Agregasi skor multi-template: "max" (default), "mean", atau "top2" (rata-rata 2 terbaik)
+AGGREGATE = os.environ.get("FACE_AGGREGATE", "max")
+MAX_TEMPLATES = 5  # template per entry (yang lama dibuang lebih dulu)
+
+_thresholds = None
+
+
+def to_templates(face_vector):
+    """
+    face_vector dari DB: satu vektor [d] (format lama) atau list template [[d], [d], ...].
+    Returns matriks float32 [k, d] yang sudah dinormalisasi L2.
+    """
+    templates = np.asarray(face_vector, dtype=np.float32)
+    if templates.ndim == 1:
+        templates = templates[np.newaxis]
+    return templates / (np.linalg.norm(templates, axis=1, keepdims=True) + 1e-12)
+
+
+def append_template(face_vector, new_vector, max_templates=MAX_TEMPLATES):
+    """Tambah template ke face_vector (format DB). Returns list template (JSON-able)."""
+    templates = np.asarray(face_vector, dtype=float)
+    templates = [templates.tolist()] if templates.ndim == 1 else templates.tolist()
+    templates.append([float(v) for v in new_vector])
+    return templates[-max_templates:]
+
+
+def threshold_for(model_id):
+    """Threshold hasil kalibrasi (thresholds.json) kalau ada, kalau tidak default embedder."""
+    global _thresholds
+    if _thresholds is None:
+        try:
+            with open(THRESHOLDS_PATH) as f:
+                _thresholds = json.load(f)
+        except (OSError, ValueError):
+            _thresholds = {}
+
+    if model_id in _thresholds:
+        return float(_thresholds[model_id]["threshold"])
+
+    from face_recog.embedders import DEFAULT_THRESHOLDS, get_embedder
+    if model_id in DEFAULT_THRESHOLDS:
+        return DEFAULT_THRESHOLDS[model_id]
+    return get_embedder().threshold
+
+
+def aggregate_scores(scores, aggregate=AGGREGATE):
+    """scores: skor query terhadap semua template satu entry."""
+    if aggregate == "mean":
+        return float(scores.mean())
+    if aggregate == "top2" and len(scores) > 1:
+        return float(np.sort(scores)[-2:].mean())
+    return float(scores.max())
+
+
+class Verifier:
+    """Verifikasi 1:N satu query terhadap template banyak entry dengan satu perkalian matriks."""
+
+    def __init__(self, model_id, threshold=None, aggregate=AGGREGATE):
+        self.model_id = model_id
+        self.threshold = threshold if threshold is not None else threshold_for(model_id)
+        self.aggregate = aggregate
+
+    def scores(self, query, templates_list):
+        """
+        query: vektor [d]; templates_list: list matriks template [k_i, d] (sudah ternormalisasi).
+        Returns array skor per entry (float32), -1 untuk entry dengan dimensi berbeda.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        query = query / (np.linalg.norm(query) + 1e-12)
+
+        result = np.full(len(templates_list), -1.0, dtype=np.float32)
+        usable = [i for i, t in enumerate(templates_list) if t.shape[1] == len(query)]
+        if not usable:
+            return result
+
+        stacked = np.concatenate([templates_list[i] for i in usable])
+        all_scores = stacked @ query
+        bounds = np.cumsum([0] + [len(templates_list[i]) for i in usable])
+        for n, i in enumerate(usable):
+            result[i] = aggregate_scores(all_scores[bounds[n]:bounds[n + 1]], self.aggregate)
+        return result
+
+    def best_match(self, query, templates_list):
+        """Returns (index entry terbaik atau None kalau di bawah threshold, skor terbaik)."""
+        if not templates_list:
+            return None, 0.0
+        scores = self.scores(query, templates_list)
+        best = int(scores.argmax())
+        score = float(scores[best])
+        return (best if score >= self.threshold else None), score
+
+
+# ---------- Kalibrasi threshold ----------
+
+def pair_scores(vectors, labels):
+    """Skor cosine semua pasangan (vektorisasi penuh). Returns (genuine, impostor)."""
+    matrix = to_templates(vectors)
+    labels = np.asarray(labels)
+    sims = matrix @ matrix.T
+    upper = np.triu(np.ones_like(sims, dtype=bool), k=1)
+    same = labels[:, None] == labels[None, :]
+    return sims[upper & same], sims[upper & ~same]
+
+
+def calibrate(genuine, impostor, target_far=0.001):
+    """
+    Threshold terkecil dengan FAR (impostor diterima) <= target_far, plus EER sebagai info.
+    Returns dict {threshold, far, frr, eer, eer_threshold, genuine, impostor}.
+    """
+    genuine = np.sort(np.asarray(genuine, dtype=np.float64))
+    impostor = np.sort(np.asarray(impostor, dtype=np.float64))
+    candidates = np.unique(np.concatenate([genuine, impostor, [1.0]]))
+
+    # FAR / FRR untuk semua kandidat threshold sekaligus (searchsorted di data terurut)
+    far = 1.0 - np.searchsorted(impostor, candidates, side="left") / max(1, len(impostor))
+    frr = np.searchsorted(genuine, candidates, side="left") / max(1, len(genuine))
+
+    ok = np.nonzero(far <= target_far)[0]
+    i = ok[0] if len(ok) else len(candidates) - 1
+    e = int(np.argmin(np.abs(far - frr)))
+    return {
+        "threshold": float(candidates[i]),
+        "far": float(far[i]),
+        "frr": float(frr[i]),
+        "eer": float((far[e] + frr[e]) / 2),
+        "eer_threshold": float(candidates[e]),
+        "genuine": int(len(genuine)),
+        "impostor": int(len(impostor)),
+    }
+
+
+def save_threshold(model_id, result, path=THRESHOLDS_PATH):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[model_id] = result
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def calibrate_from_dir(image_dir, target_far=0.001):
+    """Embed semua crop di image_dir/<orang>/*.jpg dengan embedder aktif lalu kalibrasi."""
+    import cv2
+    from face_recog.embedders import get_embedder
+
+    embedder = get_embedder()
+    vectors, labels = [], []
+    for person in sorted(os.listdir(image_dir)):
+        for path in sorted(glob.glob(os.path.join(image_dir, person, "*.jpg"))):
+            face = cv2.imread(path)
+            embedding = embedder.embed(face) if face is not None else None
+            if embedding is not None:
+                vectors.append(embedding)
+                labels.append(person)
+
+    if len(set(labels)) < 2:
+        print("❌ Butuh minimal 2 orang untuk pasangan impostor")
+        return None
+
+    genuine, impostor = pair_scores(vectors, labels)
+    result = calibrate(genuine, impostor, target_far)
+    print(f"📊 {embedder.model_id}: {len(vectors)} wajah, {len(set(labels))} orang, "
+          f"{result['genuine']} pasangan genuine, {result['impostor']} impostor")
+    print(f"   threshold {result['threshold']:.3f} -> FAR {result['far']:.4f}, FRR {result['frr']:.4f} "
+          f"| EER {result['eer']:.4f} @ {result['eer_threshold']:.3f} "
+          f"(default embedder {embedder.threshold})")
+    save_threshold(embedder.model_id, result)
+    print(f"✅ Disimpan ke {THRESHOLDS_PATH}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kalibrasi threshold verifikasi wajah")
+    parser.add_argument("--calibrate", metavar="DIR", required=True)
+    parser.add_argument("--target-far", type=float, default=0.001)
+    args = parser.parse_args()
+    calibrate_from_dir(args.calibrate, args.target_far)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,18 @@ import cv2
 import serial
 import time
 import os
+import sys
 from datetime import datetime
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from utils.motion import MotionGate
+from utils.sensor import is_vehicle_line
+from utils.preview import LiveView
+from utils.frame_source import open_source
+
 # ========== CONFIG ==========
 
 SERIAL_PORT = "COM9"
@@ -30,9 +40,10 @@ def main():
     
     # ---------- OPEN CAMERA ----------
     print("📷 Opening camera...")
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
+    cap = open_source(lane="in", start=False)
+    if not cap.start():
         print("❌ Kamera gagal dibuka")
+        cap.release()
         return
 
     print("✅ Camera OK")
@@ -43,49 +54,65 @@ def main():
     event_id = 0
     buffer = ""
 
-    print("🎥 Kamera hidup. Menunggu VEHICLE DETECTED...\n")
+    # Trigger kamera (motion / presence) sebagai konfirmasi / alternatif sensor
+    motion_gate = MotionGate(lane="in")
 
-    while True:
-        # ======== CAMERA LOOP ========
-        ret, frame = cap.read()
-        if not ret:
-            print("⚠️ Frame gagal dibaca")
-            continue
+    # Window lokal, atau headless (HEADLESS=1) + preview HTTP (PREVIEW_PORT)
+    view = LiveView("LIVE CAMERA")
+
+    print("🎥 Kamera hidup. Menunggu VEHICLE DETECTED...\n")
 
-        # Tampilkan live camera
-        cv2.imshow("LIVE CAMERA", frame)
+    try:
+        while True:
+            # ======== CAMERA LOOP ========
+            ret, frame = cap.read()
+            if not ret:
+                if cap.finished:
+                    print("🏁 Replay selesai")
+                    break
+                print("⚠️ Frame gagal dibaca")
+                continue
+
+            # Tampilkan live camera
+            view.show(frame)
+
+            stopped_edge = motion_gate.update(frame)
         
-        # ======== SENSOR SERIAL LISTEN ========
-        if ser.in_waiting:
-            data = ser.read().decode(errors="ignore")
+            # ======== SENSOR SERIAL LISTEN ========
+            sensor_fired = False
+            if ser.in_waiting:
+                data = ser.read().decode(errors="ignore")
 
-            if data == "\n" or data == "\r":
-                line = buffer.strip()
-                buffer = ""
+                if data == "\n" or data == "\r":
+                    line = buffer.strip()
+                    buffer = ""
 
-                if line:
-                    print(f"[SERIAL] {line}")
+                    if line:
+                        print(f"[SERIAL] {line}")
+                        sensor_fired = is_vehicle_line(line)
 
-                    # ==== jika kendaraan terdeteksi ====
-                    if line == "VEHICLE DETECTED":
-                        event_id += 1
-                        fname = f"vehicle_{timestamp()}.jpg"
-                        fpath = os.path.join(IMG_IN_DIR, fname)
+                else:
+                    buffer += data
 
-                        cv2.imwrite(fpath, frame)
-                        print(f"📸 Captured → {fpath}")
+            # ==== jika kendaraan terdeteksi (sensor / kamera sesuai TRIGGER_MODE) ====
+            if motion_gate.decide(sensor_fired, stopped_edge):
+                event_id += 1
+                fname = f"vehicle_{timestamp()}.jpg"
+                fpath = os.path.join(IMG_IN_DIR, fname)
 
-            else:
-                buffer += data
+                cv2.imwrite(fpath, frame)
+                print(f"📸 Captured → {fpath}")
 
-        # ======== EXIT WITH Q ========
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+            # ======== EXIT WITH Q ========
+            if view.should_quit():
+                break
+    except KeyboardInterrupt:
+        pass
 
     print("\n🛑 EXIT")
     cap.release()
     ser.close()
-    cv2.destroyAllWindows()
+    view.close()
 
 if __name__ == "__main__":
     main()
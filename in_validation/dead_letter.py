@@ -0,0 +1,106 @@
+# in_validation/dead_letter.py
+# Dead-letter store untuk event masuk yang gagal (DB error, OCR / wajah gagal, exception).
+#
+# Satu event = satu folder:
+#   dead-letter/<event_id>/frame.jpg    -> gambar input asli (dipindah dari img-in)
+#   dead-letter/<event_id>/state.json   -> hasil antara (deteksi, kandidat OCR, embedding),
+#                                          status per tahap, error, jumlah percobaan
+#
+# Proses ulang (hanya tahap yang gagal, prioritas rendah):
+#   python in_validation/main.py --reprocess [--limit N] [--event ID] [--force]
+#   python in_validation/main.py --dead-letters        -> daftar event
+import json
+import os
+import shutil
+import time
+import uuid
+
+DLQ_DIR = os.path.join(os.path.dirname(__file__), "dead-letter")
+DLQ_MAX_ATTEMPTS = int(os.environ.get("DLQ_MAX_ATTEMPTS", "3"))
+
+# Urutan tahap pipeline masuk; tahap dengan status "ok" tidak dijalankan ulang
+STAGES = ("detect", "ocr", "face", "commit")
+
+
+def failed_stages(result):
+    stages = (result or {}).get("stages", {})
+    return [stage for stage in STAGES if stages.get(stage) != "ok"]
+
+
+class DeadLetterStore:
+    def __init__(self, directory=DLQ_DIR):
+        self.directory = directory
+
+    def _state_path(self, event_id):
+        return os.path.join(self.directory, event_id, "state.json")
+
+    def frame_path(self, event_id):
+        return os.path.join(self.directory, event_id, "frame.jpg")
+
+    def _write(self, state):
+        path = self._state_path(state["id"])
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def put(self, img_path, result=None, error=None):
+        """Pindahkan file input + hasil antara ke dead-letter. Returns event_id."""
+        event_id = f"{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        os.makedirs(os.path.join(self.directory, event_id))
+        shutil.move(img_path, self.frame_path(event_id))
+
+        state = {
+            "id": event_id,
+            "source": os.path.basename(img_path),
+            "created": time.time(),
+            "attempts": 0,
+            "last_attempt": None,
+            "failed": failed_stages(result),
+            "error": error,
+            "result": result
+        }
+        self._write(state)
+        print(f"📥 Dead-letter {event_id}: gagal di {', '.join(state['failed'])}"
+              + (f" ({error.splitlines()[0]})" if error else ""))
+        return event_id
+
+    def load(self, event_id):
+        try:
+            with open(self._state_path(event_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self):
+        """Semua event, terlama dulu."""
+        if not os.path.isdir(self.directory):
+            return []
+        states = [self.load(name) for name in os.listdir(self.directory)]
+        return sorted((s for s in states if s), key=lambda s: s["created"])
+
+    def record_attempt(self, state, result, error=None):
+        """Percobaan ulang gagal lagi: simpan hasil antara terbaru."""
+        state.update(
+            attempts=state["attempts"] + 1,
+            last_attempt=time.time(),
+            failed=failed_stages(result),
+            error=error,
+            result=result
+        )
+        self._write(state)
+
+    def resolve(self, event_id):
+        """Event berhasil diproses ulang -> hapus dari dead-letter."""
+        shutil.rmtree(os.path.join(self.directory, event_id), ignore_errors=True)
+
+    def print_summary(self):
+        states = self.list()
+        print(f"📦 Dead-letter: {len(states)} event di {self.directory}")
+        for s in states:
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(s["created"]))
+            flag = " (maks. percobaan)" if s["attempts"] >= DLQ_MAX_ATTEMPTS else ""
+            print(f"   {s['id']}  {created}  gagal: {', '.join(s['failed']) or '-'}  "
+                  f"percobaan: {s['attempts']}{flag}")
@@ -1,11 +1,10 @@
 import cv2
-import uuid
 import os
 import sys
 import glob
 import time
+import argparse
 import numpy as np
-from ultralytics import YOLO
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT_DIR not in sys.path:
@@ -17,11 +16,21 @@ setup_environment()
 
 # === IMPORT MODULES ===
 from optical_character_recognition.main import load_ocr_model, run_ocr_on_plate
-from face_recog.main import process_face_recognition
-from utils.database import insert_entry, create_table_if_not_exists
+from face_recog.main import process_face_recognition, current_face_model
+from face_recog.quality import select_face
+from utils.database import insert_entry, update_face_templates, create_table_if_not_exists
+from utils.db_writer import AsyncDBWriter
+from utils.events import emit_gate_event
 from utils.loading import LoadingAnimation
 from utils.sensor import sensor_detect_vehicle_continuous  # existing sensor function
 from utils.camera import capture_vehicle_image
+from utils.yolo_runtime import load_yolo
+from utils.roi import detect_in_roi
+from utils.detections import Detections, DETECTION_DTYPE, PLATE_CLS, FACE_CLS
+from utils.dedup import EventDeduplicator
+from utils.image_hash import dhash
+from in_validation.dead_letter import DeadLetterStore, DLQ_MAX_ATTEMPTS
+from utils.priority import apply_thread_budget, live_busy, yield_to_live
 
 # Folder output crop -> "img"
 CROP_DIR = os.path.join(os.path.dirname(__file__), "img")
@@ -37,114 +46,172 @@ YOLO_MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'model', 'detect
 # OCR model path
 OCR_MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'model', 'ocr.pt')
 
+# Dedup event: sensor bisa trigger berkali-kali untuk kendaraan yang sama
+FRAME_HASH_SIZE = 16  # hash 256-bit, cukup detail untuk membedakan kendaraan
+deduplicator = EventDeduplicator(frame_hamming=6)
+
+# Event gagal (beserta hasil antara) disimpan untuk diproses ulang, bukan dihapus
+dead_letters = DeadLetterStore()
+
 
 def run_detection(frame, yolo_model):
-    """Deteksi plat & wajah pada satu frame. Kembalikan dict crops.
-    crops = { "plate": [{path, confidence, uuid}, ...], "face": [...] }
-    """
+    """Deteksi plat & wajah pada satu frame. Kembalikan Detections (array box + frame)."""
     loading = LoadingAnimation("Deteksi objek (plat & wajah)")
     loading.start()
 
-    results = yolo_model(frame)
-    detections = results[0]
+    # Deteksi dua tahap di ROI lane (kasar -> detail), koordinat di frame full-res
+    detections = Detections.from_boxes(detect_in_roi(frame, yolo_model, lane="in"), frame)
 
-    crops = {"plate": [], "face": []}
+    loading.stop(f"✅ {detections.count(PLATE_CLS)} plat & {detections.count(FACE_CLS)} wajah terdeteksi")
+    return detections
 
-    for box in detections.boxes:
-        cls = int(box.cls[0])
-        conf = float(box.conf[0])
-        x1, y1, x2, y2 = map(int, box.xyxy[0])
 
-        # safety crop bounds
-        h, w = frame.shape[:2]
-        x1 = max(0, min(w - 1, x1))
-        x2 = max(0, min(w - 1, x2))
-        y1 = max(0, min(h - 1, y1))
-        y2 = max(0, min(h - 1, y2))
+def _new_result(frame, frame_hash=None):
+    return {
+        "frame_hash": frame_hash if frame_hash is not None else dhash(frame, hash_size=FRAME_HASH_SIZE),
+        "stages": {},          # tahap -> "ok" / "failed" / "error" (dipakai dead-letter)
+        "errors": {},
+        "detections": None,    # baris DETECTION_DTYPE sebagai list (JSON-able)
+        "plate_text": "UNKNOWN",
+        "plate_confidence": 0.0,
+        "plate_candidates": [],
+        "plate_crop_path": "",
+        "face_encoding": None,
+        "face_crop_path": "",
+        "face_rejected": None
+    }
 
-        if x2 <= x1 or y2 <= y1:
-            continue
 
-        if cls == 0:
-            label = "plate"
-        elif cls == 1:
-            label = "face"
-        else:
-            continue
+def _run_stage(result, stage, fn, *args):
+    """Jalankan satu tahap; exception dicatat di result (hasil tahap lain tetap tersimpan)."""
+    try:
+        ok = fn(result, *args)
+        result["stages"][stage] = "ok" if ok else "failed"
+    except Exception as e:
+        print(f"❌ Tahap {stage} error: {e}")
+        result["stages"][stage] = "error"
+        result["errors"][stage] = str(e)
 
-        crop_img = frame[y1:y2, x1:x2]
-        crop_id = str(uuid.uuid4())
-        crop_path = os.path.join(CROP_DIR, f"{label}_{crop_id}.jpg")
-        cv2.imwrite(crop_path, crop_img)
 
-        crops[label].append({
-            "path": crop_path,
-            "confidence": conf,
-            "uuid": crop_id
-        })
+def _stage_detect(result, frame, yolo_model):
+    detections = run_detection(frame, yolo_model)
+    result["detections"] = detections.data.tolist()
+    return True
 
-    loading.stop(f"✅ {len(crops['plate'])} plat & {len(crops['face'])} wajah terdeteksi")
-    return crops
 
+def _stage_ocr(result, detections, ocr_model):
+    # OCR (crop array langsung, file crop hanya untuk arsip DB)
+    plate_idx = detections.best(PLATE_CLS)
+    if plate_idx is None:
+        return False
 
-def process_image_file(img_path, ocr_model, yolo_model):
-    """Proses satu file gambar (path). Mengembalikan True jika tersimpan di DB."""
-    print(f"\n🖼️ Memproses file: {img_path}")
+    result["plate_crop_path"] = detections.save_crop(plate_idx, CROP_DIR)
+    result["plate_confidence"] = float(detections.data["conf"][plate_idx])
 
-    frame = cv2.imread(img_path)
-    if frame is None:
-        print("❌ Gagal membaca gambar, menghapus file")
-        try:
-            os.remove(img_path)
-        except Exception:
-            pass
+    loading = LoadingAnimation("OCR plat nomor")
+    loading.start()
+
+    candidates = run_ocr_on_plate(
+        crop_path=detections.crop(plate_idx),
+        model_ocr=ocr_model,
+        preprocess_dir=os.path.join(os.path.dirname(__file__), '..', 'optical_character_recognition', 'output', 'preprocess'),
+        det_dir=os.path.join(os.path.dirname(__file__), '..', 'optical_character_recognition', 'output', 'detection'),
+        return_candidates=True
+    )
+    result["plate_candidates"] = candidates
+    result["plate_text"] = candidates[0]["text"] if candidates else "UNKNOWN"
+
+    loading.stop(f"✅ OCR: {result['plate_text']}")
+    return result["plate_text"] != "UNKNOWN"
+
+
+def _stage_face(result, detections):
+    # FACE: wajah terbaik (bukan penumpang / blur) yang lolos quality gate, baru di-embed
+    face_idx, face_info = select_face(detections, lane="in")
+    result["face_rejected"] = face_info["reject"] if face_idx is None and face_info else None
+    if face_idx is None:
         return False
 
+    result["face_crop_path"] = detections.save_crop(face_idx, CROP_DIR)
+    face_encoding = process_face_recognition(detections.crop(face_idx))
+    if face_encoding is not None:
+        result["face_encoding"] = [float(v) for v in face_encoding]
+    return face_encoding is not None
+
+
+def analyze_frame(frame, ocr_model, yolo_model, frame_hash=None, previous=None):
+    """Tahap inferensi (deteksi, OCR, face embedding) tanpa menyentuh database.
+    Hasilnya bisa dikirim antar proses (worker pool) lalu di-commit oleh commit_result.
+    previous: hasil parsial dari dead-letter -> tahap yang sudah "ok" tidak dijalankan ulang.
+    """
+    result = dict(previous, stages=dict(previous["stages"]), errors={}) if previous \
+        else _new_result(frame, frame_hash)
+    stages = result["stages"]
+
     # Deteksi
-    crops = run_detection(frame, yolo_model)
+    if stages.get("detect") != "ok":
+        _run_stage(result, "detect", _stage_detect, frame, yolo_model)
+    if stages.get("detect") != "ok":
+        return result
 
-    plate_text = "UNKNOWN"
-    plate_confidence = 0.0
-    plate_crop_path = ""
-    face_encoding = None
-    face_crop_path = ""
+    detections = Detections(frame, np.array([tuple(row) for row in result["detections"]],
+                                            dtype=DETECTION_DTYPE))
+    if stages.get("ocr") != "ok":
+        _run_stage(result, "ocr", _stage_ocr, detections, ocr_model)
+    if stages.get("face") != "ok":
+        _run_stage(result, "face", _stage_face, detections)
 
-    # OCR
-    if len(crops["plate"]) > 0:
-        plate_crop_path = crops["plate"][0]["path"]
-        plate_confidence = crops["plate"][0]["confidence"]
+    return result
 
-        loading = LoadingAnimation("OCR plat nomor")
-        loading.start()
 
-        plate_text = run_ocr_on_plate(
-            crop_path=plate_crop_path,
-            model_ocr=ocr_model,
-            preprocess_dir=os.path.join(os.path.dirname(__file__), '..', 'optical_character_recognition', 'output', 'preprocess'),
-            det_dir=os.path.join(os.path.dirname(__file__), '..', 'optical_character_recognition', 'output', 'detection')
-        )
+def commit_result(result, db_writer=None):
+    """Dedup + simpan hasil analyze_frame ke DB. Mengembalikan True jika tersimpan.
+    result["outcome"] diisi "saved" / "duplicate" / "rejected" (rejected -> dead-letter).
+    """
+    plate_text = result["plate_text"]
+    face_encoding = result["face_encoding"]
 
-        loading.stop(f"✅ OCR: {plate_text}")
+    # Frame mirip event sebelumnya hanya dicatat: bisa saja mobil lain di titik yang sama
+    frame_match = deduplicator.frame_seen(result["frame_hash"])
 
-    # FACE
-    if len(crops["face"]) > 0:
-        face_crop_path = crops["face"][0]["path"]
-        face_encoding = process_face_recognition(face_crop_path)
+    # Dedup: plat mirip lalu wajah cocok dalam jendela waktu (satu-satunya alasan event dibuang)
+    duplicate = None
+    if face_encoding is not None and plate_text != "UNKNOWN":
+        duplicate = deduplicator.is_duplicate_event(plate_text, face_encoding)
+    if duplicate:
+        print(f"⏭️ Duplikat: {plate_text} sudah tercatat dalam {deduplicator.window_s:.0f} detik terakhir")
+        # Wajah yang sama dari sudut lain -> jadi template tambahan entry tersebut
+        templates = deduplicator.add_template(duplicate, face_encoding)
+        if templates:
+            save_templates = db_writer.submit_templates if db_writer else update_face_templates
+            save_templates(duplicate["entry_id"], templates)
+            print(f"🧩 Template wajah ditambahkan ({len(templates)} template, "
+                  f"similarity {duplicate['similarity']:.2f})")
+        emit_gate_event("duplicate", lane="in", plate=plate_text, reason="plate_face",
+                        template_added=bool(templates), frame_match=frame_match)
+        result["outcome"] = "duplicate"
+        return False
 
     # SAVE TO DB
     if face_encoding is not None and plate_text != "UNKNOWN":
         loading = LoadingAnimation("Menyimpan ke database")
         loading.start()
 
-        db_entry_id = insert_entry(
+        save_entry = db_writer.submit_insert if db_writer else insert_entry
+        db_entry_id = save_entry(
             plate_text=plate_text,
-            plate_conf=plate_confidence,
+            plate_conf=result["plate_confidence"],
             face_vector=face_encoding,
-            plate_path=plate_crop_path,
-            face_path=face_crop_path
+            plate_path=result["plate_crop_path"],
+            face_path=result["face_crop_path"],
+            face_model=current_face_model()
         )
 
         loading.stop(f"✅ Data tersimpan (ID: {db_entry_id[:8]}...)")
+        result["stages"]["commit"] = "ok"
+        result["outcome"] = "saved"
+        deduplicator.remember(result["frame_hash"], plate_text, face_encoding, entry_id=db_entry_id)
+        emit_gate_event("entry", lane="in", plate=plate_text, entry_id=db_entry_id)
 
         print(f"\n🎉 PROSES MASUK BERHASIL!")
         print(f"   📋 Plat: {plate_text}")
@@ -154,10 +221,64 @@ def process_image_file(img_path, ocr_model, yolo_model):
         return True
     else:
         print("\n❌ Gagal memproses. Data tidak disimpan.")
+        if face_encoding is None:
+            reason = "face_quality" if result.get("face_rejected") else "no_face"
+        else:
+            reason = "no_plate"
+        emit_gate_event("rejection", lane="in", plate=plate_text, reason=reason,
+                        face_rejected=result.get("face_rejected"))
+        result["outcome"] = "rejected"
         return False
 
 
-def process_pending_images(ocr_model, yolo_model):
+def commit_safely(result, db_writer=None):
+    """commit_result, tapi exception (mis. DB down tanpa writer) dicatat di result sebagai tahap commit."""
+    try:
+        return commit_result(result, db_writer)
+    except Exception as e:
+        print(f"❌ Error saat menyimpan: {e}")
+        result["stages"]["commit"] = "error"
+        result["errors"]["commit"] = str(e)
+        return False
+
+
+def finish_input(img_path, result=None, error=None):
+    """
+    Event selesai (tersimpan / duplikat / gambar tidak terbaca) -> file input dihapus.
+    "saved" lewat AsyncDBWriter aman dihapus: record sudah di WAL (fsync) sebelum submit kembali.
+    Event gagal -> file + hasil antara dipindah ke dead-letter untuk diproses ulang.
+    """
+    if error is None and result and result.get("outcome") in ("saved", "duplicate", "unreadable"):
+        try:
+            os.remove(img_path)
+        except Exception:
+            pass
+        return
+
+    try:
+        dead_letters.put(img_path, result, error)
+    except Exception as e:
+        print(f"❌ Gagal memindah {img_path} ke dead-letter: {e}")
+
+
+def process_image_file(img_path, ocr_model, yolo_model, db_writer=None):
+    """Proses satu file gambar (path). Mengembalikan result (result["outcome"] == "saved" jika
+    tersimpan di DB). Dengan db_writer, INSERT diserahkan ke writer asinkron (lane tidak menunggu commit).
+    """
+    print(f"\n🖼️ Memproses file: {img_path}")
+
+    frame = cv2.imread(img_path)
+    if frame is None:
+        print("❌ Gagal membaca gambar, menghapus file")
+        return {"outcome": "unreadable"}
+
+    # Frame mirip tetap di-OCR + embed: duplikat hanya diputuskan dari plat + wajah
+    result = analyze_frame(frame, ocr_model, yolo_model)
+    commit_safely(result, db_writer)
+    return result
+
+
+def process_pending_images(ocr_model, yolo_model, db_writer=None):
     """Baca semua file di IMG_IN_DIR dan proses satu-satu."""
     files = sorted(glob.glob(os.path.join(IMG_IN_DIR, "*.jpg")))
     if len(files) == 0:
@@ -165,23 +286,128 @@ def process_pending_images(ocr_model, yolo_model):
 
     processed = 0
     for img_path in files:
+        # Batas batch: lane keluar sedang memutuskan -> tunggu dulu
+        yield_to_live()
+        result, error = None, None
         try:
-            ok = process_image_file(img_path, ocr_model, yolo_model)
+            result = process_image_file(img_path, ocr_model, yolo_model, db_writer)
         except Exception as e:
             print(f"❌ Error saat memproses {img_path}: {e}")
-            ok = False
+            error = str(e)
 
-        # Hapus file input apapun hasilnya
-        try:
-            os.remove(img_path)
-        except Exception:
-            pass
+        # Selesai -> hapus file input; gagal -> dead-letter (bisa diproses ulang)
+        finish_input(img_path, result, error)
+
+        if result and result.get("outcome") == "saved":
+            processed += 1
+
+    return processed
+
+
+def process_pending_images_pool(pool, db_writer=None):
+    """Mode worker pool: submit file baru ke pool, commit hasil yang sudah urut per sumber."""
+    in_flight = pool.in_flight
+    # Lane keluar sedang memutuskan -> task baru ditahan, yang sudah berjalan dibiarkan selesai
+    if not live_busy():
+        for img_path in sorted(glob.glob(os.path.join(IMG_IN_DIR, "*.jpg"))):
+            if img_path not in in_flight:
+                pool.submit(img_path)
+    pool.autoscale()
+
+    return commit_pool_results(pool.poll(), db_writer)
+
+
+def commit_pool_results(messages, db_writer=None):
+    processed = 0
+    for message in messages:
+        print(f"\n🖼️ Hasil worker {message['worker']}: {message['path']}")
+        ok = False
+        if message["error"]:
+            print(f"❌ Error saat memproses {message['path']}: {message['error']}")
+        else:
+            ok = commit_safely(message["result"], db_writer)
+
+        finish_input(message["path"], message["result"], message["error"])
 
         if ok:
             processed += 1
 
     return processed
 
+
+def lower_priority(num_threads=1):
+    """Proses ini mengalah ke lane live: core latar + nice, thread inferensi dibatasi."""
+    apply_thread_budget("background")
+    from utils.yolo_runtime import configure_threads
+    configure_threads(num_threads)
+    cv2.setNumThreads(num_threads)
+
+
+def wait_for_live_idle(poll_s=1.0):
+    """Tunggu sampai img-in kosong (traffic live selalu didahulukan)."""
+    waited = False
+    while glob.glob(os.path.join(IMG_IN_DIR, "*.jpg")) or live_busy():
+        if not waited:
+            print("⏸️ Ada event live (img-in / lane keluar), reprocess menunggu...")
+            waited = True
+        time.sleep(poll_s)
+
+
+def reprocess_dead_letters(limit=None, event_id=None, force=False):
+    """
+    Proses ulang event di dead-letter. Hanya tahap yang gagal yang dijalankan ulang
+    (hasil deteksi / OCR / embedding yang sudah ok dipakai lagi); kalau hanya commit
+    yang gagal, model tidak dimuat sama sekali. Returns jumlah event yang berhasil.
+    """
+    lower_priority()
+    create_table_if_not_exists()
+
+    states = [s for s in dead_letters.list() if event_id is None or s["id"] == event_id]
+    if not force:
+        skipped = [s for s in states if s["attempts"] >= DLQ_MAX_ATTEMPTS]
+        if skipped:
+            print(f"⏭️ {len(skipped)} event sudah {DLQ_MAX_ATTEMPTS}x dicoba (pakai --force)")
+        states = [s for s in states if s["attempts"] < DLQ_MAX_ATTEMPTS]
+    states = states[:limit]
+    print(f"♻️ Reprocess {len(states)} event dead-letter")
+
+    models = {}
+    db_writer = AsyncDBWriter(name="reprocess")
+    resolved = 0
+    for state in states:
+        wait_for_live_idle()
+        print(f"\n♻️ {state['id']} ({state['source']}): ulang tahap {', '.join(state['failed'])}")
+
+        result, error = state["result"], None
+        try:
+            frame = cv2.imread(dead_letters.frame_path(state["id"]))
+            if frame is None:
+                raise ValueError("Gagal membaca gambar")
+
+            if result is None or any(stage != "commit" for stage in state["failed"]):
+                if not models:
+                    print("🔁 Memuat model YOLO dan OCR (1 thread, prioritas rendah)...")
+                    models["yolo"] = load_yolo(YOLO_MODEL_PATH, num_threads=1)
+                    models["ocr"] = load_ocr_model(OCR_MODEL_PATH)
+                result = analyze_frame(frame, models["ocr"], models["yolo"], previous=result)
+            commit_safely(result, db_writer)
+        except Exception as e:
+            print(f"❌ Reprocess {state['id']} error: {e}")
+            error = str(e)
+
+        if error is None and result.get("outcome") in ("saved", "duplicate"):
+            dead_letters.resolve(state["id"])
+            resolved += 1
+            print(f"✅ {state['id']} selesai ({result['outcome']})")
+        else:
+            dead_letters.record_attempt(state, result, error)
+
+    db_writer.flush()
+    db_writer.close()
+    print(f"\n♻️ Reprocess selesai: {resolved}/{len(states)} berhasil")
+    return resolved
+
+
 def main():
     print("🚗 IN VALIDATION SERVICE (queue-based)")
     print("=" * 50)
@@ -189,13 +415,46 @@ def main():
     print("Tekan Ctrl+C untuk berhenti")
     print("=" * 50)
 
+    parser = argparse.ArgumentParser(description="In validation service")
+    parser.add_argument("--pool", action="store_true", help="proses backlog dengan worker pool multi-proses")
+    parser.add_argument("--min-workers", type=int, default=None)
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--dead-letters", action="store_true", help="tampilkan event di dead-letter")
+    parser.add_argument("--reprocess", action="store_true",
+                        help="proses ulang event dead-letter (hanya tahap yang gagal, prioritas rendah)")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--event", default=None, help="hanya event dead-letter ini")
+    parser.add_argument("--force", action="store_true", help="termasuk event yang sudah maks. percobaan")
+    args = parser.parse_args()
+
+    if args.dead_letters:
+        dead_letters.print_summary()
+        return
+    if args.reprocess:
+        reprocess_dead_letters(args.limit, args.event, args.force)
+        return
+
+    # Lane masuk / backlog = pekerjaan latar: core terpisah dari lane keluar (worker pool ikut mewarisi)
+    apply_thread_budget("background", nice=False)
+
     # Inisialisasi database
     create_table_if_not_exists()
 
-    # Load models ONCE
-    print("🔁 Memuat model YOLO dan OCR (sekali saja)...")
-    yolo_model = YOLO(YOLO_MODEL_PATH)
-    ocr_model = load_ocr_model(OCR_MODEL_PATH)
+    pool = None
+    if args.pool:
+        # Model dimuat di tiap worker, proses utama hanya dedup + commit
+        from in_validation.worker_pool import WorkerPool, POOL_MIN_WORKERS, POOL_MAX_WORKERS
+        pool = WorkerPool(min_workers=args.min_workers or POOL_MIN_WORKERS,
+                          max_workers=args.max_workers or POOL_MAX_WORKERS).start()
+        print(f"🧵 Worker pool aktif ({pool.min_workers}-{pool.max_workers} worker)")
+    else:
+        # Load models ONCE
+        print("🔁 Memuat model YOLO dan OCR (sekali saja)...")
+        yolo_model = load_yolo(YOLO_MODEL_PATH)
+        ocr_model = load_ocr_model(OCR_MODEL_PATH)
+
+    # Writer DB asinkron (batch + spool lokal saat MySQL mati)
+    db_writer = AsyncDBWriter(name="in_validation")
 
     vehicle_count = 0
 
@@ -203,16 +462,30 @@ def main():
         while True:
 
             # 2) Worker: proses semua file yang ada di folder img-in
-            processed = process_pending_images(ocr_model, yolo_model)
+            if pool:
+                # poll() menunggu hasil worker (maks. 0.25 detik), jadi tidak perlu sleep
+                processed = process_pending_images_pool(pool, db_writer)
+            else:
+                processed = process_pending_images(ocr_model, yolo_model, db_writer)
             if processed > 0:
                 print(f"✅ Selesai memproses {processed} file dari '{IMG_IN_DIR}'")
 
             # 3) Sleep singkat agar loop tidak 100% CPU
-            time.sleep(0.25)
+            if not pool:
+                time.sleep(0.25)
 
     except KeyboardInterrupt:
         print('\n\n🛑 Dihentikan oleh user (Ctrl+C)')
 
+    if pool:
+        # Selesaikan task yang sudah dikirim ke worker, sisa file tetap di img-in
+        print("⏳ Menunggu worker menyelesaikan task yang berjalan...")
+        commit_pool_results(pool.shutdown(), db_writer)
+
+    # Pastikan semua entry sudah commit / masuk spool sebelum keluar
+    db_writer.flush()
+    db_writer.close()
+
     print("\n" + "=" * 50)
     print("🔚 IN VALIDATION SERVICE STOPPED")
     print(f"Total event sensor terdeteksi: {vehicle_count}")
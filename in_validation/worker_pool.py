@@ -0,0 +1,334 @@
+# in_validation/worker_pool.py
+# Worker pool multi-proses untuk menguras backlog img-in (mis. setelah pergantian shift).
+#
+# - Tiap worker proses memuat model YOLO / OCR / face sekali, lalu mengambil file dari antrian.
+# - Inferensi berjalan paralel; dedup + INSERT tetap di proses utama, berurutan per sumber
+#   (prefix nama file, mis. "vehicle_..."), jadi urutan event per lane tidak berubah.
+# - Jumlah worker naik / turun mengikuti kedalaman antrian (min_workers..max_workers).
+#
+#   python in_validation/worker_pool.py --benchmark DIR [--max-workers N]
+import argparse
+import glob
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sys
+import time
+import traceback
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+POOL_MIN_WORKERS = int(os.environ.get("POOL_MIN_WORKERS", "1"))
+POOL_MAX_WORKERS = int(os.environ.get("POOL_MAX_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+FILES_PER_WORKER = 4     # target kedalaman antrian per worker sebelum menambah worker
+SHRINK_IDLE_S = 30.0     # antrian kosong selama ini -> kurangi worker
+STOP = None              # sentinel: worker yang mengambil ini keluar
+
+
+def source_of(path):
+    """Kunci urutan: prefix nama file sebelum '_' (capture.py menulis vehicle_<timestamp>.jpg)."""
+    return os.path.basename(path).split("_", 1)[0]
+
+
+def _worker_main(worker_id, task_queue, result_queue, num_threads):
+    # Ctrl+C ditangani proses utama (shutdown graceful), worker tidak ikut berhenti mendadak
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    import cv2
+    from utils.priority import yield_to_live
+    from utils.yolo_runtime import configure_threads, load_yolo
+    configure_threads(num_threads)
+    cv2.setNumThreads(num_threads)
+
+    from in_validation import main as pipeline
+    yolo_model = load_yolo(pipeline.YOLO_MODEL_PATH, num_threads=num_threads)
+    ocr_model = pipeline.load_ocr_model(pipeline.OCR_MODEL_PATH)
+    result_queue.put({"type": "ready", "worker": worker_id, "pid": os.getpid()})
+
+    while True:
+        task = task_queue.get()
+        if task is STOP:
+            break
+        # Preemption di batas task: lane keluar sedang memutuskan -> tunggu dulu
+        yield_to_live()
+
+        result_queue.put({"type": "claim", "worker": worker_id, "task_id": task["task_id"]})
+        start = time.perf_counter()
+        message = dict(task, type="result", worker=worker_id, result=None, error=None)
+        try:
+            frame = cv2.imread(task["path"])
+            if frame is None:
+                message["error"] = "Gagal membaca gambar"
+            else:
+                message["result"] = pipeline.analyze_frame(frame, ocr_model, yolo_model)
+        except Exception as e:
+            message["error"] = f"{e}\n{traceback.format_exc(limit=3)}"
+        message["elapsed"] = time.perf_counter() - start
+        result_queue.put(message)
+
+    result_queue.put({"type": "exit", "worker": worker_id})
+
+
+class WorkerPool:
+    """
+    Pool proses dengan autoscaling sederhana. Hasil dikembalikan oleh poll() dalam urutan
+    submit per sumber (reorder buffer), walaupun worker menyelesaikannya tidak berurutan.
+    """
+
+    def __init__(self, min_workers=POOL_MIN_WORKERS, max_workers=POOL_MAX_WORKERS,
+                 files_per_worker=FILES_PER_WORKER, shrink_idle_s=SHRINK_IDLE_S,
+                 threads_per_worker=None):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.files_per_worker = files_per_worker
+        self.shrink_idle_s = shrink_idle_s
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.max_workers)
+
+        # spawn: aman untuk torch / TensorFlow (tidak mewarisi state thread proses utama)
+        self._ctx = mp.get_context("spawn")
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._workers = {}       # worker_id -> Process
+        self._claims = {}        # worker_id -> task_id yang sedang dikerjakan
+        self._stopping = 0       # sentinel STOP yang belum diambil worker
+        self._next_worker = 0
+        self._next_task = 0
+
+        self._pending = {}       # task_id -> task (belum ada hasil)
+        self._next_seq = {}      # source -> seq berikutnya untuk submit
+        self._release_seq = {}   # source -> seq berikutnya yang boleh dikeluarkan
+        self._ready = {}         # source -> {seq: message}
+        self._idle_since = None
+        self._ready_workers = set()
+
+        self.completed = 0
+
+    # ---------- workers ----------
+
+    def _spawn(self):
+        worker_id = self._next_worker
+        self._next_worker += 1
+        process = self._ctx.Process(target=_worker_main, name=f"in-worker-{worker_id}",
+                                    args=(worker_id, self._tasks, self._results, self.threads_per_worker),
+                                    daemon=True)
+        process.start()
+        self._workers[worker_id] = process
+        print(f"➕ Worker {worker_id} dimulai (pid {process.pid}), total {self.size}")
+
+    @property
+    def ready_workers(self):
+        return len(self._ready_workers)
+
+    @property
+    def backlog(self):
+        return len(self._pending)
+
+    @property
+    def size(self):
+        """Worker aktif, tidak termasuk yang sudah diminta berhenti."""
+        return len(self._workers) - self._stopping
+
+    def start(self):
+        for _ in range(self.min_workers):
+            self._spawn()
+        return self
+
+    def autoscale(self):
+        """Sesuaikan jumlah worker dengan kedalaman antrian."""
+        backlog = self.backlog
+        target = -(-backlog // self.files_per_worker) if backlog else 0
+        target = max(self.min_workers, min(self.max_workers, target))
+
+        if target > self.size:
+            self._idle_since = None
+            for _ in range(target - self.size):
+                self._spawn()
+        elif backlog == 0 and self.size > self.min_workers:
+            self._idle_since = self._idle_since or time.time()
+            if time.time() - self._idle_since >= self.shrink_idle_s:
+                self._tasks.put(STOP)
+                self._stopping += 1
+                self._idle_since = None
+                print(f"➖ Antrian kosong, mengurangi worker (total {self.size})")
+        else:
+            self._idle_since = None
+
+    def _check_workers(self):
+        """Worker mati mendadak: tandai task-nya gagal (urutan tetap jalan) lalu ganti workernya."""
+        for worker_id, process in list(self._workers.items()):
+            if process.is_alive():
+                continue
+            del self._workers[worker_id]
+            self._ready_workers.discard(worker_id)
+            task_id = self._claims.pop(worker_id, None)
+            if process.exitcode == 0:
+                self._stopping = max(0, self._stopping - 1)
+                continue
+
+            print(f"⚠️ Worker {worker_id} berhenti (exit code {process.exitcode})")
+            if task_id in self._pending:
+                task = self._pending[task_id]
+                self._accept(dict(task, type="result", worker=worker_id, result=None,
+                                  error=f"Worker berhenti (exit code {process.exitcode})", elapsed=0.0))
+            if self.size < self.min_workers:
+                self._spawn()
+
+    # ---------- tasks ----------
+
+    def submit(self, path):
+        source = source_of(path)
+        seq = self._next_seq.get(source, 0)
+        self._next_seq[source] = seq + 1
+        self._release_seq.setdefault(source, 0)
+
+        task = {"task_id": self._next_task, "path": path, "source": source, "seq": seq}
+        self._next_task += 1
+        self._pending[task["task_id"]] = task
+        self._tasks.put(task)
+        return task["task_id"]
+
+    @property
+    def in_flight(self):
+        """Path yang belum boleh di-submit ulang: antri / sedang dikerjakan worker / hasilnya
+        menunggu giliran rilis di reorder buffer (file masih di img-in sampai di-commit)."""
+        paths = {task["path"] for task in self._pending.values()}
+        paths.update(self._pending[task_id]["path"] for task_id in self._claims.values()
+                     if task_id in self._pending)
+        for ready in self._ready.values():
+            paths.update(message["path"] for message in ready.values())
+        return paths
+
+    def _cancel_queued(self):
+        """Ambil kembali task yang belum diambil worker. Returns jumlah task yang dibatalkan."""
+        cancelled, stops = 0, 0
+        while True:
+            try:
+                # get_nowait bisa Empty palsu selama feeder thread belum mengirim -> timeout kecil
+                task = self._tasks.get(timeout=0.1)
+            except queue.Empty:
+                break
+            if task is STOP:
+                stops += 1
+                continue
+            if self._pending.pop(task["task_id"], None) is not None:
+                cancelled += 1
+        for _ in range(stops):
+            self._tasks.put(STOP)  # STOP dari autoscale tetap untuk worker
+        return cancelled
+
+    def _accept(self, message):
+        task = self._pending.pop(message["task_id"], None)
+        if task is None:
+            return
+        self._ready.setdefault(task["source"], {})[task["seq"]] = message
+
+    def poll(self, timeout=0.25):
+        """Ambil pesan dari worker, kembalikan hasil yang sudah boleh dirilis (urut per sumber)."""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                message = self._results.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                break
+
+            if message["type"] == "ready":
+                self._ready_workers.add(message["worker"])
+            elif message["type"] == "claim":
+                self._claims[message["worker"]] = message["task_id"]
+            elif message["type"] == "exit":
+                self._ready_workers.discard(message["worker"])
+            elif message["type"] == "result":
+                self._claims.pop(message["worker"], None)
+                self.completed += 1
+                self._accept(message)
+
+        self._check_workers()
+
+        released = []
+        for source, ready in self._ready.items():
+            seq = self._release_seq[source]
+            while seq in ready:
+                released.append(ready.pop(seq))
+                seq += 1
+            self._release_seq[source] = seq
+        return released
+
+    def shutdown(self, timeout=30.0):
+        """
+        Shutdown graceful: task yang sedang dikerjakan worker diselesaikan (maks. timeout detik),
+        hasilnya dikembalikan supaya bisa di-commit. Task yang masih antri dibatalkan dulu
+        sebelum STOP dikirim, jadi file yang belum diproses tetap di img-in.
+        """
+        cancelled = self._cancel_queued()
+        if cancelled:
+            print(f"⏹️ {cancelled} task antri dibatalkan (file tetap di img-in)")
+
+        remaining = []
+        for _ in range(self.size):
+            self._tasks.put(STOP)
+            self._stopping += 1
+
+        deadline = time.time() + timeout
+        while self._workers and time.time() < deadline:
+            remaining.extend(self.poll(timeout=0.25))
+
+        for process in self._workers.values():
+            print(f"⚠️ Worker {process.name} tidak berhenti, terminate")
+            process.terminate()
+            process.join(timeout=5)
+        self._workers.clear()
+        return remaining
+
+
+def benchmark(image_dir, max_workers=None, warmup=2):
+    """Throughput (gambar/detik) untuk 1..max_workers worker pada gambar di image_dir (tanpa DB)."""
+    images = sorted(glob.glob(os.path.join(image_dir, "*.jpg")))
+    if not images:
+        print(f"❌ Tidak ada gambar .jpg di {image_dir}")
+        return
+
+    cores = os.cpu_count() or 1
+    max_workers = max_workers or cores
+    counts = sorted({1, *[n for n in (2, 4, 8, 16, 32) if n < max_workers], max_workers})
+
+    print(f"📊 {len(images)} gambar, {cores} core")
+    baseline = None
+    for n in counts:
+        pool = WorkerPool(min_workers=n, max_workers=n, threads_per_worker=max(1, cores // n)).start()
+
+        # Tunggu semua worker selesai memuat model, lalu pemanasan
+        while pool.ready_workers < n:
+            pool.poll()
+        for path in images[:warmup] * n:
+            pool.submit(path)
+        while pool.backlog:
+            pool.poll()
+
+        start = time.perf_counter()
+        for path in images:
+            pool.submit(path)
+        errors = 0
+        while pool.backlog:
+            errors += sum(1 for message in pool.poll() if message["error"])
+        elapsed = time.perf_counter() - start
+        pool.shutdown()
+
+        throughput = len(images) / elapsed
+        baseline = baseline or throughput
+        print(f"   {n:>2} worker: {throughput:6.2f} gambar/detik | speedup {throughput / baseline:4.2f}x"
+              + (f" | {errors} error" if errors else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark worker pool in_validation")
+    parser.add_argument("--benchmark", metavar="DIR", required=True, help="folder gambar untuk benchmark")
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args()
+    benchmark(args.benchmark, max_workers=args.max_workers)
+
+
+if __name__ == "__main__":
+    main()
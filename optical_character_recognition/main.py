@@ -2,10 +2,23 @@
 import cv2
 import os
 import uuid
-from ultralytics import YOLO
 import sys
 import time
 import numpy as np
+from optical_character_recognition.plate_assembly import assemble_plate, is_valid_plate
+from optical_character_recognition.ocr_cache import ocr_cache
+from utils.yolo_runtime import load_yolo
+from utils.detections import Detections
+from utils.image_hash import content_hash
+from utils.priority import submit_background
+
+# Pass pertama diterima kalau kandidat teratas score >= OCR_ACCEPT_SCORE dan formatnya valid.
+# Kalau tidak, fallback dijalankan berurutan (dari yang paling murah) sampai ada yang lolos.
+OCR_ACCEPT_SCORE = float(os.environ.get("OCR_ACCEPT_SCORE", "0.6"))
+FALLBACK_CONF = 0.25        # threshold karakter untuk pass fallback
+UPSCALE_MAX_HEIGHT = 160    # crop yang lebih tinggi dari ini tidak di-upscale
+TTA_ANGLES = (-4, 4)        # derajat
+TTA_GAMMAS = (0.6, 1.6)
 
 def simple_loading(message="Loading", duration=1):
     """Simple loading animation untuk OCR"""
@@ -23,12 +36,14 @@ def simple_loading(message="Loading", duration=1):
 def load_ocr_model(model_path: str):
     """Load model OCR sekali saja."""
     simple_loading("Loading OCR model", 1)
-    model = YOLO(model_path)
+    model = load_yolo(model_path)
     print("✅ OCR Model loaded")
     return model
 
-def preprocess_plate_image(img):
-    """Preprocessing: grayscale, blur, CLAHE dengan grid output."""
+def preprocess_plate_image(img, save_grid=True):
+    """Preprocessing: grayscale, blur, CLAHE dengan grid output.
+    save_grid=False dipakai saat burst multi-frame agar tidak menulis grid tiap frame.
+    """
     # Simpan gambar asli untuk grid
     original_image = img.copy()
     
@@ -44,9 +59,17 @@ def preprocess_plate_image(img):
     
     # 4. Convert back to BGR untuk YOLO
     final_result = cv2.cvtColor(enhanced, cv2.COLOR_GRAY2BGR)
+
+    if not save_grid:
+        return final_result
+    
+    # BUAT GRID PREPROCESSING DAN SIMPAN (kelas background, tidak menahan OCR)
+    submit_background(save_ocr_preprocessing_grid, original_image, gray, bilateral, enhanced, final_result)
     
-    # BUAT GRID PREPROCESSING DAN SIMPAN
-    grid_image = create_ocr_preprocessing_grid(original_image, gray, bilateral, enhanced, final_result)
+    return final_result
+
+def save_ocr_preprocessing_grid(original, gray, bilateral, clahe, final):
+    grid_image = create_ocr_preprocessing_grid(original, gray, bilateral, clahe, final)
     
     # Simpan grid ke folder preprocessing
     grid_dir = "optical_character_recognition/output/preprocess_grids"
@@ -57,8 +80,6 @@ def preprocess_plate_image(img):
     cv2.imwrite(grid_path, grid_image)
     
     print(f"✅ Grid preprocessing disimpan: {os.path.basename(grid_path)}")
-    
-    return final_result
 
 def create_ocr_preprocessing_grid(original, gray, bilateral, clahe, final):
     """Membuat grid gambar dengan semua tahap preprocessing OCR"""
@@ -104,14 +125,166 @@ def create_ocr_preprocessing_grid(original, gray, bilateral, clahe, final):
     
     return grid
 
+def extract_characters(result, names):
+    """Ambil semua box karakter dari hasil YOLO OCR (char, posisi, confidence)."""
+    data = Detections.from_boxes(result.boxes, result.orig_img).data
+    if len(data) == 0:
+        return []
+
+    # Satu konversi array -> list Python, tanpa akses tensor per box
+    x_center = ((data["x1"] + data["x2"]) / 2).tolist()
+    y_center = ((data["y1"] + data["y2"]) / 2).tolist()
+    boxes = np.stack([data["x1"], data["y1"], data["x2"], data["y2"]], axis=1).tolist()
+
+    return [
+        {"char": names[cls_id], "x": x, "y": y, "conf": conf, "box": tuple(box)}
+        for cls_id, x, y, conf, box in zip(data["cls"].tolist(), x_center, y_center,
+                                           data["conf"].tolist(), boxes)
+    ]
+
+def read_plate_characters(img, model_ocr, conf_threshold: float = 0.5, top_k: int = 3):
+    """
+    OCR satu crop plat (array BGR) tanpa menulis file apapun.
+    Dipakai oleh tracking multi-frame.
+    Returns: top-k kandidat plat [{text, score, chars}, ...]
+    """
+    processed = preprocess_plate_image(img, save_grid=False)
+    results = model_ocr(processed, conf=conf_threshold, verbose=False)
+    return assemble_plate(extract_characters(results[0], model_ocr.names), top_k)
+
+def preprocess_plate_binary(img):
+    """Profil preprocessing alternatif: binarisasi Otsu + closing (plat kotor / kontras rendah)."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+    _, binary = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Karakter harus gelap di atas latar terang seperti data training
+    if np.count_nonzero(binary) < binary.size / 2:
+        binary = cv2.bitwise_not(binary)
+    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, np.ones((2, 2), np.uint8))
+    return cv2.cvtColor(binary, cv2.COLOR_GRAY2BGR)
+
+def save_detection_plot(result, det_path):
+    """Gambar box OCR + simpan (kelas background)."""
+    cv2.imwrite(det_path, result.plot())
+
+def is_confident(candidates):
+    """Kandidat teratas cukup yakin dan formatnya plat Indonesia yang valid."""
+    return bool(candidates) and candidates[0]["score"] >= OCR_ACCEPT_SCORE \
+        and is_valid_plate(candidates[0]["text"])
+
+def _ocr_pass(processed, model_ocr, conf_threshold, top_k=3):
+    results = model_ocr(processed, conf=conf_threshold, verbose=False)
+    return assemble_plate(extract_characters(results[0], model_ocr.names), top_k)
+
+def _merge_candidates(*candidate_lists, top_k=3):
+    """Gabung kandidat beberapa pass, score tertinggi per teks."""
+    best = {}
+    for candidates in candidate_lists:
+        for cand in candidates:
+            if cand["text"] not in best or cand["score"] > best[cand["text"]]["score"]:
+                best[cand["text"]] = cand
+    return sorted(best.values(), key=lambda c: c["score"], reverse=True)[:top_k]
+
+def _upscale_pass(img, model_ocr, top_k):
+    h = img.shape[0]
+    if h >= UPSCALE_MAX_HEIGHT:
+        return []
+    scale = min(4.0, max(2.0, UPSCALE_MAX_HEIGHT / h))
+    upscaled = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    return _ocr_pass(preprocess_plate_image(upscaled, save_grid=False), model_ocr, FALLBACK_CONF, top_k)
+
+def _tta_pass(img, model_ocr, top_k):
+    """
+    Test-time augmentation: rotasi kecil + gamma. Score tiap teks dirata-rata terhadap semua
+    varian (varian yang tidak membaca teks itu dihitung 0), jadi bacaan yang konsisten menang.
+    """
+    h, w = img.shape[:2]
+    variants = []
+    for angle in TTA_ANGLES:
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        variants.append(cv2.warpAffine(img, matrix, (w, h), borderMode=cv2.BORDER_REPLICATE))
+    for gamma in TTA_GAMMAS:
+        table = (255 * (np.arange(256) / 255.0) ** gamma).astype(np.uint8)
+        variants.append(cv2.LUT(img, table))
+
+    votes = {}
+    for variant in variants:
+        for cand in _ocr_pass(preprocess_plate_image(variant, save_grid=False), model_ocr,
+                              FALLBACK_CONF, top_k):
+            total, best = votes.get(cand["text"], (0.0, cand))
+            votes[cand["text"]] = (total + cand["score"], best if best["score"] >= cand["score"] else cand)
+
+    candidates = [dict(best, score=total / len(variants)) for total, best in votes.values()]
+    return sorted(candidates, key=lambda c: c["score"], reverse=True)[:top_k]
+
+def run_fallback_passes(img, model_ocr, candidates, top_k=3, deadline=None, pass_s=None):
+    """
+    Dipanggil kalau pass pertama tidak meyakinkan. Pass makin mahal dicoba berurutan,
+    berhenti begitu hasil gabungan lolos is_confident().
+    deadline: batas waktu (time.perf_counter()) dari budget tahap OCR lane keluar. Pass berikutnya
+    tidak dimulai kalau perkiraan selesainya (pass_s x jumlah inferensi) melewati deadline;
+    hasil terbaik sejauh ini dikembalikan, bukan timeout.
+    Returns: (kandidat gabungan, nama pass terakhir yang dijalankan / "budget" / "exhausted")
+    """
+    passes = [
+        ("low_conf", 1, lambda: _ocr_pass(preprocess_plate_image(img, save_grid=False), model_ocr,
+                                          FALLBACK_CONF, top_k)),
+        ("upscale", 1, lambda: _upscale_pass(img, model_ocr, top_k)),
+        ("binary", 1, lambda: _ocr_pass(preprocess_plate_binary(img), model_ocr, FALLBACK_CONF, top_k)),
+        ("tta", len(TTA_ANGLES) + len(TTA_GAMMAS), lambda: _tta_pass(img, model_ocr, top_k)),
+    ]
+    for name, inferences, run in passes:
+        if deadline is not None and time.perf_counter() + (pass_s or 0.0) * inferences > deadline:
+            best = f"{candidates[0]['text']} ({candidates[0]['score']:.2f})" if candidates else "-"
+            print(f"⏱️ Budget OCR habis sebelum fallback '{name}', hasil terbaik: {best}")
+            return candidates, "budget"
+
+        started = time.perf_counter()
+        candidates = _merge_candidates(candidates, run(), top_k=top_k)
+        # Perkiraan biaya satu inferensi dari pass yang baru saja berjalan
+        pass_s = (time.perf_counter() - started) / inferences
+        if is_confident(candidates):
+            print(f"✅ OCR fallback '{name}': {candidates[0]['text']} ({candidates[0]['score']:.2f})")
+            return candidates, name
+
+    best = f"{candidates[0]['text']} ({candidates[0]['score']:.2f})" if candidates else "-"
+    print(f"⚠️ Semua fallback OCR dicoba, hasil terbaik: {best}")
+    return candidates, "exhausted"
+
+def _finish_ocr(img, model_ocr, candidates, cache_key, deadline=None, pass_s=None):
+    """Fallback kalau perlu, lalu simpan hasil akhir ke cache OCR."""
+    stopped = None
+    if not is_confident(candidates):
+        candidates, stopped = run_fallback_passes(img, model_ocr, candidates,
+                                                  deadline=deadline, pass_s=pass_s)
+    # Hasil yang dipotong budget tidak di-cache: crop yang sama tanpa deadline boleh mencoba semua pass
+    if stopped != "budget":
+        ocr_cache.put(cache_key, candidates)
+    return candidates
+
+def _cached_ocr(img, conf_threshold):
+    """Returns (cache_key, kandidat dari cache atau None)."""
+    # Hash kriptografis crop: plat yang beda satu karakter tidak boleh berbagi hasil
+    cache_key = (conf_threshold, content_hash(img))
+    cached = ocr_cache.get(cache_key)
+    if cached is not None:
+        plate_string = cached[0]["text"] if cached else ""
+        print(f"✅ Plate dari cache OCR: {plate_string or '-'} {ocr_cache.stats()}")
+    return cache_key, cached
+
 def run_ocr_on_plate(crop_path: str,
                      model_ocr,
                      preprocess_dir: str,
                      det_dir: str,
-                     conf_threshold: float = 0.5):
+                     conf_threshold: float = 0.5,
+                     return_candidates: bool = False,
+                     deadline: float = None):
     """
     OCR process dengan loading animation
-    Returns: plate_string
+    crop_path: path file crop plat, atau crop array BGR langsung dari Detections
+    deadline: time.perf_counter() batas pass fallback (None = semua fallback boleh jalan)
+    Returns: plate_string, atau list kandidat [{text, score, chars}, ...]
+             kalau return_candidates=True
     """
     print("\n🔤 OCR PROCESS")
     print("=" * 20)
@@ -120,17 +293,24 @@ def run_ocr_on_plate(crop_path: str,
     os.makedirs(preprocess_dir, exist_ok=True)
     os.makedirs(det_dir, exist_ok=True)
 
-    base_name = os.path.basename(crop_path)
+    base_name = "plate.jpg" if isinstance(crop_path, np.ndarray) else os.path.basename(crop_path)
     
     # 1. Load image
     simple_loading("Membaca gambar plat", 0.5)
-    img = cv2.imread(crop_path)
+    img = crop_path if isinstance(crop_path, np.ndarray) else cv2.imread(crop_path)
 
     if img is None:
         print("❌ Gagal membaca gambar plat")
-        return ""
+        return [] if return_candidates else ""
 
     print("✅ Gambar plat terbaca")
+
+    # Crop yang sama sudah pernah dibaca (event diulang) -> tanpa OCR / fallback lagi
+    cache_key, cached = _cached_ocr(img, conf_threshold)
+    if cached is not None:
+        if return_candidates:
+            return cached
+        return cached[0]["text"] if cached else ""
     
     # 2. Preprocessing (sekarang otomatis menyimpan grid)
     simple_loading("Preprocessing gambar", 1)
@@ -139,63 +319,43 @@ def run_ocr_on_plate(crop_path: str,
     # Save preprocessed image untuk OCR process
     preprocess_filename = f"proc_{uuid.uuid4().hex}_{base_name}"
     preprocess_path = os.path.join(preprocess_dir, preprocess_filename)
-    cv2.imwrite(preprocess_path, processed)
+    submit_background(cv2.imwrite, preprocess_path, processed)
     
     print("✅ Preprocessing selesai")
     
     # 3. OCR Detection
     simple_loading("Running OCR detection", 1.5)
+    started = time.perf_counter()
     results = model_ocr(processed, conf=conf_threshold, verbose=False)
+    pass_s = time.perf_counter() - started
 
     # 4. Save detection result
-    det_image = results[0].plot()
     det_filename = f"ocr_{uuid.uuid4().hex}_{base_name}"
     det_path = os.path.join(det_dir, det_filename)
-    cv2.imwrite(det_path, det_image)
+    submit_background(save_detection_plot, results[0], det_path)
     
     print("✅ OCR detection selesai")
     
     # 5. Extract characters
     simple_loading("Extracting karakter", 1)
-    chars = []
-    names = model_ocr.names
-
-    for box in results[0].boxes:
-        cls_id = int(box.cls[0])
-        char = names[cls_id]
-
-        x1, y1, x2, y2 = map(int, box.xyxy[0])
-        x_center = (x1 + x2) / 2
-        y_center = (y1 + y2) / 2
+    chars = extract_characters(results[0], model_ocr.names)
 
-        chars.append({
-            "char": char,
-            "x": x_center,
-            "y": y_center
-        })
-
-    # Jika tidak ada karakter terdeteksi
+    # Jika tidak ada karakter terdeteksi -> langsung ke fallback
     if not chars:
         print("❌ Tidak ada karakter terdeteksi")
-        return ""
 
     # 6. Filter dan sort karakter
     simple_loading("Processing karakter", 0.5)
     
-    # Kelompokkan berdasarkan baris (ambil baris atas saja)
-    top_line_y = min(c["y"] for c in chars)
-    Y_TOL = 25  # Toleransi variasi tinggi karakter
-
-    # Filter karakter yang berada di baris yang sama
-    filtered = [c for c in chars if abs(c["y"] - top_line_y) < Y_TOL]
-
-    # Sort dari kiri ke kanan
-    filtered = sorted(filtered, key=lambda c: c["x"])
-
-    # Gabungkan menjadi string
-    plate_string = "".join(c["char"] for c in filtered)
+    # NMS per karakter, clustering baris, decoding dengan format plat Indonesia
+    candidates = assemble_plate(chars) if chars else []
+    # Score rendah / format tidak valid -> pass fallback (threshold rendah, upscale, profil lain, TTA)
+    candidates = _finish_ocr(img, model_ocr, candidates, cache_key, deadline, pass_s)
+    plate_string = candidates[0]["text"] if candidates else ""
     
     print(f"✅ Plate terbaca: {plate_string}")
+    if return_candidates:
+        return candidates
     return plate_string
 
 # Alternatif version dengan threading loading (lebih smooth)
@@ -234,10 +394,15 @@ def run_ocr_on_plate_smooth(crop_path: str,
                            model_ocr,
                            preprocess_dir: str,
                            det_dir: str,
-                           conf_threshold: float = 0.5):
+                           conf_threshold: float = 0.5,
+                            return_candidates: bool = False,
+                            deadline: float = None):
     """
     OCR process dengan smooth loading animation
-    Returns: plate_string
+    crop_path: path file crop plat, atau crop array BGR langsung dari Detections
+    deadline: time.perf_counter() batas pass fallback (budget tahap OCR lane keluar)
+    Returns: plate_string, atau list kandidat [{text, score, chars}, ...]
+             kalau return_candidates=True
     """
     print("\n🔤 OCR PROCESS")
     print("=" * 20)
@@ -246,17 +411,23 @@ def run_ocr_on_plate_smooth(crop_path: str,
     os.makedirs(preprocess_dir, exist_ok=True)
     os.makedirs(det_dir, exist_ok=True)
 
-    base_name = os.path.basename(crop_path)
+    base_name = "plate.jpg" if isinstance(crop_path, np.ndarray) else os.path.basename(crop_path)
     
     # 1. Load image
     loading = OCRLoading("Membaca gambar plat")
     loading.start()
-    img = cv2.imread(crop_path)
+    img = crop_path if isinstance(crop_path, np.ndarray) else cv2.imread(crop_path)
     loading.stop("Gambar plat terbaca")
 
     if img is None:
         print("❌ Gagal membaca gambar plat")
-        return ""
+        return [] if return_candidates else ""
+
+    cache_key, cached = _cached_ocr(img, conf_threshold)
+    if cached is not None:
+        if return_candidates:
+            return cached
+        return cached[0]["text"] if cached else ""
 
     # 2. Preprocessing (otomatis menyimpan grid)
     loading = OCRLoading("Preprocessing gambar")
@@ -267,52 +438,37 @@ def run_ocr_on_plate_smooth(crop_path: str,
     # Save preprocessed image untuk OCR process
     preprocess_filename = f"proc_{uuid.uuid4().hex}_{base_name}"
     preprocess_path = os.path.join(preprocess_dir, preprocess_filename)
-    cv2.imwrite(preprocess_path, processed)
+    submit_background(cv2.imwrite, preprocess_path, processed)
     
     # 3. OCR Detection
     loading = OCRLoading("Running OCR detection")
     loading.start()
+    started = time.perf_counter()
     results = model_ocr(processed, conf=conf_threshold, verbose=False)
+    pass_s = time.perf_counter() - started
     loading.stop("OCR detection selesai")
 
     # 4. Save detection result
-    det_image = results[0].plot()
     det_filename = f"ocr_{uuid.uuid4().hex}_{base_name}"
     det_path = os.path.join(det_dir, det_filename)
-    cv2.imwrite(det_path, det_image)
+    submit_background(save_detection_plot, results[0], det_path)
     
     # 5. Extract characters
     loading = OCRLoading("Extracting karakter")
     loading.start()
-    chars = []
-    names = model_ocr.names
-
-    for box in results[0].boxes:
-        cls_id = int(box.cls[0])
-        char = names[cls_id]
-
-        x1, y1, x2, y2 = map(int, box.xyxy[0])
-        x_center = (x1 + x2) / 2
-        y_center = (y1 + y2) / 2
-
-        chars.append({
-            "char": char,
-            "x": x_center,
-            "y": y_center
-        })
-
-    # Jika tidak ada karakter terdeteksi
-    if not chars:
-        loading.stop("Tidak ada karakter terdeteksi")
-        return ""
-
-    # 6. Filter dan sort karakter
-    top_line_y = min(c["y"] for c in chars)
-    Y_TOL = 25
-
-    filtered = [c for c in chars if abs(c["y"] - top_line_y) < Y_TOL]
-    filtered = sorted(filtered, key=lambda c: c["x"])
-    plate_string = "".join(c["char"] for c in filtered)
+    chars = extract_characters(results[0], model_ocr.names)
+    candidates = assemble_plate(chars) if chars else []
+
+    # 6. Pass pertama tidak meyakinkan -> fallback
+    if not is_confident(candidates):
+        loading.stop("Hasil OCR belum meyakinkan, mencoba fallback" if chars
+                     else "Tidak ada karakter terdeteksi, mencoba fallback")
+        loading = OCRLoading("OCR fallback")
+        loading.start()
+    candidates = _finish_ocr(img, model_ocr, candidates, cache_key, deadline, pass_s)
+    plate_string = candidates[0]["text"] if candidates else ""
     
     loading.stop(f"Plate terbaca: {plate_string}")
+    if return_candidates:
+        return candidates
     return plate_string
\ No newline at end of file
@@ -0,0 +1,56 @@
+# optical_character_recognition/ocr_cache.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class OCRResultCache:
+    """
+    Cache LRU + TTL untuk hasil OCR plat, key = (conf_threshold, content_hash crop plat).
+    Crop yang persis sama (event diulang, file diproses ulang) tidak perlu OCR + fallback lagi.
+    Hash perseptual tidak dipakai: dua plat yang beda satu karakter di framing lane yang sama
+    bisa punya dHash sama, dan plat yang salah jauh lebih mahal dari OCR ulang.
+    """
+
+    def __init__(self, max_size=256, ttl_s=600):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (created_at, candidates)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or now - item[0] > self.ttl_s:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(item[1])
+
+    def put(self, key, candidates):
+        with self._lock:
+            self._entries[key] = (time.time(), copy.deepcopy(candidates))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions
+        }
+
+
+ocr_cache = OCRResultCache()
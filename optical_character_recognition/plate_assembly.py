@@ -0,0 +1,205 @@
+# optical_character_recognition/plate_assembly.py
+import math
+from statistics import median
+
+# Kode wilayah plat Indonesia (awalan huruf)
+REGION_CODES = frozenset([
+    "A", "B", "D", "E", "F", "G", "H", "K", "L", "M", "N", "P", "R", "S", "T", "W", "Z",
+    "AA", "AB", "AD", "AE", "AG",
+    "BA", "BB", "BD", "BE", "BG", "BH", "BK", "BL", "BM", "BN", "BP",
+    "DA", "DB", "DC", "DD", "DE", "DG", "DH", "DK", "DL", "DM", "DN", "DR", "DS", "DT",
+    "EA", "EB", "ED",
+    "KB", "KH", "KT", "KU",
+    "PA", "PB",
+])
+
+# Pasangan karakter yang sering tertukar oleh model OCR
+CONFUSIONS = {
+    "0": "OD", "O": "0D", "D": "0O",
+    "1": "I", "I": "1",
+    "2": "Z", "Z": "2",
+    "4": "A", "A": "4",
+    "5": "S", "S": "5",
+    "6": "G", "G": "6",
+    "8": "B", "B": "8",
+}
+
+CONFUSION_PENALTY = 0.3     # faktor probabilitas untuk karakter hasil substitusi
+UNKNOWN_REGION_PENALTY = 0.5
+INVALID_FORMAT_PENALTY = 0.2
+NMS_IOU = 0.5
+LINE_GAP_RATIO = 0.6        # jarak vertikal antar baris relatif terhadap tinggi karakter median
+
+# Grammar: awalan huruf (1-2), angka (1-4), akhiran huruf (0-3)
+SEGMENTS = [
+    {"type": "alpha", "max": 2},
+    {"type": "digit", "max": 4},
+    {"type": "alpha", "max": 3},
+]
+
+
+def _iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+def char_nms(chars, iou_threshold=NMS_IOU):
+    """
+    NMS per posisi karakter. Box yang saling tumpang-tindih digabung jadi satu slot;
+    kelas yang kalah tetap disimpan sebagai alternatif untuk decoder.
+    Returns: list slot {x, y, h, box, candidates: {char: conf}}
+    """
+    slots = []
+    for c in sorted(chars, key=lambda c: c["conf"], reverse=True):
+        for slot in slots:
+            if _iou(slot["box"], c["box"]) >= iou_threshold:
+                prev = slot["candidates"].get(c["char"], 0.0)
+                slot["candidates"][c["char"]] = max(prev, c["conf"])
+                break
+        else:
+            x1, y1, x2, y2 = c["box"]
+            slots.append({
+                "x": c["x"],
+                "y": c["y"],
+                "h": y2 - y1,
+                "box": c["box"],
+                "candidates": {c["char"]: c["conf"]}
+            })
+    return slots
+
+
+def cluster_lines(slots):
+    """Kelompokkan slot per baris berdasarkan tinggi karakter median (tidak bergantung resolusi)."""
+    if not slots:
+        return []
+
+    gap = LINE_GAP_RATIO * median(s["h"] for s in slots)
+
+    lines = []
+    for slot in sorted(slots, key=lambda s: s["y"]):
+        if lines and slot["y"] - lines[-1][-1]["y"] <= gap:
+            lines[-1].append(slot)
+        else:
+            lines.append([slot])
+
+    return [sorted(line, key=lambda s: s["x"]) for line in lines]
+
+
+def _slot_options(slot):
+    """Semua karakter yang mungkin untuk satu slot beserta probabilitasnya."""
+    options = dict(slot["candidates"])
+    for char, conf in slot["candidates"].items():
+        for alt in CONFUSIONS.get(char, ""):
+            options[alt] = max(options.get(alt, 0.0), conf * CONFUSION_PENALTY)
+    return options
+
+
+def _next_state(state, char):
+    """Transisi grammar. state = (segmen, jumlah karakter di segmen) atau None di awal."""
+    kind = "digit" if char.isdigit() else "alpha"
+
+    if state is None:
+        return (0, 1) if kind == "alpha" else None
+
+    seg, count = state
+    if SEGMENTS[seg]["type"] == kind and count < SEGMENTS[seg]["max"]:
+        return (seg, count + 1)
+    if seg + 1 < len(SEGMENTS) and SEGMENTS[seg + 1]["type"] == kind:
+        return (seg + 1, 1)
+    return None
+
+
+def is_valid_plate(text):
+    """Format plat Indonesia lengkap: awalan wilayah dikenal + angka (+ akhiran huruf)."""
+    state = None
+    for char in text:
+        state = _next_state(state, char)
+        if state is None:
+            return False
+    if state is None or state[0] < 1:
+        return False
+    prefix = text[:len(text) - len(text.lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))]
+    return prefix in REGION_CODES
+
+
+def constrained_decode(line, top_k=3):
+    """
+    Beam search dengan grammar plat Indonesia.
+    Returns: list {text, score, chars: [(char, prob), ...]} urut score tertinggi
+    """
+    # beam: state -> list of (log_prob, text, chars)
+    beams = {None: [(0.0, "", [])]}
+
+    for slot in line:
+        options = _slot_options(slot)
+        new_beams = {}
+        for state, entries in beams.items():
+            for log_p, text, chars in entries:
+                for char, prob in options.items():
+                    nxt = _next_state(state, char)
+                    if nxt is None or prob <= 0:
+                        continue
+                    new_beams.setdefault(nxt, []).append(
+                        (log_p + math.log(prob), text + char, chars + [(char, prob)])
+                    )
+        beams = {
+            state: sorted(entries, reverse=True)[:top_k]
+            for state, entries in new_beams.items()
+        }
+
+    candidates = []
+    for state, entries in beams.items():
+        # Minimal harus ada awalan + angka
+        if state is None or state[0] < 1:
+            continue
+        for log_p, text, chars in entries:
+            score = math.exp(log_p / len(chars))
+            prefix = text[:len(text) - len(text.lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))]
+            if prefix not in REGION_CODES:
+                score *= UNKNOWN_REGION_PENALTY
+            candidates.append({"text": text, "score": score, "chars": chars})
+
+    candidates.sort(key=lambda c: c["score"], reverse=True)
+    return candidates[:top_k]
+
+
+def _raw_reading(line):
+    """Pembacaan tanpa grammar (kelas terbaik per slot) sebagai fallback."""
+    chars = [max(s["candidates"].items(), key=lambda kv: kv[1]) for s in line]
+    if not chars:
+        return None
+    score = math.exp(sum(math.log(p) for _, p in chars) / len(chars)) * INVALID_FORMAT_PENALTY
+    return {"text": "".join(c for c, _ in chars), "score": score, "chars": chars}
+
+
+def assemble_plate(chars, top_k=3):
+    """
+    Susun string plat dari box karakter OCR: NMS -> clustering baris -> decoder ber-grammar.
+    Plat dua baris (nomor + masa berlaku) ditangani dengan memilih baris yang paling cocok.
+    Returns: top-k kandidat [{text, score, chars}, ...], kosong jika tidak ada karakter
+    """
+    lines = cluster_lines(char_nms(chars))
+
+    candidates = []
+    for line in lines:
+        decoded = constrained_decode(line, top_k)
+        if decoded:
+            candidates.extend(decoded)
+        else:
+            raw = _raw_reading(line)
+            if raw:
+                candidates.append(raw)
+
+    # Deduplikasi teks yang sama dari baris berbeda, ambil score tertinggi
+    best = {}
+    for cand in candidates:
+        if cand["text"] not in best or cand["score"] > best[cand["text"]]["score"]:
+            best[cand["text"]] = cand
+
+    return sorted(best.values(), key=lambda c: c["score"], reverse=True)[:top_k]
@@ -0,0 +1,203 @@
+# optical_character_recognition/tracking.py
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from optical_character_recognition.main import read_plate_characters
+from utils.detections import Detections, PLATE_CLS
+from utils.roi import detect_in_roi
+
+PLATE_CLASS_ID = PLATE_CLS
+
+
+def box_iou(a, b):
+    """IoU dua box (x1, y1, x2, y2)."""
+    ix1 = max(a[0], b[0])
+    iy1 = max(a[1], b[1])
+    ix2 = min(a[2], b[2])
+    iy2 = min(a[3], b[3])
+
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+def vote_characters(readings):
+    """
+    Gabungkan pembacaan plat dari beberapa frame dengan voting berbobot confidence.
+
+    readings: list of list [(char, conf), ...] per frame (sudah urut kiri ke kanan)
+    Returns: (plate_string, confidence) - confidence = rasio vote terlemah per posisi
+    """
+    # Pilih panjang plat yang paling didukung. Pembacaan dengan panjang lain
+    # (karakter hilang / dobel) tidak bisa disejajarkan per posisi, jadi diabaikan.
+    length_weight = defaultdict(float)
+    for reading in readings:
+        if reading:
+            length_weight[len(reading)] += sum(conf for _, conf in reading) / len(reading)
+
+    if not length_weight:
+        return "", 0.0
+
+    best_len = max(length_weight, key=length_weight.get)
+
+    positions = [defaultdict(float) for _ in range(best_len)]
+    for reading in readings:
+        if len(reading) != best_len:
+            continue
+        for i, (char, conf) in enumerate(reading):
+            positions[i][char] += conf
+
+    plate_string = ""
+    ratios = []
+    for votes in positions:
+        char = max(votes, key=votes.get)
+        total = sum(votes.values())
+        plate_string += char
+        ratios.append(votes[char] / total if total > 0 else 0.0)
+
+    return plate_string, min(ratios)
+
+
+class PlateTrack:
+    """Satu plat yang diikuti antar frame (asosiasi lewat IoU)."""
+
+    def __init__(self, box, conf, frame):
+        self.box = box
+        self.best_conf = conf
+        self.best_frame = frame
+        self.readings = []
+
+    def update(self, box, conf, frame, reading):
+        self.box = box
+        if conf > self.best_conf:
+            self.best_conf = conf
+            self.best_frame = frame
+        self.readings.append(reading)
+
+    def consensus(self):
+        return vote_characters(self.readings)
+
+
+class PlateTracker:
+    """
+    Tracker jendela pendek: deteksi plat di beberapa frame berurutan,
+    asosiasi box lewat IoU, lalu voting karakter per posisi.
+    Berhenti lebih awal kalau hasil voting sudah stabil.
+    """
+
+    def __init__(self, yolo_model, ocr_model,
+                 iou_threshold=0.3,
+                 conf_threshold=0.5,
+                 min_frames=2,
+                 stable_frames=2,
+                 min_vote_ratio=0.6,
+                 lane=None):
+        self.yolo_model = yolo_model
+        self.lane = lane
+        self.ocr_model = ocr_model
+        self.iou_threshold = iou_threshold
+        self.conf_threshold = conf_threshold
+        self.min_frames = min_frames
+        self.stable_frames = stable_frames
+        self.min_vote_ratio = min_vote_ratio
+
+        self.tracks = []
+        self.frames_seen = 0
+        self._last_text = None
+        self._stable_count = 0
+
+    def _detect_plates(self, frame):
+        detections = Detections.from_boxes(detect_in_roi(frame, self.yolo_model, lane=self.lane), frame)
+        plates = detections.of_class(PLATE_CLASS_ID).data
+        boxes = np.stack([plates["x1"], plates["y1"], plates["x2"], plates["y2"]], axis=1).tolist()
+        return [(tuple(box), conf) for box, conf in zip(boxes, plates["conf"].tolist())]
+
+    def _associate(self, box):
+        best_track, best_iou = None, self.iou_threshold
+        for track in self.tracks:
+            iou = box_iou(track.box, box)
+            if iou >= best_iou:
+                best_track, best_iou = track, iou
+        return best_track
+
+    def main_track(self):
+        """Track dengan observasi terbanyak (plat kendaraan di depan gate)."""
+        if not self.tracks:
+            return None
+        return max(self.tracks, key=lambda t: (len(t.readings), t.best_conf))
+
+    def update(self, frame):
+        """Proses satu frame. Returns True kalau consensus sudah stabil."""
+        self.frames_seen += 1
+
+        for box, conf in self._detect_plates(frame):
+            x1, y1, x2, y2 = box
+            candidates = read_plate_characters(frame[y1:y2, x1:x2], self.ocr_model, self.conf_threshold)
+            reading = candidates[0]["chars"] if candidates else []
+
+            track = self._associate(box)
+            if track is None:
+                track = PlateTrack(box, conf, frame)
+                self.tracks.append(track)
+            track.update(box, conf, frame, reading)
+
+        return self.is_stable()
+
+    def is_stable(self):
+        track = self.main_track()
+        if track is None:
+            return False
+
+        text, ratio = track.consensus()
+        if text and text == self._last_text and ratio >= self.min_vote_ratio:
+            self._stable_count += 1
+        else:
+            self._stable_count = 0
+        self._last_text = text
+
+        return self.frames_seen >= self.min_frames and self._stable_count >= self.stable_frames - 1
+
+    def result(self):
+        """Returns dict {text, confidence, frame, frames_used}."""
+        track = self.main_track()
+        if track is None:
+            return {"text": "", "confidence": 0.0, "frame": None, "frames_used": self.frames_seen}
+
+        text, ratio = track.consensus()
+        return {
+            "text": text,
+            "confidence": ratio,
+            "frame": track.best_frame,
+            "frames_used": self.frames_seen
+        }
+
+
+def track_plate_burst(read_frame, yolo_model, ocr_model, max_frames=5, deadline=None, **kwargs):
+    """
+    Jalankan tracker pada burst frame sampai stabil atau max_frames habis.
+    read_frame: callable tanpa argumen -> frame BGR atau None
+    deadline: time.perf_counter() batas burst (budget tahap keputusan gate); frame berikutnya
+              tidak diproses kalau perkiraan selesainya melewati deadline -> hasil sejauh ini
+    """
+    tracker = PlateTracker(yolo_model, ocr_model, **kwargs)
+    frame_s = 0.0
+
+    for _ in range(max_frames):
+        if deadline is not None and time.perf_counter() + frame_s > deadline:
+            print(f"⏱️ Budget tracking habis setelah {tracker.frames_seen} frame")
+            break
+        started = time.perf_counter()
+        frame = read_frame()
+        if frame is None:
+            continue
+        if tracker.update(frame):
+            break
+        frame_s = time.perf_counter() - started
+
+    return tracker.result()
@@ -1,13 +1,9 @@
-import cv2
-import uuid
 import os
 import sys
 import numpy as np
-from ultralytics import YOLO
 import time
 import serial
 from datetime import datetime
-from sklearn.metrics.pairwise import cosine_similarity
 
 
 TRIGGER_DIR = os.path.join(os.path.dirname(__file__), "triggers")
@@ -20,19 +16,46 @@ if ROOT_DIR not in sys.path:
 from utils.setup import setup_environment
 setup_environment()
 
+# Lane keluar = pekerjaan live: core CPU sendiri, terpisah dari proses latar (sebelum model dimuat)
+from utils.priority import apply_thread_budget
+apply_thread_budget("live")
+
 from optical_character_recognition.main import load_ocr_model, run_ocr_on_plate_smooth
-from face_recog.main import process_face_recognition
-from utils.database import get_active_entry_by_plate, mark_entry_exited
+from optical_character_recognition.tracking import track_plate_burst
+from face_recog.main import process_face_recognition, current_face_model
+from face_recog.quality import select_face
+from face_recog.embedders import LEGACY_FACE_MODEL, get_legacy_embedder
+from face_recog.verification import Verifier
+from utils.entry_cache import ActiveEntryCache
+from utils.db_writer import AsyncDBWriter
+from utils.events import emit_gate_event
+from utils.yolo_runtime import load_yolo
+from utils.roi import detect_in_roi
+from utils.detections import Detections, PLATE_CLS
+from utils.motion import MotionGate
+from utils.sensor import is_vehicle_line
+from utils.preview import LiveView
+from utils.frame_source import open_source
+from utils.deadline import GateDecision, TimerScheduler, LaneHold
 
 # === CONFIG ===
-CROP_DIR = os.path.join(os.path.dirname(__file__), "img-live")
-os.makedirs(CROP_DIR, exist_ok=True)
-
 SERIAL_PORT = "COM9"
 BAUD_RATE = 115200
 
+# Jumlah frame maksimal untuk tracking plat setelah trigger sensor
+TRACK_MAX_FRAMES = 5
+
+# Lane ditahan (trigger diabaikan) setelah gate dibuka / setelah keputusan lain
+GATE_OPEN_HOLD_S = 2.0
+POST_DECISION_HOLD_S = 1.0
+scheduler = TimerScheduler()
+lane_hold = LaneHold(scheduler, "out")
+
 serial_conn = None
 
+# Cache entry active (dibuat + di-warm di main(), bukan saat import), keputusan gate tanpa query DB
+entry_cache = None
+
 
 # ================================ #
 #      SERIAL COMMUNICATION        #
@@ -62,88 +85,205 @@ def send_serial(cmd):
 #         YOLO DETECTION           #
 # ================================ #
 
-model_det = YOLO('../model/detection.pt')
+model_det = load_yolo('../model/detection.pt')
 
 def detect_objects(frame):
-    results = model_det(frame)[0]
+    """Deteksi plat & wajah di ROI lane keluar. Kembalikan Detections (array box + frame)."""
+    return Detections.from_boxes(detect_in_roi(frame, model_det, lane="out"), frame)
+
+
+# ================================ #
+#        MAIN VALIDATION           #
+# ================================ #
+
+def lookup_entries(plate_candidates):
+    """Cari entry active di cache: plat persis dulu, lalu plat mirip. Returns (entries, exact)."""
+    entry_cache.sync()
+    for candidate in plate_candidates:
+        db = entry_cache.get_by_plate(candidate)
+        if db:
+            return [db], True
+
+    # Fallback: plat mirip (salah baca OCR), wajah tetap harus cocok
+    return entry_cache.find_fuzzy(plate_candidates[0]), False
 
-    crops = {"plate": [], "face": []}
 
-    for box in results.boxes:
-        cls = int(box.cls[0])
-        x1, y1, x2, y2 = map(int, box.xyxy[0])
+def entry_face_model(entry):
+    """Model wajah entry; entry sebelum ada kolom face_model dibuat dengan pipeline lama."""
+    return entry.get('face_model') or LEGACY_FACE_MODEL
 
-        label = "plate" if cls == 0 else "face" if cls == 1 else None
-        if not label:
+
+def match_face(face_encs, db_entries):
+    """
+    face_encs: {model_id: vektor wajah kendaraan keluar} (model aktif, + LEGACY_FACE_MODEL
+    kalau ada kandidat entry lama).
+    Returns (entry yang cocok atau None, similarity tertinggi).
+    Kandidat per model (dan semua template-nya) diskor dengan satu perkalian matriks.
+    """
+    # Vektor dari model berbeda tidak bisa dibandingkan -> hanya diskor dengan vektor model yang sama
+    skipped = sum(1 for e in db_entries if face_encs.get(entry_face_model(e)) is None)
+    if skipped:
+        print(f"⚠️ {skipped} entry dengan model wajah lain dilewati")
+
+    matched, best_sim, best_margin = None, 0.0, None
+    for model, face_enc in face_encs.items():
+        candidates = [e for e in db_entries if entry_face_model(e) == model]
+        if face_enc is None or not candidates:
             continue
+        verifier = Verifier(model)
+        best, sim = verifier.best_match(face_enc, [e['face_templates'] for e in candidates])
+        # Threshold berbeda per model -> pemenang dipilih dari selisih terhadap threshold
+        margin = sim - verifier.threshold
+        if best_margin is None or margin > best_margin:
+            best_margin, best_sim = margin, sim
+            matched = candidates[best] if best is not None else None
+    return matched, max(0.0, best_sim)
 
-        crop = frame[y1:y2, x1:x2]
-        crop_id = str(uuid.uuid4())
-        path = os.path.join(CROP_DIR, f"{label}_{crop_id}.jpg")
-        cv2.imwrite(path, crop)
 
-        crops[label].append({"path": path})
+def open_gate(decision, entry, reason, sim=None, audit=False):
+    entry_cache.mark_exited(entry['id'])
+    emit_gate_event("exit", lane="out", plate=entry['plate_text'], entry_id=entry['id'],
+                    similarity=None if sim is None else float(sim), audit=audit)
 
-    return crops
+    send_serial("silent")
+    send_serial("o")  # open gate
+    # Trigger baru diabaikan selama gate terbuka, tanpa memblok loop kamera
+    lane_hold.hold(GATE_OPEN_HOLD_S, "gate_open")
+    decision.finish("allow", reason, audit=audit, plate=entry['plate_text'], entry_id=entry['id'])
+    return True
 
 
-def compare_encoding(a, b, threshold=0.5):
-    sim = cosine_similarity([a], [b])[0][0]
-    return sim >= threshold, sim
+def deny(decision, reason, plate=None, **data):
+    send_serial("buzz")
+    emit_gate_event("rejection", lane="out", reason=reason, plate=plate, **data)
+    lane_hold.hold(POST_DECISION_HOLD_S, reason)
+    decision.finish("deny", reason, plate=plate)
+    return False
 
 
-# ================================ #
-#        MAIN VALIDATION           #
-# ================================ #
+def on_stage_timeout(decision, stage, plate=None, entry=None):
+    """Tahap melewati budget -> keputusan sesuai GATE_TIMEOUT_POLICY."""
+    reason = f"{stage}_timeout"
+    outcome = decision.timeout_outcome(plate_matched=entry is not None)
 
-def process_vehicle(frame, ocr_model):
+    if outcome == "allow":
+        print(f"⚠️ {stage} terlambat, gate dibuka berdasarkan plat saja (audit)")
+        return open_gate(decision, entry, reason, audit=True)
+
+    if outcome == "escalate":
+        print(f"📣 {stage} terlambat, diteruskan ke operator")
+        emit_gate_event("escalation", lane="out", decision_id=decision.id, stage=stage, plate=plate,
+                        entry_id=entry['id'] if entry else None)
+        lane_hold.hold(POST_DECISION_HOLD_S, reason)
+        decision.finish("escalate", reason, plate=plate)
+        return False
+
+    print(f"❌ {stage} terlambat, akses ditolak")
+    return deny(decision, reason, plate=plate)
+
+
+def process_vehicle(frame, ocr_model, plate_text=None, decision=None):
+    """
+    plate_text dari hasil tracking multi-frame; kalau None OCR dijalankan di frame ini.
+    decision: GateDecision yang dibuat saat trigger (deadline dihitung dari trigger).
+    Setiap tahap punya budget waktu (utils/deadline.py); OCR dan face berjalan paralel.
+    """
+    decision = decision or GateDecision(lane="out")
 
     print("\n📸 Running detection...")
 
-    crops = detect_objects(frame)
+    status, detections = decision.run("detect", detect_objects, frame)
+    if status in ("late", "busy"):
+        return on_stage_timeout(decision, "detect", plate=plate_text)
+    if detections is None:
+        return deny(decision, "detect_error", plate=plate_text)
+
+    plate_idx = detections.best(PLATE_CLS)
+    # Wajah terbaik yang lolos quality gate; yang ditolak tidak di-embed
+    face_idx, face_info = select_face(detections, lane="out")
+
+    # -------- FACE RECOG (background) --------
+    face_crop = detections.crop(face_idx) if face_idx is not None else None
+    if face_crop is not None:
+        decision.submit("face", process_face_recognition, face_crop)
 
     # -------- OCR --------
-    plate_text = "UNKNOWN"
-    if crops["plate"]:
-        plate_text = run_ocr_on_plate_smooth(
-            crops["plate"][0]["path"],
+    # Kandidat plat urut score; alternatif dipakai saat lookup DB tanpa OCR ulang
+    plate_candidates = [plate_text] if plate_text else []
+    if not plate_candidates and plate_idx is not None:
+        status, candidates = decision.run(
+            "ocr", run_ocr_on_plate_smooth,
+            detections.crop(plate_idx),
             ocr_model,
             "../optical_character_recognition/output/preprocess",
-            "../optical_character_recognition/output/detection"
+            "../optical_character_recognition/output/detection",
+            return_candidates=True,
+            # Fallback OCR berhenti sebelum budget habis -> hasil terbaik, bukan timeout
+            deadline=decision.stage_deadline("ocr")
         )
-
-    # -------- FACE RECOG --------
-    face_enc = None
-    if crops["face"]:
-        face_enc = process_face_recognition(crops["face"][0]["path"])
-
-    if plate_text == "UNKNOWN" or face_enc is None:
-        print("❌ Tidak ada wajah / plat")
-        send_serial("buzz")
-        return False
-
-    # -------- DB CHECK --------
-    db = get_active_entry_by_plate(plate_text)
-    if not db:
+        if status in ("late", "busy"):
+            return on_stage_timeout(decision, "ocr")
+        plate_candidates = [c["text"] for c in candidates or []]
+
+    if not plate_candidates:
+        print("❌ Tidak ada plat")
+        return deny(decision, "no_plate_or_face")
+    plate = plate_candidates[0]
+
+    # -------- DB CHECK (cache) --------
+    status, found = decision.run("lookup", lookup_entries, plate_candidates)
+    if status in ("late", "busy"):
+        return on_stage_timeout(decision, "lookup", plate=plate)
+    db_entries, exact = found or ([], False)
+
+    if not db_entries:
         print("❌ Plat tidak terdaftar / sudah keluar")
-        send_serial("buzz")
-        return False
+        return deny(decision, "plate_not_found", plate=plate)
+
+    # Plate-only hanya untuk plat yang persis sama (bukan hasil fuzzy)
+    plate_entry = db_entries[0] if exact else None
+
+    # Entry yang masuk sebelum upgrade model -> wajah keluar di-embed juga dengan pipeline lama
+    model = current_face_model()
+    legacy = face_crop is not None and model != LEGACY_FACE_MODEL and \
+        any(entry_face_model(e) == LEGACY_FACE_MODEL for e in db_entries)
+    if legacy:
+        decision.submit("face_legacy", process_face_recognition, face_crop, get_legacy_embedder())
+
+    # -------- FACE RESULT --------
+    face_encs = {}
+    if face_crop is not None:
+        status, face_encs[model] = decision.wait("face")
+        if status in ("late", "busy"):
+            return on_stage_timeout(decision, "face", plate=plate, entry=plate_entry)
+    if legacy:
+        status, face_encs[LEGACY_FACE_MODEL] = decision.wait("face_legacy")
+        # Masih ada kandidat model aktif -> lanjut tanpa vektor lama
+        if status in ("late", "busy") and \
+                not any(entry_face_model(e) == model for e in db_entries):
+            return on_stage_timeout(decision, "face_legacy", plate=plate, entry=plate_entry)
+    face_enc = next((enc for enc in face_encs.values() if enc is not None), None)
+
+    if face_enc is None:
+        if face_info is not None and face_info["reject"]:
+            print(f"❌ Wajah tidak layak ({face_info['reject']})")
+            return deny(decision, "face_quality", plate=plate, face_rejected=face_info["reject"])
+        print("❌ Tidak ada wajah")
+        return deny(decision, "no_plate_or_face", plate=plate)
 
     # -------- FACE MATCH --------
-    match, sim = compare_encoding(face_enc, db['face_vector'])
-    if not match:
+    status, matched = decision.run("match", match_face, face_encs, db_entries)
+    if status in ("late", "busy"):
+        return on_stage_timeout(decision, "match", plate=plate, entry=plate_entry)
+    db, sim = matched or (None, 0.0)
+
+    if db is None:
         print(f"❌ Wajah tidak cocok ({sim:.2f})")
-        send_serial("buzz")
-        return False
+        return deny(decision, "face_mismatch", plate=plate, similarity=float(sim))
 
     # -------- SUCCESS --------
-    print("✅ Validasi berhasil")
-    mark_entry_exited(db['id'])
-
-    send_serial("silent")
-    send_serial("o")  # open gate
-    time.sleep(2)
-    return True
+    print(f"✅ Validasi berhasil ({decision.elapsed_ms():.0f} ms)")
+    return open_gate(decision, db, "validated", sim=sim)
 
 
 # ================================ #
@@ -171,6 +311,7 @@ def check_manual_trigger():
             # 1. Kirim perintah serial
             send_serial("silent") # Matikan buzzer dulu
             send_serial("o")      # Buka Gate
+            emit_gate_event("manual_open", source="trigger_file", status="executed")
             
             # 2. Hapus file trigger
             try:
@@ -193,6 +334,7 @@ def check_manual_trigger():
             
             # 1. Kirim perintah serial
             send_serial("silent") # Matikan buzzer saja
+            emit_gate_event("manual_mute", source="trigger_file", status="executed")
             
             # 2. Hapus file trigger
             try:
@@ -210,13 +352,15 @@ def check_manual_trigger():
 # ================================ #
 
 def main():
+    global entry_cache
     print("🚗 OUT VALIDATION LIVE SERVICE")
     print("=" * 60)
 
     # --- CAMERA ---
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
+    cap = open_source(lane="out", start=False)
+    if not cap.start():
         print("❌ Kamera tidak bisa dibuka")
+        cap.release()
         return
     print("📷 Kamera aktif")
 
@@ -228,6 +372,28 @@ def main():
     ocr_model = load_ocr_model("../model/ocr.pt")
     print("✅ OCR Model loaded")
 
+    # --- CACHE ENTRY ACTIVE ---
+    entry_cache = ActiveEntryCache(writer=AsyncDBWriter(name="out_validation"))
+    entry_cache.warm()
+
+    # --- TRIGGER KAMERA (motion / presence) ---
+    motion_gate = MotionGate(lane="out")
+
+    # --- TAMPILAN (window lokal / headless + preview HTTP) ---
+    view = LiveView("LIVE CAMERA")
+
+    try:
+        run_loop(cap, ocr_model, motion_gate, view)
+    except KeyboardInterrupt:
+        print("\n🛑 Dihentikan oleh user (Ctrl+C)")
+
+    cap.release()
+    serial_conn.close()
+    view.close()
+    entry_cache.close()
+
+
+def run_loop(cap, ocr_model, motion_gate, view):
     buffer = ""
 
     while True:
@@ -237,11 +403,18 @@ def main():
         # -------- LIVE VIDEO --------
         ret, frame = cap.read()
         if not ret:
+            if cap.finished:
+                print("🏁 Replay selesai")
+                break
             continue
 
-        cv2.imshow("LIVE CAMERA", frame)
+        view.show(frame)
+
+        # Deteksi gerakan murah di frame kecil (tiap frame)
+        stopped_edge = motion_gate.update(frame)
 
         # -------- LISTEN SERIAL --------
+        sensor_fired = False
         if serial_conn.in_waiting:
             data = serial_conn.read().decode(errors="ignore")
 
@@ -252,33 +425,56 @@ def main():
                 if line:
                     print(f"[SERIAL] {line}")
 
-                    if line == "VEHICLE_DETECTED":
-
+                    if is_vehicle_line(line):
                         print("🚗 Sensor: VEHICLE DETECTED")
-                        print("📸 Capturing fresh frame...")
+                        sensor_fired = True
 
-                        # ambil 3 frame terbaru agar clear
-                        fresh_frame = None
-                        for _ in range(3):
-                            ret, fresh_frame = cap.read()
-                            time.sleep(0.05)
+            else:
+                buffer += data
 
-                        # jalankan proses validasi
-                        process_vehicle(fresh_frame, ocr_model)
+        # -------- TRIGGER (sensor / kamera sesuai TRIGGER_MODE) --------
+        if lane_hold.active:
+            if sensor_fired:
+                print("🔕 Trigger diabaikan (lane masih ditahan)")
+            # Kendaraan yang berhenti selama hold tetap dipicu begitu hold selesai
+            motion_gate.hold(sensor_fired, stopped_edge, lane_hold.remaining_s())
+        elif motion_gate.decide(sensor_fired, stopped_edge):
+            if stopped_edge:
+                print("🚗 Kamera: kendaraan berhenti di ROI")
+            print("📸 Capturing fresh frame...")
+            # Deadline keputusan dihitung dari trigger; proses latar mengalah mulai sekarang
+            decision = GateDecision(lane="out")
+
+            def read_fresh():
+                ret, f = cap.read()
+                return f if ret else None
+
+            # tracking plat beberapa frame + voting karakter, dalam budget tahap "track"
+            status, track = decision.run("track", track_plate_burst, read_fresh, model_det, ocr_model,
+                                         max_frames=TRACK_MAX_FRAMES, lane="out",
+                                         deadline=decision.stage_deadline("track"))
+            if status in ("late", "busy"):
+                # Burst yang terlambat masih memakai model deteksi / OCR di thread-nya
+                on_stage_timeout(decision, "track")
+            else:
+                if track is None:
+                    # Tracking error: OCR dijalankan di frame baru
+                    track = {"text": "", "frame": None}
+                else:
+                    print(f"🔎 Tracking: {track['text'] or '-'} "
+                          f"({track['confidence']:.2f}, {track['frames_used']} frame)")
 
-                        time.sleep(1)
+                fresh_frame = track["frame"]
+                if fresh_frame is None:
+                    ret, fresh_frame = cap.read()
 
-            else:
-                buffer += data
+                # jalankan proses validasi (hold lane dijadwalkan di dalam, bukan sleep)
+                process_vehicle(fresh_frame, ocr_model, plate_text=track["text"], decision=decision)
 
         # -------- EXIT KEY --------
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        if view.should_quit():
             break
 
-    cap.release()
-    serial_conn.close()
-    cv2.destroyAllWindows()
-
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,7 +2,6 @@
 from flask import Flask, jsonify, request  # 👈 TAMBAHKAN request DI SINI
 import sys
 import os
-from datetime import datetime
 
 # === SETUP PATH ===
 # Karena file ini ada di dalam folder 'utils', kita perlu menambahkan
@@ -15,6 +14,8 @@ sys.path.append(project_root)
 # === IMPORT ===
 # Import dari database.py yang berada di folder yang sama (utils)
 from utils.database import get_vehicle
+from utils.gate_control import request_open_gate, request_stop_buzzer
+from utils.stats import stats_payload, parse_quantiles, warm_stats
 
 app = Flask(__name__)
 
@@ -50,27 +51,12 @@ def index():
 @app.route('/api/open-gate', methods=['POST'])
 def manual_open_gate():
     try:
-        # Path menuju folder out_validation
-        out_validation_dir = os.path.join(project_root, "out_validation")
-        os.makedirs(out_validation_dir, exist_ok=True)
+        # Trigger file untuk out_validation + log + event stream
+        request_open_gate()
 
-        # 1. Buat file trigger UNTUK GATE
-        trigger_path = os.path.join(out_validation_dir, "trigger_open.txt")
-
-        with open(trigger_path, "w") as f:
-            f.write("OPEN")
-
-        # 2. Catat Log
-        with open("manual_logs.txt", "a") as f:
-            f.write(f"{datetime.now()} - Gate dibuka manual via App\n")
-
-            return jsonify({
-                "status": "success",
-                "message": "Gate akan dibuka (trigger dikirim)"
-            }), 200
         return jsonify({
             "status": "success",
-            "message": "Perintah BUKA GATE dikirim."
+            "message": "Gate akan dibuka (trigger dikirim)"
         }), 200
 
     except Exception as e:
@@ -83,19 +69,8 @@ def manual_open_gate():
 @app.route('/api/stop-buzzer', methods=['POST'])
 def manual_stop_buzzer():
     try:
-        # Path menuju folder out_validation
-        out_validation_dir = os.path.join(project_root, "out_validation")
-        os.makedirs(out_validation_dir, exist_ok=True)
-
-        # 1. Buat file trigger UNTUK BUZZER (Nama file beda)
-        trigger_path = os.path.join(out_validation_dir, "trigger_mute.txt")
-
-        with open(trigger_path, "w") as f:
-            f.write("MUTE")
-
-        # 2. Catat Log
-        with open("manual_logs.txt", "a") as f:
-            f.write(f"{datetime.now()} - Buzzer dimatikan manual via App\n")
+        # Trigger file untuk out_validation + log + event stream
+        request_stop_buzzer()
 
         return jsonify({
             "status": "success",
@@ -106,7 +81,30 @@ def manual_stop_buzzer():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+# ==========================================
+# API 3: STATISTIK (occupancy, per jam, dwell time)
+# ==========================================
+@app.route('/api/stats', methods=['GET'])
+@app.route('/api/stats/<kind>', methods=['GET'])
+def parking_stats(kind="all"):
+    if kind not in ("all", "occupancy", "hourly", "dwell"):
+        return jsonify({"status": "error", "message": f"Statistik tidak dikenal: {kind}"}), 404
+    try:
+        quantiles = parse_quantiles(request.args.get("q"))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Parameter q tidak valid: {e}"}), 400
+
+    try:
+        # Agregat di memori, diperbarui dari event insert / exit (tanpa scan tabel)
+        return jsonify({"status": "success", "data": stats_payload(kind, quantiles)}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 if __name__ == '__main__':
     print(f"🚀 API Server berjalan dari: {current_dir}")
+    # Reloader debug menjalankan blok ini dua kali; statistik cukup dibangun di proses server
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_stats()
     # Host 0.0.0.0 agar bisa diakses dari luar (HP/Laptop lain)
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,170 @@
+# utils/api_server_async.py
+# Versi ASGI dari api_server.py (Quart = Flask API versi async).
+# Endpoint sama, ditambah stream event gate (SSE + WebSocket) tanpa query DB tambahan.
+#
+# Jalankan: python utils/api_server_async.py
+#       atau: hypercorn utils.api_server_async:app --bind 0.0.0.0:5000
+import asyncio
+import json
+import sys
+import os
+
+from quart import Quart, jsonify, request, websocket
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from utils.database import get_vehicle
+from utils.gate_control import request_open_gate, request_stop_buzzer
+from utils.events import bus, AsyncSubscription, relay_file_events, gate_event_channel
+from utils.priority import get_executor
+from utils.stats import get_stats, stats_payload, parse_quantiles
+
+RELAY_INTERVAL_S = 0.2
+SSE_KEEPALIVE_S = 15
+
+app = Quart(__name__)
+
+
+# === RELAY EVENT DARI LANE ===
+async def _relay_loop():
+    """Baca event dari lane (proses lain) lalu publish ke bus lokal."""
+    channel = gate_event_channel()
+    while True:
+        relay_file_events(channel)
+        await asyncio.sleep(RELAY_INTERVAL_S)
+
+
+@app.before_serving
+async def start_relay():
+    app.add_background_task(_relay_loop)
+
+
+@app.before_serving
+async def build_stats():
+    # Agregat statistik dibangun dari DB sekali saat startup (bukan saat request pertama)
+    try:
+        await asyncio.wrap_future(get_executor().submit("normal", get_stats))
+    except Exception as e:
+        print(f"⚠️ Statistik belum bisa dibangun: {e}")
+
+
+# === ENDPOINT (sama dengan api_server.py) ===
+@app.route('/api/vehicle', methods=['GET'])
+async def get_history():
+    try:
+        # Query DB blocking -> kelas background (boleh menunggu), event loop tetap jalan
+        data_kendaraan = await asyncio.wrap_future(get_executor().submit("background", get_vehicle))
+
+        return jsonify({
+            "status": "success",
+            "total": len(data_kendaraan),
+            "data": data_kendaraan
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+
+@app.route('/', methods=['GET'])
+async def index():
+    return jsonify({
+        "status": "online",
+        "server_loc": "utils/api_server_async.py"
+    })
+
+
+@app.route('/api/open-gate', methods=['POST'])
+async def manual_open_gate():
+    try:
+        # Operator menunggu di palang -> kelas live, tidak antri di belakang query histori
+        await asyncio.wrap_future(get_executor().submit("live", request_open_gate))
+        return jsonify({
+            "status": "success",
+            "message": "Gate akan dibuka (trigger dikirim)"
+        }), 200
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/stop-buzzer', methods=['POST'])
+async def manual_stop_buzzer():
+    try:
+        await asyncio.wrap_future(get_executor().submit("live", request_stop_buzzer))
+        return jsonify({
+            "status": "success",
+            "message": "Perintah MATIKAN BUZZER dikirim."
+        }), 200
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# === STATISTIK (occupancy, per jam, dwell time) ===
+@app.route('/api/stats', methods=['GET'])
+@app.route('/api/stats/<kind>', methods=['GET'])
+async def parking_stats(kind="all"):
+    if kind not in ("all", "occupancy", "hourly", "dwell"):
+        return jsonify({"status": "error", "message": f"Statistik tidak dikenal: {kind}"}), 404
+    try:
+        quantiles = parse_quantiles(request.args.get("q"))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Parameter q tidak valid: {e}"}), 400
+
+    try:
+        # Hanya baca event baru + snapshot di memori; tetap di executor karena bisa rebuild dari DB
+        data = await asyncio.wrap_future(get_executor().submit("normal", stats_payload, kind, quantiles))
+        return jsonify({"status": "success", "data": data}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# === STREAM EVENT GATE ===
+@app.route('/api/events/recent', methods=['GET'])
+async def recent_events():
+    return jsonify({"status": "success", "data": list(bus.recent)}), 200
+
+
+@app.route('/api/events/stream', methods=['GET'])
+async def event_stream():
+    """Server-Sent Events: entry, exit, rejection, manual_open, manual_mute."""
+    subscription = bus.subscribe(AsyncSubscription(asyncio.get_running_loop()))
+
+    async def generate():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n".encode()
+        finally:
+            bus.unsubscribe(subscription)
+
+    return generate(), 200, {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    }
+
+
+@app.websocket('/api/events/ws')
+async def event_websocket():
+    subscription = bus.subscribe(AsyncSubscription(asyncio.get_running_loop()))
+    try:
+        while True:
+            event = await subscription.get()
+            await websocket.send(json.dumps(event, default=str))
+    finally:
+        bus.unsubscribe(subscription)
+
+
+if __name__ == '__main__':
+    print(f"🚀 API Server (async) berjalan dari: {current_dir}")
+    app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,295 @@
+# utils/archiver.py
+# Pindahkan entry exited yang sudah lama dari `entries` ke `entries_archive` per batch.
+# Tabel entries tetap kecil -> lookup plat active dan query histori tidak melambat seiring
+# waktu. Histori (get_vehicle) dan rebuild statistik membaca kedua tabel.
+#
+# Tiap batch satu transaksi: INSERT IGNORE ke arsip + DELETE dari entries, commit sekali.
+# Gagal di tengah -> rollback, batch yang sama diulang di putaran berikutnya (tanpa duplikat).
+#
+#   python utils/archiver.py                 -> arsip sekali (ARCHIVE_AFTER_DAYS)
+#   python utils/archiver.py --loop          -> proses latar, tiap ARCHIVE_INTERVAL_S
+#   python utils/archiver.py --check         -> uji dengan DB stand-in (tanpa MySQL)
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from utils import database
+from utils.priority import yield_to_live
+
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_INTERVAL_S = float(os.environ.get("ARCHIVE_INTERVAL_S", "3600"))
+ARCHIVE_PAUSE_S = 0.2    # jeda antar batch: lock tabel entries dilepas untuk lane
+# Vector wajah di arsip: "keep" (JSON apa adanya), "compress" (zlib), "strip" (dibuang)
+ARCHIVE_VECTORS = os.environ.get("ARCHIVE_VECTORS", "compress")
+VECTOR_MODES = ("keep", "compress", "strip")
+
+
+def compress_vector(face_vector):
+    """face_vector (JSON string / list) -> bytes zlib."""
+    if face_vector is None:
+        return None
+    if not isinstance(face_vector, (str, bytes, bytearray)):
+        face_vector = json.dumps(face_vector)
+    if isinstance(face_vector, str):
+        face_vector = face_vector.encode("utf-8")
+    return zlib.compress(bytes(face_vector), 9)
+
+
+def decode_archived_vector(row):
+    """face_vector dari row entries_archive (None kalau di-strip)."""
+    if row.get("face_vector") is not None:
+        vector = row["face_vector"]
+        return json.loads(vector) if isinstance(vector, (str, bytes, bytearray)) else vector
+    if row.get("face_vector_z") is not None:
+        return json.loads(zlib.decompress(row["face_vector_z"]))
+    return None
+
+
+def archive_params(row, vectors=ARCHIVE_VECTORS):
+    """Row entries (dict) -> parameter INSERT_ARCHIVE_SQL. Returns (params, byte dihemat)."""
+    face_vector = row.get("face_vector")
+    original = len(face_vector) if isinstance(face_vector, (str, bytes, bytearray)) else 0
+    face_vector_z = None
+    if vectors == "compress":
+        face_vector_z = compress_vector(face_vector)
+        face_vector = None
+    elif vectors == "strip":
+        face_vector = None
+
+    row = dict(row, face_vector=face_vector, face_vector_z=face_vector_z)
+    stored = len(face_vector or b"") + len(face_vector_z or b"")
+    return tuple(row.get(column) for column in database.ARCHIVE_COLUMNS), original - stored
+
+
+def archive_batch(conn, cutoff, batch_size=ARCHIVE_BATCH_SIZE, vectors=ARCHIVE_VECTORS):
+    """Satu batch dalam satu transaksi. Returns (jumlah row dipindah, byte vector dihemat)."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(database.SELECT_ARCHIVABLE_SQL, (cutoff, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return 0, 0
+
+        params, saved = [], 0
+        for row in rows:
+            row_params, row_saved = archive_params(row, vectors)
+            params.append(row_params)
+            saved += row_saved
+
+        ids = [row["id"] for row in rows]
+        cursor.executemany(database.INSERT_ARCHIVE_SQL, params)
+        cursor.execute(database.DELETE_ARCHIVED_SQL.format(
+            placeholders=", ".join(["%s"] * len(ids))), tuple(ids))
+        conn.commit()
+        return len(rows), saved
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def run_archiver(connect=None, days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE,
+                 vectors=ARCHIVE_VECTORS, max_batches=None, pause_s=ARCHIVE_PAUSE_S):
+    """
+    Arsip semua entry exited lebih tua dari `days` hari, batch demi batch.
+    Mengalah ke lane keluar (yield_to_live) sebelum tiap batch.
+    Returns dict statistik.
+    """
+    if vectors not in VECTOR_MODES:
+        raise ValueError(f"ARCHIVE_VECTORS tidak dikenal: {vectors} (pilih {VECTOR_MODES})")
+
+    connect = connect or database.get_connection
+    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    stats = {"moved": 0, "batches": 0, "bytes_saved": 0, "failures": 0}
+    started = time.perf_counter()
+
+    conn = connect()
+    try:
+        while max_batches is None or stats["batches"] < max_batches:
+            yield_to_live()
+            try:
+                moved, saved = archive_batch(conn, cutoff, batch_size, vectors)
+            except Exception as e:
+                print(f"[ARCHIVE] Batch gagal (diulang putaran berikutnya): {e}")
+                stats["failures"] += 1
+                break
+            if not moved:
+                break
+            stats["moved"] += moved
+            stats["batches"] += 1
+            stats["bytes_saved"] += saved
+            if moved < batch_size:
+                break
+            time.sleep(pause_s)
+    finally:
+        conn.close()
+
+    stats["elapsed_s"] = round(time.perf_counter() - started, 2)
+    if stats["moved"] or stats["failures"]:
+        print(f"[ARCHIVE] {stats['moved']} entry diarsip ({stats['batches']} batch, "
+              f"vector {vectors}, hemat {stats['bytes_saved'] / 1024:.0f} KB) "
+              f"dalam {stats['elapsed_s']}s")
+    return stats
+
+
+def archive_loop(interval_s=ARCHIVE_INTERVAL_S, **kwargs):
+    """Proses latar: arsip berkala. DB mati tidak menghentikan loop."""
+    print(f"🗄️ Archiver berjalan: entry exited > {kwargs.get('days', ARCHIVE_AFTER_DAYS)} hari, "
+          f"tiap {interval_s:.0f}s")
+    while True:
+        try:
+            run_archiver(**kwargs)
+        except Exception as e:
+            print(f"[ARCHIVE] Gagal terhubung ke DB: {e}")
+        time.sleep(interval_s)
+
+
+# ---------- DB stand-in untuk --check ----------
+
+class FakeArchiveDB:
+    """
+    Stand-in MySQL untuk archiver: tabel entries + entries_archive di dict, transaksi
+    (perubahan baru berlaku saat commit) dan kegagalan acak sebelum commit.
+    """
+
+    def __init__(self, failure_rate=0.0, seed=0):
+        import random
+        self.rng = random.Random(seed)
+        self.failure_rate = failure_rate
+        self.entries = {}
+        self.archive = {}
+
+    def connect(self):
+        return _FakeArchiveConnection(self)
+
+
+class _FakeArchiveConnection:
+    def __init__(self, db):
+        self.db = db
+        self.pending = []
+
+    def cursor(self, dictionary=False):
+        return _FakeArchiveCursor(self)
+
+    def commit(self):
+        if self.db.rng.random() < self.db.failure_rate:
+            raise ConnectionError("fake DB: koneksi putus sebelum commit")
+        for op, payload in self.pending:
+            if op == "insert":
+                for params in payload:
+                    row = dict(zip(database.ARCHIVE_COLUMNS, params))
+                    self.db.archive.setdefault(row["id"], row)
+            else:
+                for entry_id in payload:
+                    if self.db.entries.get(entry_id, {}).get("status") == "exited":
+                        del self.db.entries[entry_id]
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        self.pending = []
+
+
+class _FakeArchiveCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._result = []
+
+    def execute(self, sql, params=()):
+        if sql.strip().startswith("SELECT"):
+            cutoff, limit = params
+            rows = sorted((r for r in self.conn.db.entries.values()
+                           if r["status"] == "exited" and r["exit_time"] < cutoff),
+                          key=lambda r: r["exit_time"])
+            self._result = [dict(r) for r in rows[:limit]]
+        elif sql.strip().startswith("DELETE"):
+            self.conn.pending.append(("delete", list(params)))
+
+    def executemany(self, sql, rows):
+        self.conn.pending.append(("insert", list(rows)))
+
+    def fetchall(self):
+        return self._result
+
+    def close(self):
+        pass
+
+
+def check(entries=5_000, failure_rate=0.2, dim=512):
+    """Archiver vs DB stand-in: semua entry lama pindah tepat sekali, active tidak tersentuh."""
+    import random
+
+    rng = random.Random(0)
+    fake = FakeArchiveDB(failure_rate=failure_rate, seed=1)
+    now = datetime.now()
+    old, recent, active = set(), set(), set()
+    for i in range(entries):
+        entry_id = f"e{i}"
+        entry_time = now - timedelta(days=rng.uniform(0, 90))
+        exit_time = entry_time + timedelta(hours=rng.uniform(0.1, 10))
+        status = "active" if rng.random() < 0.1 else "exited"
+        fake.entries[entry_id] = {
+            "id": entry_id, "plate_text": f"B{i}XYZ", "plate_conf": 0.9,
+            "face_vector": json.dumps([round(rng.gauss(0, 1), 6) for _ in range(dim)]),
+            "face_model": "Facenet512", "face_dim": dim, "plate_image": "", "face_image": "",
+            "entry_time": entry_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "exit_time": exit_time.strftime("%Y-%m-%d %H:%M:%S") if status == "exited" else None,
+            "status": status
+        }
+        if status == "active":
+            active.add(entry_id)
+        elif exit_time < now - timedelta(days=ARCHIVE_AFTER_DAYS):
+            old.add(entry_id)
+        else:
+            recent.add(entry_id)
+    original = {k: json.loads(v["face_vector"]) for k, v in fake.entries.items()}
+
+    # Commit gagal acak -> archiver dijalankan ulang sampai habis (seperti --loop)
+    total = {"moved": 0, "failures": 0, "bytes_saved": 0}
+    rounds = 0
+    while rounds < 100 and any(k in fake.entries for k in old):
+        stats = run_archiver(connect=fake.connect, batch_size=200, pause_s=0)
+        for key in total:
+            total[key] += stats[key]
+        rounds += 1
+
+    assert set(fake.archive) == old, "arsip harus berisi tepat entry exited yang lama"
+    assert set(fake.entries) == recent | active, "entry active / baru tidak boleh dipindah"
+    assert all(decode_archived_vector(fake.archive[k]) == original[k] for k in old)
+    print(f"📊 {entries} entry: {len(old)} diarsip dalam {rounds} putaran "
+          f"({total['failures']} commit gagal, tidak ada duplikat / hilang)")
+    print(f"   tersisa di entries: {len(fake.entries)} ({len(active)} active), "
+          f"vector hemat {total['bytes_saved'] / 1024:.0f} KB dengan zlib")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arsip entry exited lama ke entries_archive")
+    parser.add_argument("--loop", action="store_true", help="jalan terus tiap ARCHIVE_INTERVAL_S")
+    parser.add_argument("--check", action="store_true", help="uji dengan DB stand-in")
+    parser.add_argument("--days", type=float, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--vectors", choices=VECTOR_MODES, default=ARCHIVE_VECTORS)
+    args = parser.parse_args()
+
+    if args.check:
+        check()
+        sys.exit(0)
+
+    database.create_table_if_not_exists()  # entries_archive + index exit_time
+    if args.loop:
+        archive_loop(days=args.days, batch_size=args.batch, vectors=args.vectors)
+    else:
+        run_archiver(days=args.days, batch_size=args.batch, vectors=args.vectors)
@@ -0,0 +1,131 @@
+# utils/cache_channel.py
+import os
+import json
+import threading
+import time
+
+# File event bersama antar proses (in_validation, out_validation, api_server).
+# Sama seperti trigger_open.txt: komunikasi antar proses lewat file di folder project.
+CHANNEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_events.log")
+
+# Compaction: file lebih besar dari ini dirotasi ke <path>.1 (file lama sebelumnya dibuang).
+# Pembaca yang tertinggal menyelesaikan sisa <path>.1 dulu sebelum lanjut ke file baru.
+CHANNEL_MAX_BYTES = int(os.environ.get("CHANNEL_MAX_BYTES", str(8 * 1024 * 1024)))
+ROTATE_LOCK_STALE_S = 10.0
+
+_write_lock = threading.Lock()
+
+
+def _rotate_if_needed(path, max_bytes):
+    """Rotasi <path> -> <path>.1 kalau terlalu besar. Lock file O_EXCL: satu proses saja yang rotasi."""
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return
+    except OSError:
+        return
+
+    lock_path = path + ".lock"
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        # Lock basi (proses crash saat rotasi) -> hapus, rotasi dicoba lagi di append berikutnya
+        try:
+            if time.time() - os.path.getmtime(lock_path) > ROTATE_LOCK_STALE_S:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        return
+
+    try:
+        # Cek ulang: proses lain mungkin baru saja merotasi
+        if os.path.getsize(path) >= max_bytes:
+            os.replace(path, path + ".1")
+    except OSError as e:
+        print(f"[CACHE] Gagal merotasi {os.path.basename(path)}: {e}")
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+def append_event(event, path=CHANNEL_PATH, max_bytes=CHANNEL_MAX_BYTES):
+    """Tambahkan satu event (dict) ke file channel. pid dicatat agar pengirim bisa skip event sendiri."""
+    event = dict(event, pid=os.getpid())
+    try:
+        with _write_lock:
+            _rotate_if_needed(path, max_bytes)
+            with open(path, "ab") as f:
+                f.write((json.dumps(event, default=str) + "\n").encode("utf-8"))
+    except Exception as e:
+        print(f"[CACHE] Gagal menulis event ke {os.path.basename(path)}: {e}")
+
+
+def publish(op, entry_id, plate_text=None, path=CHANNEL_PATH, event_time=None, **payload):
+    """
+    Tulis satu event perubahan entry ('insert' / 'update' / 'exit') ke channel.
+    event_time = entry_time / exit_time yang ditulis ke DB (dipakai utils/stats.py).
+    payload: data yang dibutuhkan pembaca supaya tidak perlu query DB
+    (insert -> entry=row lengkap, update -> templates=list template wajah).
+    """
+    event = {"op": op, "id": entry_id, "plate": plate_text}
+    if event_time is not None:
+        event["time"] = event_time
+    event.update(payload)
+    append_event(event, path)
+
+
+class CacheChannel:
+    """Pembaca channel: membaca event baru sejak offset terakhir (tail file, ikut rotasi)."""
+
+    def __init__(self, path=CHANNEL_PATH):
+        self.path = path
+        self.offset = 0
+        self.inode = None
+
+    def seek_end(self):
+        """Lewati semua event lama. Dipanggil SEBELUM warm-up supaya tidak ada event yang hilang."""
+        try:
+            stat = os.stat(self.path)
+            self.offset, self.inode = stat.st_size, stat.st_ino
+        except OSError:
+            self.offset, self.inode = 0, None
+
+    def _read_from(self, path):
+        events = []
+        # Mode binary supaya offset tetap dalam byte (juga di Windows)
+        with open(path, "rb") as f:
+            f.seek(self.offset)
+            for line in f:
+                # Baris terakhir belum selesai ditulis -> baca lagi nanti
+                if not line.endswith(b"\n"):
+                    break
+                self.offset += len(line)
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+        return events
+
+    def read_events(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return []
+
+        events = []
+        if self.inode is not None and stat.st_ino != self.inode:
+            # File dirotasi sejak baca terakhir -> selesaikan sisa file lama dulu
+            try:
+                if os.stat(self.path + ".1").st_ino == self.inode:
+                    events = self._read_from(self.path + ".1")
+            except OSError:
+                pass
+            self.offset = 0
+        self.inode = stat.st_ino
+
+        # File dihapus / dibuat ulang -> baca dari awal
+        if stat.st_size < self.offset:
+            self.offset = 0
+        if stat.st_size == self.offset:
+            return events
+
+        return events + self._read_from(self.path)
@@ -3,13 +3,35 @@ import cv2
 import os
 import uuid
 
+from utils.frame_source import open_source
+
+
+# Sumber kamera yang sudah dibuka, dipakai ulang antar capture (tanpa init device tiap kali)
+_sources = {}
+
+
+def get_camera_source(camera_index=0):
+    """FrameSource yang tetap terbuka untuk camera_index (index int atau spec open_source)."""
+    source = _sources.get(camera_index)
+    if source is None or not source.isOpened():
+        source = open_source(camera_index, start=False)
+        source.start()
+        _sources[camera_index] = source
+    return source
+
+
+def release_cameras():
+    for source in _sources.values():
+        source.release()
+    _sources.clear()
+
 
 def capture_vehicle_image(output_dir="img-in", camera_index=0, resize_to=None):
     """Capture satu frame dari webcam dan simpan ke folder.
 
     Args:
         output_dir (str): folder output
-        camera_index (int): index device untuk cv2.VideoCapture
+        camera_index (int): index device (atau spec sumber, lihat utils/frame_source.py)
         resize_to (tuple|None): (width, height) jika ingin resize sebelum simpan
 
     Returns:
@@ -17,18 +39,13 @@ def capture_vehicle_image(output_dir="img-in", camera_index=0, resize_to=None):
     """
     os.makedirs(output_dir, exist_ok=True)
 
-    cap = cv2.VideoCapture(camera_index)
-    if not cap.isOpened():
+    source = get_camera_source(camera_index)
+    if not source.isOpened():
         print("❌ Kamera gagal dibuka (index={})".format(camera_index))
         return None
 
-    # beri waktu kamera auto-adjust (opsional)
-    time_wait_s = 0.2
-    cap.read()  # discard first frame
-    # Jika kamu butuh buffer lebih lama, tambahkan sleep
-
-    ret, frame = cap.read()
-    cap.release()
+    # Thread decode selalu menyimpan frame terbaru, tidak perlu buang frame pertama
+    ret, frame = source.read()
 
     if not ret or frame is None:
         print("❌ Gagal capture frame dari kamera")
@@ -42,4 +59,4 @@ def capture_vehicle_image(output_dir="img-in", camera_index=0, resize_to=None):
     cv2.imwrite(file_path, frame)
 
     print(f"📸 Gambar tersimpan: {file_path}")
-    return file_path
\ No newline at end of file
+    return file_path
@@ -3,6 +3,8 @@ import mysql.connector
 import json
 import uuid
 from datetime import datetime
+from utils.cache_channel import publish
+from utils import embedding_store
 
 def get_connection():
     return mysql.connector.connect(
@@ -15,31 +17,107 @@ def get_connection():
 def generate_uuid():
     return str(uuid.uuid4())
 
-def insert_entry(plate_text, plate_conf, face_vector, plate_path, face_path):
-    conn = get_connection()
-    cursor = conn.cursor()
+INSERT_ENTRY_SQL = """
+    INSERT INTO entries (id, plate_text, plate_conf, face_vector, face_model, face_dim,
+                         plate_image, face_image, entry_time, status)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'active')
+    """
 
-    entry_id = generate_uuid()
+# IGNORE: replay dari spool db_writer aman walaupun sebagian batch sudah masuk
+INSERT_ENTRY_IGNORE_SQL = INSERT_ENTRY_SQL.replace("INSERT INTO", "INSERT IGNORE INTO")
+# Entry batch yang sudah ada sebelum INSERT IGNORE (replay) -> tidak di-append lagi ke arsip embedding
+SELECT_EXISTING_IDS_SQL = "SELECT id FROM entries WHERE id IN ({placeholders})"
 
-    sql = """
-    INSERT INTO entries (id, plate_text, plate_conf, face_vector, plate_image, face_image, entry_time, status)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, 'active')
+MARK_EXITED_SQL = """
+    UPDATE entries 
+    SET status = 'exited', exit_time = %s 
+    WHERE id = %s AND status = 'active'
+    """
+
+# Multi-template: face_vector berisi list template [[...], [...]] (lihat face_recog/verification.py)
+UPDATE_TEMPLATES_SQL = """
+    UPDATE entries
+    SET face_vector = %s
+    WHERE id = %s AND status = 'active'
     """
 
-    cursor.execute(sql, (
+# Entry exited yang sudah lama dipindah ke entries_archive oleh utils/archiver.py, supaya
+# tabel entries (lookup plat active, histori) tetap kecil. face_vector bisa dibuang atau
+# dikompres (face_vector_z = zlib JSON) saat diarsip.
+ARCHIVE_COLUMNS = ("id", "plate_text", "plate_conf", "face_vector", "face_vector_z", "face_model",
+                   "face_dim", "plate_image", "face_image", "entry_time", "exit_time", "status")
+
+SELECT_ARCHIVABLE_SQL = """
+    SELECT * FROM entries
+    WHERE status = 'exited' AND exit_time < %s
+    ORDER BY exit_time
+    LIMIT %s
+    """
+
+# IGNORE: batch yang gagal di tengah (sebelum DELETE di-commit) aman diulang
+INSERT_ARCHIVE_SQL = f"""
+    INSERT IGNORE INTO entries_archive ({", ".join(ARCHIVE_COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(ARCHIVE_COLUMNS))})
+    """
+
+DELETE_ARCHIVED_SQL = """
+    DELETE FROM entries
+    WHERE id IN ({placeholders}) AND status = 'exited'
+    """
+
+def now_str():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def entry_params(entry_id, plate_text, plate_conf, face_vector, plate_path, face_path, entry_time,
+                 face_model=None):
+    """Urutan parameter untuk INSERT_ENTRY_SQL."""
+    return (
         entry_id,
         plate_text,
         plate_conf,
         json.dumps(face_vector),
+        face_model,
+        len(face_vector),
         plate_path,
         face_path,
-        datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    ))
+        entry_time
+    )
+
+def entry_row(params):
+    """Parameter INSERT_ENTRY_SQL -> row entry (payload event insert di channel, tanpa query DB)."""
+    entry_id, plate_text, plate_conf, face_vector, face_model, face_dim, plate_path, face_path, entry_time = params
+    return {
+        'id': entry_id,
+        'plate_text': plate_text,
+        'plate_conf': plate_conf,
+        'face_vector': json.loads(face_vector),
+        'face_model': face_model,
+        'face_dim': face_dim,
+        'plate_image': plate_path,
+        'face_image': face_path,
+        'entry_time': entry_time,
+        'status': 'active'
+    }
+
+def insert_entry(plate_text, plate_conf, face_vector, plate_path, face_path, face_model=None):
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    entry_id = generate_uuid()
+    entry_time = now_str()
+
+    params = entry_params(
+        entry_id, plate_text, plate_conf, face_vector, plate_path, face_path, entry_time, face_model
+    )
+    cursor.execute(INSERT_ENTRY_SQL, params)
 
     conn.commit()
     cursor.close()
     conn.close()
 
+    publish("insert", entry_id, plate_text, event_time=entry_time, entry=entry_row(params))
+    embedding_store.append_entry(entry_id, plate_text, face_vector, face_model, entry_time)
+
     print(f"[DB] Entry inserted - ID: {entry_id}, Plate: {plate_text}")
     return entry_id
 
@@ -50,23 +128,31 @@ def mark_entry_exited(entry_id):
     conn = get_connection()
     cursor = conn.cursor()
 
-    sql = """
-    UPDATE entries 
-    SET status = 'exited', exit_time = %s 
-    WHERE id = %s AND status = 'active'
-    """
-
-    cursor.execute(sql, (
-        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        entry_id
-    ))
+    exit_time = now_str()
+    cursor.execute(MARK_EXITED_SQL, (exit_time, entry_id))
 
     conn.commit()
     cursor.close()
     conn.close()
 
+    publish("exit", entry_id, event_time=exit_time)
+
     print(f"[DB] Entry {entry_id} marked as exited")
 
+def update_face_templates(entry_id, templates):
+    """Simpan ulang template wajah entry (enrollment multi-template)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(UPDATE_TEMPLATES_SQL, (json.dumps(templates), entry_id))
+
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    publish("update", entry_id, templates=templates)
+    print(f"[DB] Entry {entry_id}: {len(templates)} template wajah")
+
 def get_active_entry_by_plate(plate_text):
     """
     Query database berdasarkan plat nomor yang masih active
@@ -94,6 +180,38 @@ def get_active_entry_by_plate(plate_text):
         print(f"[DB] Tidak ada active data untuk plat: {plate_text}")
         return None
 
+def get_active_entries():
+    """Ambil semua entry active sekaligus (satu query) untuk warm-up cache."""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    cursor.execute("SELECT * FROM entries WHERE status = 'active' ORDER BY entry_time")
+    results = cursor.fetchall()
+
+    cursor.close()
+    conn.close()
+
+    for row in results:
+        row['face_vector'] = json.loads(row['face_vector'])
+
+    print(f"[DB] {len(results)} entry active dimuat")
+    return results
+
+def get_entry_by_id(entry_id):
+    """Ambil satu entry berdasarkan ID (face_vector sudah di-decode)."""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    cursor.execute("SELECT * FROM entries WHERE id = %s", (entry_id,))
+    result = cursor.fetchone()
+
+    cursor.close()
+    conn.close()
+
+    if result:
+        result['face_vector'] = json.loads(result['face_vector'])
+    return result
+
 def create_table_if_not_exists():
     """
     Buat table dengan kolom status dan exit_time
@@ -107,58 +225,88 @@ def create_table_if_not_exists():
         plate_text VARCHAR(50),
         plate_conf FLOAT,
         face_vector JSON,
+        face_model VARCHAR(50) NULL,
+        face_dim INT NULL,
         plate_image VARCHAR(500),
         face_image VARCHAR(500),
         entry_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         exit_time TIMESTAMP NULL,
-        status ENUM('active', 'exited') DEFAULT 'active'
+        status ENUM('active', 'exited') DEFAULT 'active',
+        INDEX idx_status_exit (status, exit_time)
     )
     """
     
     cursor.execute(sql)
+    add_missing_columns(cursor)
+    create_archive_table(cursor)
     conn.commit()
     cursor.close()
     conn.close()
     print("[DB] Table 'entries' ready dengan status management")
 
-def create_table_if_not_exists():
-    """
-    Buat table dengan kolom status dan exit_time
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    sql = """
-    CREATE TABLE IF NOT EXISTS entries (
+def create_archive_table(cursor):
+    """Tabel arsip: kolom sama dengan entries + face_vector_z (vector terkompresi)."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS entries_archive (
         id VARCHAR(36) PRIMARY KEY,
         plate_text VARCHAR(50),
         plate_conf FLOAT,
-        face_vector JSON,
+        face_vector JSON NULL,
+        face_vector_z MEDIUMBLOB NULL,
+        face_model VARCHAR(50) NULL,
+        face_dim INT NULL,
         plate_image VARCHAR(500),
         face_image VARCHAR(500),
-        entry_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        entry_time TIMESTAMP NULL,
         exit_time TIMESTAMP NULL,
-        status ENUM('active', 'exited') DEFAULT 'active'
+        status ENUM('active', 'exited') DEFAULT 'exited',
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_entry_time (entry_time),
+        INDEX idx_plate (plate_text)
     )
-    """
-    
-    cursor.execute(sql)
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print("[DB] Table 'entries' ready dengan status management")
+    """)
 
-def get_vehicle():
+def add_missing_columns(cursor):
+    """Migrasi table lama: tambah kolom face_model / face_dim kalau belum ada."""
+    cursor.execute("""
+    SELECT COLUMN_NAME FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'entries'
+    """)
+    existing = {row[0] for row in cursor.fetchall()}
+
+    if "face_model" not in existing:
+        cursor.execute("ALTER TABLE entries ADD COLUMN face_model VARCHAR(50) NULL AFTER face_vector")
+        print("[DB] Kolom face_model ditambahkan")
+    if "face_dim" not in existing:
+        cursor.execute("ALTER TABLE entries ADD COLUMN face_dim INT NULL AFTER face_model")
+        print("[DB] Kolom face_dim ditambahkan")
+
+    # Index untuk archiver (exited + exit_time lama) di table yang dibuat sebelum index ada
+    cursor.execute("""
+    SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'entries' AND INDEX_NAME = 'idx_status_exit'
+    """)
+    if not cursor.fetchone()[0]:
+        cursor.execute("ALTER TABLE entries ADD INDEX idx_status_exit (status, exit_time)")
+        print("[DB] Index idx_status_exit ditambahkan")
+
+def get_vehicle(include_archive=True):
     """
     Mengambil semua riwayat kendaraan (plat, waktu masuk, status)
-    untuk kebutuhan API Mobile Apps.
+    untuk kebutuhan API Mobile Apps. Histori mencakup entries + entries_archive.
     """
     conn = get_connection()
     cursor = conn.cursor(dictionary=True) # Return hasil sebagai dictionary
 
     sql = """
-    SELECT plate_text, entry_time, status 
-    FROM entries 
+    SELECT plate_text, entry_time, status FROM entries
+    """
+    if include_archive:
+        sql += """
+    UNION ALL
+    SELECT plate_text, entry_time, status FROM entries_archive
+    """
+    sql += """
     ORDER BY entry_time DESC
     """
     
@@ -0,0 +1,416 @@
+# utils/db_writer.py
+import os
+import json
+import queue
+import threading
+import time
+
+from utils import database
+from utils.cache_channel import publish
+from utils import embedding_store
+
+SPOOL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class AsyncDBWriter:
+    """
+    Penulis DB asinkron: lane cukup menyerahkan record, worker thread menulis per batch
+    (executemany). Kalau MySQL tidak bisa dihubungi, record ditulis ke spool file lokal
+    (append-only) lalu di-replay begitu DB kembali.
+    Satu spool per proses (name), karena in_validation dan out_validation jalan terpisah.
+
+    Durabilitas: setiap record ditulis (fsync) ke write-ahead log <spool>.wal SEBELUM submit_*
+    kembali, jadi file input boleh langsung dihapus. WAL dikosongkan begitu semua record sudah
+    commit / masuk spool; sisa WAL setelah crash dipindah ke spool saat start (replay idempotent:
+    INSERT IGNORE, UPDATE ... status = 'active').
+    """
+
+    def __init__(self, name="default", connect=None, spool_path=None,
+                 batch_size=50, flush_interval=0.2, retry_delay=2.0, notify=True, autostart=True):
+        self.connect = connect or database.get_connection
+        self.notify = notify
+        self.spool_path = spool_path or os.path.join(SPOOL_DIR, f"db_spool_{name}.jsonl")
+        self.wal_path = self.spool_path + ".wal"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+
+        self.stats = {"committed": 0, "spooled": 0, "replayed": 0, "failures": 0, "recovered": 0}
+
+        self._queue = queue.Queue()
+        self._retry_at = 0.0
+        self._running = True
+        self._cond = threading.Condition()
+        self._outstanding = 0   # record yang sudah di WAL tapi belum commit / spool
+        self._recover_wal()
+        self._wal = open(self.wal_path, "ab")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        if autostart:
+            self._thread.start()
+
+    # ---------- API untuk lane ----------
+
+    def submit_insert(self, plate_text, plate_conf, face_vector, plate_path, face_path, face_model=None):
+        """Serahkan entry baru. ID langsung dikembalikan tanpa menunggu commit."""
+        entry_id = database.generate_uuid()
+        face_vector = [float(v) for v in face_vector]
+        self._enqueue({
+            "op": "insert",
+            "params": list(database.entry_params(
+                entry_id, plate_text, plate_conf, face_vector,
+                plate_path, face_path, database.now_str(), face_model
+            ))
+        })
+        return entry_id
+
+    def submit_templates(self, entry_id, templates):
+        """Ganti face_vector entry dengan list template (multi-template enrollment)."""
+        self._enqueue({"op": "templates", "params": [json.dumps(templates), entry_id]})
+
+    def submit_exit(self, entry_id):
+        self._enqueue({"op": "exit", "params": [database.now_str(), entry_id]})
+
+    def _enqueue(self, record):
+        """Tulis record ke WAL (fsync) lalu antrikan. Setelah ini record tidak hilang walau crash."""
+        with self._cond:
+            self._wal.write((json.dumps(record) + "\n").encode("utf-8"))
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+            self._outstanding += 1
+            self._queue.put(record)
+
+    def pending(self):
+        return self._queue.qsize() + self._spool_size()
+
+    def flush(self, timeout=None):
+        """Tunggu sampai antrian kosong (record sudah commit atau masuk spool)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def close(self):
+        self._running = False
+        if self._thread.is_alive():
+            self._thread.join()
+        with self._cond:
+            self._wal.close()
+            if self._outstanding == 0:
+                os.remove(self.wal_path)
+
+    def _recover_wal(self):
+        """Record di WAL dari proses sebelumnya (crash sebelum commit / spool) -> spool."""
+        records = self._read_records(self.wal_path)
+        if records:
+            self._spool(records)
+            self.stats["recovered"] = len(records)
+            print(f"[DB-WRITER] {len(records)} record dari WAL dipulihkan ke spool")
+        if os.path.exists(self.wal_path):
+            os.remove(self.wal_path)
+
+    def _batch_done(self, count):
+        with self._cond:
+            self._outstanding -= count
+            if self._outstanding == 0:
+                # Semua record di WAL sudah commit / di spool
+                self._wal.truncate(0)
+                os.fsync(self._wal.fileno())
+            self._cond.notify_all()
+
+    # ---------- Worker ----------
+
+    def _run(self):
+        while self._running or not self._queue.empty():
+            batch = self._collect()
+
+            if self._spool_size() and time.time() >= self._retry_at:
+                self._replay_spool()
+
+            if not batch:
+                continue
+
+            # Selama spool belum kosong, record baru ikut di-spool agar urutan insert -> exit terjaga
+            if self._spool_size() or time.time() < self._retry_at:
+                self._spool(batch)
+            else:
+                try:
+                    self._write_batch(batch)
+                    self.stats["committed"] += len(batch)
+                except Exception as e:
+                    print(f"[DB-WRITER] DB tidak bisa ditulis, spool {len(batch)} record: {e}")
+                    self.stats["failures"] += 1
+                    self._retry_at = time.time() + self.retry_delay
+                    self._spool(batch)
+
+            self._batch_done(len(batch))
+
+    def _collect(self):
+        batch = []
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch):
+        inserts = [tuple(r["params"]) for r in batch if r["op"] == "insert"]
+        templates = [tuple(r["params"]) for r in batch if r["op"] == "templates"]
+        exits = [tuple(r["params"]) for r in batch if r["op"] == "exit"]
+
+        replayed = set()
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            if inserts:
+                ids = [params[0] for params in inserts]
+                cursor.execute(database.SELECT_EXISTING_IDS_SQL.format(
+                    placeholders=", ".join(["%s"] * len(ids))), tuple(ids))
+                replayed = {row[0] for row in cursor.fetchall()}
+                cursor.executemany(database.INSERT_ENTRY_IGNORE_SQL, inserts)
+            if templates:
+                cursor.executemany(database.UPDATE_TEMPLATES_SQL, templates)
+            if exits:
+                cursor.executemany(database.MARK_EXITED_SQL, exits)
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+        # Beritahu proses lain setelah data benar-benar ada di DB
+        if not self.notify:
+            return
+        for params in inserts:
+            # Row lengkap ikut di event -> cache proses lain tidak perlu query DB
+            entry = database.entry_row(params)
+            publish("insert", entry["id"], entry["plate_text"], event_time=entry["entry_time"], entry=entry)
+            # Replay WAL / spool setelah commit: vektor mungkin sudah di arsip sebelum crash
+            embedding_store.append_entry(entry["id"], entry["plate_text"], entry["face_vector"],
+                                         entry["face_model"], entry["entry_time"],
+                                         skip_existing=entry["id"] in replayed)
+        for face_vector, entry_id in templates:
+            publish("update", entry_id, templates=json.loads(face_vector))
+        for exit_time, entry_id in exits:
+            publish("exit", entry_id, event_time=exit_time)
+
+    # ---------- Spool ----------
+
+    def _spool_size(self):
+        try:
+            return os.path.getsize(self.spool_path)
+        except OSError:
+            return 0
+
+    def _spool(self, batch):
+        with open(self.spool_path, "ab") as f:
+            for record in batch:
+                f.write((json.dumps(record) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self.stats["spooled"] += len(batch)
+
+    @staticmethod
+    def _read_records(path):
+        records = []
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # baris terpotong saat crash
+        except OSError:
+            pass
+        return records
+
+    def _replay_spool(self):
+        records = self._read_records(self.spool_path)
+
+        done = 0
+        try:
+            for i in range(0, len(records), self.batch_size):
+                self._write_batch(records[i:i + self.batch_size])
+                done = i + self.batch_size
+        except Exception as e:
+            print(f"[DB-WRITER] Replay spool gagal, coba lagi nanti: {e}")
+            self.stats["failures"] += 1
+            self._retry_at = time.time() + self.retry_delay
+            self._rewrite_spool(records[done:])
+            self.stats["replayed"] += min(done, len(records))
+            return
+
+        # Semua record sudah masuk (INSERT IGNORE / UPDATE idempotent), spool dikosongkan
+        os.remove(self.spool_path)
+        self.stats["replayed"] += len(records)
+        print(f"[DB-WRITER] {len(records)} record dari spool berhasil di-replay")
+
+    def _rewrite_spool(self, records):
+        """Simpan sisa record yang belum ter-replay (atomic replace)."""
+        tmp_path = self.spool_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for record in records:
+                f.write((json.dumps(record) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.spool_path)
+
+
+# ================================ #
+#     FAKE DB + BENCHMARK          #
+# ================================ #
+
+class _FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self._result = []
+
+    def execute(self, sql, params=()):
+        self._result = [(entry_id,) for entry_id in params if entry_id in self.db.rows]
+
+    def fetchall(self):
+        return self._result
+
+    def executemany(self, sql, rows):
+        self.db.maybe_fail()
+        self.db.pending.append((sql, list(rows)))
+
+    def close(self):
+        pass
+
+
+class FakeDB:
+    """Stand-in MySQL: tabel entries di dict, bisa gagal secara acak atau 'down' total."""
+
+    def __init__(self, failure_rate=0.0, seed=0):
+        import random
+        self.rng = random.Random(seed)
+        self.failure_rate = failure_rate
+        self.down = False
+        self.rows = {}
+        self.pending = []
+
+    def maybe_fail(self):
+        if self.down or self.rng.random() < self.failure_rate:
+            raise ConnectionError("fake DB unreachable")
+
+    def connect(self):
+        self.maybe_fail()
+        return _FakeConnection(self)
+
+    def commit(self):
+        for sql, rows in self.pending:
+            if "INSERT" in sql:
+                for params in rows:
+                    self.rows.setdefault(params[0], {"plate_text": params[1], "status": "active"})
+            elif "face_vector" in sql:
+                for face_vector, entry_id in rows:
+                    row = self.rows.get(entry_id)
+                    if row and row["status"] == "active":
+                        row["face_vector"] = face_vector
+            else:
+                for exit_time, entry_id in rows:
+                    row = self.rows.get(entry_id)
+                    if row and row["status"] == "active":
+                        row["status"] = "exited"
+        self.pending = []
+
+
+class _FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return _FakeCursor(self.db)
+
+    def commit(self):
+        self.db.maybe_fail()
+        self.db.commit()
+
+    def close(self):
+        self.db.pending = []
+
+
+def benchmark(records=5_000, failure_rate=0.05, min_rate=200):
+    """Throughput dengan DB yang gagal acak + mati di tengah jalan: semua record harus sampai."""
+    import tempfile
+
+    spool = os.path.join(tempfile.mkdtemp(), "spool.jsonl")
+    fake = FakeDB(failure_rate=failure_rate)
+    writer = AsyncDBWriter(connect=fake.connect, spool_path=spool,
+                           retry_delay=0.05, notify=False)
+
+    start = time.perf_counter()
+    ids = []
+    for i in range(records):
+        ids.append(writer.submit_insert(f"B{i}XYZ", 0.9, [0.0] * 8, "", ""))
+        if i == records // 2:
+            fake.down = True      # DB mati di tengah jalan
+        if i == records * 3 // 4:
+            fake.down = False
+    for entry_id in ids[::2]:
+        writer.submit_exit(entry_id)
+
+    assert writer.flush(timeout=60), "flush timeout"
+    while writer._spool_size():
+        time.sleep(0.05)
+    writer.close()
+    elapsed = time.perf_counter() - start
+    rate = records / elapsed
+
+    exited = sum(1 for r in fake.rows.values() if r["status"] == "exited")
+    print(f"📊 {records} insert + {len(ids[::2])} exit dalam {elapsed:.2f}s "
+          f"({rate:.0f} record/s) | stats {writer.stats}")
+    assert set(fake.rows) == set(ids), f"tersimpan {len(fake.rows)}/{records}"
+    assert exited == len(ids[::2]), f"exited {exited}/{len(ids[::2])}"
+    assert not os.path.exists(writer.wal_path), "WAL harus dihapus setelah close"
+    assert rate >= min_rate, f"throughput {rate:.0f} record/s < {min_rate}"
+
+
+def check_crash_recovery(records=200):
+    """
+    Crash sebelum record commit / masuk spool (worker belum sempat jalan): setelah restart,
+    record dari WAL tetap masuk DB. Crash setelah commit tapi sebelum WAL dikosongkan:
+    replay tidak membuat duplikat dan exit tidak dibatalkan.
+    """
+    import tempfile
+
+    spool = os.path.join(tempfile.mkdtemp(), "spool.jsonl")
+    fake = FakeDB()
+
+    # 1. Proses "mati" dengan record hanya di antrian memori + WAL
+    crashed = AsyncDBWriter(connect=fake.connect, spool_path=spool, notify=False, autostart=False)
+    ids = [crashed.submit_insert(f"B{i}XYZ", 0.9, [0.0] * 8, "", "") for i in range(records)]
+    for entry_id in ids[:records // 2]:
+        crashed.submit_exit(entry_id)
+    crashed._wal.close()  # file handle dilepas seperti saat proses mati; tanpa flush / close writer
+    assert not fake.rows
+
+    # 2. Restart: WAL -> spool -> DB
+    writer = AsyncDBWriter(connect=fake.connect, spool_path=spool, retry_delay=0.05, notify=False)
+    assert writer.stats["recovered"] == records + records // 2
+    while writer._spool_size():
+        time.sleep(0.05)
+    assert set(fake.rows) == set(ids), f"hilang {len(set(ids) - set(fake.rows))} record"
+    assert sum(r["status"] == "exited" for r in fake.rows.values()) == records // 2
+
+    # 3. Crash setelah commit: WAL berisi record yang sudah di DB -> replay idempotent
+    writer.close()
+    with open(writer.wal_path, "wb") as f:
+        for entry_id in ids:
+            record = {"op": "insert", "params": list(database.entry_params(
+                entry_id, "X", 0.9, [0.0] * 8, "", "", database.now_str()))}
+            f.write((json.dumps(record) + "\n").encode("utf-8"))
+    writer = AsyncDBWriter(connect=fake.connect, spool_path=spool, retry_delay=0.05, notify=False)
+    while writer._spool_size():
+        time.sleep(0.05)
+    writer.close()
+    assert len(fake.rows) == records
+    assert sum(r["status"] == "exited" for r in fake.rows.values()) == records // 2
+    print(f"✅ Crash recovery: {records} insert + {records // 2} exit dari WAL tersimpan, replay tanpa duplikat")
+
+
+if __name__ == "__main__":
+    check_crash_recovery()
+    benchmark()
@@ -0,0 +1,193 @@
+# utils/deadline.py
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from utils.events import emit_gate_event
+from utils.priority import get_executor, mark_live_busy, clear_live_busy
+
+# Budget per tahap keputusan gate keluar (ms), dihitung dari saat tahap dimulai
+STAGE_BUDGETS_MS = {
+    "track": 800,          # burst multi-frame (detect + OCR per frame) sejak trigger
+    "detect": 500,
+    "ocr": 800,
+    "face": 1200,
+    "face_legacy": 1200,   # embedding pipeline lama, hanya untuk entry sebelum upgrade model
+    "lookup": 300,
+    "match": 200,
+}
+# Batas total dari trigger sampai keputusan (ms); tahap tidak boleh melewati ini
+DECISION_DEADLINE_MS = int(os.environ.get("GATE_DEADLINE_MS", "2500"))
+
+# Kebijakan kalau ada tahap yang melewati budget:
+#   "deny"       - tolak + buzzer (default, paling aman)
+#   "plate_only" - plat sudah cocok dengan entry active -> buka gate, ditandai audit
+#   "escalate"   - kirim ke aplikasi operator (event "escalation"), operator yang membuka
+TIMEOUT_POLICY = os.environ.get("GATE_TIMEOUT_POLICY", "deny")
+TIMEOUT_POLICIES = ("deny", "plate_only", "escalate")
+
+# Tahap dijalankan di kelas "live" PriorityExecutor (didahulukan dari tulis artefak / grid).
+# Tahap yang terlambat tetap berjalan di thread-nya (thread tidak bisa dibunuh); hasilnya dibuang
+_inflight = {}  # nama tahap -> future terakhir (model yang sama tidak dipakai dua thread sekaligus)
+
+
+class GateDecision:
+    """
+    Satu keputusan gate dengan deadline. Tiap tahap dijalankan di thread pool dan ditunggu
+    maksimal min(budget tahap, sisa deadline total). Semua tahap dicatat (ok / late / busy /
+    error + durasi) dan ikut dikirim di event "decision".
+    """
+
+    def __init__(self, lane, budgets=None, deadline_ms=None, policy=None):
+        self.id = str(uuid.uuid4())
+        self.lane = lane
+        self.budgets = dict(STAGE_BUDGETS_MS, **(budgets or {}))
+        self.deadline_ms = deadline_ms or DECISION_DEADLINE_MS
+        self.policy = policy or TIMEOUT_POLICY
+        if self.policy not in TIMEOUT_POLICIES:
+            print(f"⚠️ GATE_TIMEOUT_POLICY '{self.policy}' tidak dikenal, pakai 'deny'")
+            self.policy = "deny"
+
+        self.started = time.perf_counter()
+        self.stages = {}   # nama -> {status, elapsed_ms, budget_ms}
+        self._futures = {}
+        self.result = None
+        # Proses latar (backlog masuk, reprocess) menahan batch berikutnya sampai keputusan selesai
+        mark_live_busy()
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def remaining_ms(self):
+        return max(0.0, self.deadline_ms - self.elapsed_ms())
+
+    def stage_deadline(self, name):
+        """time.perf_counter() batas tahap (budget tahap / sisa deadline total, yang lebih dulu).
+        Diteruskan ke tahap yang bisa berhenti lebih awal dengan hasil parsial (mis. fallback OCR)."""
+        return time.perf_counter() + min(self.budgets.get(name, self.deadline_ms), self.remaining_ms()) / 1000
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Mulai tahap di background (bisa beberapa tahap paralel, mis. OCR + face)."""
+        previous = _inflight.get(name)
+        if previous is not None and not previous.done():
+            # Tahap yang sama dari kendaraan sebelumnya masih macet
+            self._futures[name] = (None, time.perf_counter())
+            return
+        future = get_executor().submit("live", fn, *args, **kwargs)
+        _inflight[name] = future
+        self._futures[name] = (future, time.perf_counter())
+
+    def wait(self, name):
+        """Tunggu hasil tahap. Returns (status, value); status "ok" / "late" / "busy" / "error"."""
+        future, submitted = self._futures.pop(name)
+        budget_ms = self.budgets.get(name, self.deadline_ms)
+
+        if future is None:
+            status, value = "busy", None
+        else:
+            stage_left_ms = budget_ms - (time.perf_counter() - submitted) * 1000
+            timeout_s = max(0.0, min(stage_left_ms, self.remaining_ms())) / 1000
+            try:
+                status, value = "ok", future.result(timeout=timeout_s)
+            except FutureTimeout:
+                status, value = "late", None
+            except Exception as e:
+                print(f"❌ Tahap {name} error: {e}")
+                status, value = "error", None
+
+        self.stages[name] = {
+            "status": status,
+            "elapsed_ms": round((time.perf_counter() - submitted) * 1000, 1),
+            "budget_ms": budget_ms
+        }
+        if status == "late":
+            print(f"⏱️ Tahap {name} melewati budget {budget_ms} ms")
+        elif status == "busy":
+            print(f"⏱️ Tahap {name} masih sibuk dengan kendaraan sebelumnya")
+        return status, value
+
+    def run(self, name, fn, *args, **kwargs):
+        self.submit(name, fn, *args, **kwargs)
+        return self.wait(name)
+
+    def finish(self, outcome, reason, audit=False, **data):
+        """
+        Catat keputusan akhir (allow / deny / escalate) + status semua tahap,
+        kirim sebagai event "decision".
+        """
+        clear_live_busy()
+        self.result = emit_gate_event(
+            "decision", lane=self.lane, decision_id=self.id, outcome=outcome, reason=reason,
+            audit=audit, policy=self.policy, total_ms=round(self.elapsed_ms(), 1),
+            deadline_ms=self.deadline_ms, stages=self.stages, **data)
+        return self.result
+
+    def timeout_outcome(self, plate_matched):
+        """
+        Keputusan saat ada tahap yang terlambat, sesuai policy.
+        plate_matched: plat sudah ditemukan di entry active (syarat mode plate_only).
+        """
+        if self.policy == "plate_only" and plate_matched:
+            return "allow"
+        if self.policy == "escalate":
+            return "escalate"
+        return "deny"
+
+
+class TimerScheduler:
+    """
+    Timer terjadwal di satu thread (pengganti time.sleep di loop kamera).
+    call_later(delay, fn) -> fn dipanggil setelah delay detik tanpa memblok pemanggil.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="timers", daemon=True)
+        self._thread.start()
+
+    def call_later(self, delay, fn, *args):
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), fn, args))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                _, _, fn, args = heapq.heappop(self._heap)
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"❌ Timer error: {e}")
+
+
+class LaneHold:
+    """Lane ditahan (trigger baru diabaikan) sampai timer melepasnya, tanpa memblok loop."""
+
+    def __init__(self, scheduler, lane):
+        self.scheduler = scheduler
+        self.lane = lane
+        self._until = 0.0
+
+    def hold(self, seconds, reason):
+        self._until = max(self._until, time.monotonic() + seconds)
+        self.scheduler.call_later(seconds, self._release, reason)
+
+    def _release(self, reason):
+        if time.monotonic() >= self._until:
+            emit_gate_event("lane_ready", lane=self.lane, after=reason)
+
+    @property
+    def active(self):
+        return time.monotonic() < self._until
+
+    def remaining_s(self):
+        return max(0.0, self._until - time.monotonic())
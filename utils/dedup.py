@@ -0,0 +1,112 @@
+# utils/dedup.py
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from face_recog.verification import append_template
+from utils.image_hash import hamming
+from utils.plate_index import plate_distance
+
+# Event dengan plat + wajah sama dalam jendela ini dianggap kendaraan yang sama
+DEDUP_WINDOW_S = float(os.environ.get("DEDUP_WINDOW_S", "120"))
+
+
+class EventDeduplicator:
+    """
+    Menolak event berulang dari kendaraan yang sama (sensor trigger berkali-kali).
+    Event hanya dibuang kalau plat DAN wajah cocok:
+      1. string plat (setelah OCR)
+      2. kemiripan wajah (hanya kalau plat cocok)
+    Hash frame hanya petunjuk murah (frame_seen): kamera lane diam, jadi mobil lain yang
+    berhenti di titik yang sama bisa menghasilkan frame mirip -> tidak pernah dipakai untuk membuang.
+    State disimpan di memori, tidak ada query DB.
+    """
+
+    def __init__(self, window_s=DEDUP_WINDOW_S, frame_hamming=4,
+                 plate_max_distance=1.0, face_threshold=0.8, template_max_similarity=0.95):
+        self.window_s = window_s
+        self.frame_hamming = frame_hamming
+        self.plate_max_distance = plate_max_distance
+        self.face_threshold = face_threshold
+        # Wajah duplikat yang cukup berbeda (sudut / cahaya lain) disimpan sebagai template tambahan
+        self.template_max_similarity = template_max_similarity
+        self._lock = threading.Lock()
+        self._events = deque()  # {time, frame_hash, plate, face, entry_id, templates}
+        self.dropped = {"plate_face": 0}
+        self.frame_hits = 0
+
+    def _expire(self, now):
+        while self._events and now - self._events[0]["time"] > self.window_s:
+            self._events.popleft()
+
+    def frame_seen(self, frame_hash):
+        """Frame (hampir) identik dengan frame event yang baru tersimpan. Hanya petunjuk, bukan alasan buang."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            for event in self._events:
+                if hamming(event["frame_hash"], frame_hash) <= self.frame_hamming:
+                    self.frame_hits += 1
+                    return True
+        return False
+
+    def recent_plate_events(self, plate_text):
+        """Tahap 1: event dalam jendela dengan plat sama / mirip (toleransi salah baca OCR)."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            return [e for e in self._events
+                    if plate_distance(e["plate"], plate_text) <= self.plate_max_distance]
+
+    def is_duplicate_event(self, plate_text, face_vector):
+        """
+        Tahap 1 + 2: plat cocok, lalu wajah cocok.
+        Returns event yang cocok (dengan key "similarity") atau None.
+        """
+        candidates = self.recent_plate_events(plate_text)
+        if not candidates:
+            return None
+
+        face = np.asarray(face_vector, dtype=np.float32)
+        face = face / (np.linalg.norm(face) + 1e-12)
+        for event in candidates:
+            if event["face"].shape != face.shape:
+                continue
+            similarity = float(event["face"] @ face)
+            if similarity >= self.face_threshold:
+                with self._lock:
+                    self.dropped["plate_face"] += 1
+                return dict(event, similarity=similarity)
+        return None
+
+    def add_template(self, event, face_vector):
+        """
+        Multi-template enrollment: wajah duplikat yang tidak terlalu mirip dengan yang sudah ada
+        ditambahkan ke entry-nya. Returns list template baru (untuk face_vector di DB) atau None.
+        """
+        if event.get("entry_id") is None or event["similarity"] >= self.template_max_similarity:
+            return None
+
+        with self._lock:
+            for stored in self._events:
+                if stored["entry_id"] == event["entry_id"]:
+                    stored["templates"] = append_template(stored["templates"], face_vector)
+                    return stored["templates"]
+        return None
+
+    def remember(self, frame_hash, plate_text, face_vector, entry_id=None):
+        """Catat event yang benar-benar disimpan."""
+        face = np.asarray(face_vector, dtype=np.float32)
+        face = face / (np.linalg.norm(face) + 1e-12)
+        with self._lock:
+            self._events.append({
+                "time": time.time(),
+                "frame_hash": frame_hash,
+                "plate": plate_text,
+                "face": face,
+                "entry_id": entry_id,
+                "templates": [[float(v) for v in face_vector]]
+            })
@@ -0,0 +1,80 @@
+# utils/detections.py
+import os
+import uuid
+
+import cv2
+import numpy as np
+
+# Kelas model deteksi (model/detection.pt)
+PLATE_CLS = 0
+FACE_CLS = 1
+LABELS = {PLATE_CLS: "plate", FACE_CLS: "face"}
+
+# Satu baris per box: koordinat integer sudah di-clamp ke frame
+DETECTION_DTYPE = np.dtype([
+    ("x1", "<i4"), ("y1", "<i4"), ("x2", "<i4"), ("y2", "<i4"),
+    ("conf", "<f4"), ("cls", "<i2")
+])
+
+
+def _to_numpy(values):
+    return values.cpu().numpy() if hasattr(values, "cpu") else np.asarray(values)
+
+
+class Detections:
+    """
+    Hasil deteksi dalam satu structured array + frame sumbernya.
+    Diisi sekali dari boxes.xyxy / conf / cls (tanpa akses tensor per elemen), lalu
+    dioper antar tahap (OCR, face) sebagai crop array; file crop hanya ditulis untuk
+    box yang benar-benar disimpan ke DB.
+    """
+
+    __slots__ = ("frame", "data")
+
+    def __init__(self, frame, data):
+        self.frame = frame
+        self.data = data
+
+    @classmethod
+    def from_boxes(cls, boxes, frame):
+        """Konversi vektor: xyxy dibulatkan ke bawah, di-clamp ke frame, box kosong dibuang."""
+        h, w = frame.shape[:2]
+        xyxy = _to_numpy(boxes.xyxy).reshape(-1, 4).astype(np.int32)
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w - 1)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h - 1)
+
+        data = np.empty(len(xyxy), dtype=DETECTION_DTYPE)
+        data["x1"], data["y1"], data["x2"], data["y2"] = xyxy.T
+        data["conf"] = _to_numpy(boxes.conf).reshape(-1)
+        data["cls"] = _to_numpy(boxes.cls).reshape(-1)
+
+        valid = (data["x2"] > data["x1"]) & (data["y2"] > data["y1"])
+        return cls(frame, data[valid])
+
+    def __len__(self):
+        return len(self.data)
+
+    def of_class(self, cls_id):
+        return Detections(self.frame, self.data[self.data["cls"] == cls_id])
+
+    def count(self, cls_id):
+        return int(np.count_nonzero(self.data["cls"] == cls_id))
+
+    def best(self, cls_id=None):
+        """Index box dengan confidence tertinggi (opsional per kelas), None kalau kosong."""
+        conf = self.data["conf"] if cls_id is None else np.where(self.data["cls"] == cls_id, self.data["conf"], -1)
+        if len(conf) == 0 or conf.max() < 0:
+            return None
+        return int(conf.argmax())
+
+    def crop(self, i):
+        """View (tanpa copy) ke frame untuk box i."""
+        x1, y1, x2, y2 = (int(self.data[k][i]) for k in ("x1", "y1", "x2", "y2"))
+        return self.frame[y1:y2, x1:x2]
+
+    def save_crop(self, i, out_dir):
+        """Tulis crop box i ke out_dir sebagai <label>_<uuid>.jpg (path disimpan di DB)."""
+        label = LABELS.get(int(self.data["cls"][i]), "object")
+        path = os.path.join(out_dir, f"{label}_{uuid.uuid4()}.jpg")
+        cv2.imwrite(path, self.crop(i))
+        return path
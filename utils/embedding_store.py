@@ -0,0 +1,302 @@
+# utils/embedding_store.py
+# Arsip embedding wajah append-only untuk audit ("kapan wajah ini pernah lewat?").
+#
+# Per model embedding ada dua file di utils/embeddings/:
+#   <model>_<dim>.f32   -> matriks float32 [N, dim], sudah dinormalisasi L2 (dot = cosine)
+#   <model>_<dim>.meta  -> record biner tetap [N] (entry_id, plate, entry_time epoch)
+# Ditulis bersama setiap insert entry; dibaca lewat np.memmap, jadi pencarian di jutaan
+# embedding tidak memuat semuanya ke heap Python.
+#
+#   python utils/embedding_store.py --entry <ENTRY_ID> [--top-k 10]
+#   python utils/embedding_store.py --image face.jpg [--since "2024-01-01 00:00:00"]
+#   python utils/embedding_store.py --backfill       -> isi arsip dari tabel entries
+#   python utils/embedding_store.py --benchmark 1000000
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+STORE_DIR = os.path.join(current_dir, "embeddings")
+LEGACY_MODEL = "VGG-Face"  # sama dengan face_recog.embedders.LEGACY_FACE_MODEL
+CHUNK_MB = 64              # batas memori per blok matriks saat pencarian
+
+META_DTYPE = np.dtype([("entry_id", "S36"), ("plate", "S16"), ("time", "<f8")])
+
+_write_lock = threading.Lock()
+
+
+def _file_key(model, dim):
+    model = re.sub(r"[^a-z0-9]+", "-", (model or LEGACY_MODEL).lower()).strip("-")
+    return f"{model}_{dim}"
+
+
+def _to_epoch(value):
+    if value is None:
+        return time.time()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").timestamp()
+    return float(value)
+
+
+class EmbeddingStore:
+    """Satu arsip (model, dim). Append dari proses penulis, search bisa dari proses mana saja."""
+
+    def __init__(self, model, dim, store_dir=STORE_DIR):
+        self.model = model or LEGACY_MODEL
+        self.dim = int(dim)
+        key = _file_key(model, dim)
+        self.vector_path = os.path.join(store_dir, f"{key}.f32")
+        self.meta_path = os.path.join(store_dir, f"{key}.meta")
+        self._repaired = False
+
+    def __len__(self):
+        try:
+            vectors = os.path.getsize(self.vector_path) // (self.dim * 4)
+            metas = os.path.getsize(self.meta_path) // META_DTYPE.itemsize
+        except OSError:
+            return 0
+        # Append yang terputus di tengah (crash) -> pakai jumlah record yang lengkap di kedua file
+        return min(vectors, metas)
+
+    def _repair(self):
+        """Potong sisa record yang tidak lengkap supaya vektor & meta tetap sejajar."""
+        count = len(self)
+        for path, size in ((self.vector_path, count * self.dim * 4),
+                           (self.meta_path, count * META_DTYPE.itemsize)):
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                print(f"[EMB] Memotong record tidak lengkap di {os.path.basename(path)}")
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        self._repaired = True
+
+    def append(self, vectors, entry_ids, plates, times):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+        meta = np.zeros(len(vectors), dtype=META_DTYPE)
+        meta["entry_id"] = [str(v).encode() for v in entry_ids]
+        meta["plate"] = [(p or "").encode()[:16] for p in plates]
+        meta["time"] = [_to_epoch(t) for t in times]
+
+        with _write_lock:
+            os.makedirs(os.path.dirname(self.vector_path), exist_ok=True)
+            if not self._repaired:
+                self._repair()
+            with open(self.vector_path, "ab") as f:
+                f.write(vectors.astype("<f4").tobytes())
+            with open(self.meta_path, "ab") as f:
+                f.write(meta.tobytes())
+
+    def _open(self):
+        count = len(self)
+        if count == 0:
+            return None, None
+        vectors = np.memmap(self.vector_path, dtype="<f4", mode="r", shape=(count, self.dim))
+        meta = np.memmap(self.meta_path, dtype=META_DTYPE, mode="r", shape=(count,))
+        return vectors, meta
+
+    def search(self, query, top_k=10, since=None, until=None, chunk_mb=CHUNK_MB):
+        """
+        Top-k cosine similarity terhadap seluruh arsip, per blok (chunk_mb MB per blok).
+        Returns: [{entry_id, plate, time, score}] urut dari skor tertinggi.
+        """
+        vectors, meta = self._open()
+        if vectors is None:
+            return []
+
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        since = _to_epoch(since) if since is not None else None
+        until = _to_epoch(until) if until is not None else None
+
+        rows = max(1, (chunk_mb * 1024 * 1024) // (self.dim * 4))
+        best_scores = np.empty(0, dtype=np.float32)
+        best_index = np.empty(0, dtype=np.int64)
+
+        for start in range(0, len(vectors), rows):
+            scores = vectors[start:start + rows] @ query
+            if since is not None or until is not None:
+                times = meta["time"][start:start + rows]
+                mask = np.ones(len(scores), dtype=bool)
+                if since is not None:
+                    mask &= times >= since
+                if until is not None:
+                    mask &= times <= until
+                scores = np.where(mask, scores, -np.inf)
+
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            best_scores = np.concatenate([best_scores, scores[top]])
+            best_index = np.concatenate([best_index, top + start])
+
+            keep = np.argsort(-best_scores)[:top_k]
+            best_scores, best_index = best_scores[keep], best_index[keep]
+
+        results = []
+        for score, i in zip(best_scores, best_index):
+            if not np.isfinite(score):
+                continue
+            results.append({
+                "entry_id": meta["entry_id"][i].decode(),
+                "plate": meta["plate"][i].decode(),
+                "time": datetime.fromtimestamp(float(meta["time"][i])).strftime("%Y-%m-%d %H:%M:%S"),
+                "score": float(score)
+            })
+        return results
+
+    def contains(self, entry_id):
+        _, meta = self._open()
+        if meta is None:
+            return False
+        target = entry_id.encode()
+        rows = 1_000_000
+        return any((meta["entry_id"][start:start + rows] == target).any()
+                   for start in range(0, len(meta), rows))
+
+    def vector_of(self, entry_id):
+        """Ambil vektor (ter-normalisasi) milik entry_id, scan meta per blok."""
+        vectors, meta = self._open()
+        if vectors is None:
+            return None
+        target = entry_id.encode()
+        rows = 1_000_000
+        for start in range(0, len(meta), rows):
+            hits = np.nonzero(meta["entry_id"][start:start + rows] == target)[0]
+            if len(hits):
+                return np.array(vectors[start + hits[0]])
+        return None
+
+
+def stores(store_dir=STORE_DIR):
+    """Semua arsip yang ada di store_dir."""
+    result = []
+    if not os.path.isdir(store_dir):
+        return result
+    for name in sorted(os.listdir(store_dir)):
+        if name.endswith(".f32"):
+            model, dim = name[:-4].rsplit("_", 1)
+            result.append(EmbeddingStore(model, int(dim), store_dir))
+    return result
+
+
+def append_entry(entry_id, plate_text, face_vector, face_model=None, entry_time=None,
+                 skip_existing=False):
+    """
+    Dipanggil setelah entry masuk DB. Gagal menulis arsip tidak boleh menggagalkan entry.
+    skip_existing: entry sudah ada di DB sebelum insert (replay) -> cek arsip dulu, tanpa duplikat.
+    """
+    try:
+        store = EmbeddingStore(face_model, len(face_vector))
+        if skip_existing and store.contains(entry_id):
+            return
+        store.append([face_vector], [entry_id], [plate_text], [entry_time])
+    except Exception as e:
+        print(f"[EMB] Gagal menulis embedding {entry_id}: {e}")
+
+
+def backfill_from_db(batch_size=1000):
+    """Isi arsip dari tabel entries (sekali, untuk data sebelum arsip ada)."""
+    import json
+    from utils.database import get_connection
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT id, plate_text, face_vector, face_model, entry_time FROM entries ORDER BY entry_time")
+    total = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        groups = {}
+        for row in rows:
+            vector = json.loads(row["face_vector"])
+            if vector and isinstance(vector[0], list):
+                vector = vector[0]  # multi-template: template pertama = wajah saat masuk
+            groups.setdefault((row["face_model"], len(vector)), []).append((row, vector))
+        for (model, dim), items in groups.items():
+            EmbeddingStore(model, dim).append(
+                [v for _, v in items], [r["id"] for r, _ in items],
+                [r["plate_text"] for r, _ in items], [r["entry_time"] for r, _ in items])
+        total += len(rows)
+        print(f"[EMB] Backfill {total} entry...")
+    cursor.close()
+    conn.close()
+    return total
+
+
+def benchmark(n=1_000_000, dim=512, top_k=10):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EmbeddingStore("benchmark", dim, tmp)
+        rng = np.random.default_rng(0)
+        start = time.perf_counter()
+        for offset in range(0, n, 100_000):
+            size = min(100_000, n - offset)
+            store.append(rng.standard_normal((size, dim), dtype=np.float32),
+                         [f"id-{offset + i}" for i in range(size)],
+                         ["B1234XYZ"] * size, [time.time()] * size)
+        print(f"📦 Tulis {n} embedding ({dim} dim): {time.perf_counter() - start:.1f} s, "
+              f"{os.path.getsize(store.vector_path) / 1e9:.2f} GB")
+
+        query = np.array(store._open()[0][n // 2])
+        for _ in range(2):  # run kedua: page cache sudah hangat
+            start = time.perf_counter()
+            results = store.search(query, top_k=top_k)
+            print(f"🔎 Top-{top_k}: {(time.perf_counter() - start) * 1000:.0f} ms, "
+                  f"hasil teratas {results[0]['entry_id']} ({results[0]['score']:.3f})")
+
+
+def _print_results(store, results):
+    print(f"\n📊 {store.model} ({store.dim} dim, {len(store)} embedding)")
+    for r in results:
+        print(f"   {r['score']:.3f}  {r['time']}  {r['plate']:<12} {r['entry_id']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pencarian wajah di arsip embedding")
+    parser.add_argument("--entry", help="cari wajah yang mirip dengan entry ini")
+    parser.add_argument("--image", help="cari wajah yang mirip dengan crop wajah ini")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--since", help='"YYYY-mm-dd HH:MM:SS"')
+    parser.add_argument("--until", help='"YYYY-mm-dd HH:MM:SS"')
+    parser.add_argument("--backfill", action="store_true")
+    parser.add_argument("--benchmark", type=int, metavar="N")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+    elif args.backfill:
+        print(f"✅ Backfill selesai: {backfill_from_db()} entry")
+    elif args.entry:
+        for store in stores():
+            query = store.vector_of(args.entry)
+            if query is not None:
+                _print_results(store, store.search(query, args.top_k, args.since, args.until))
+                return
+        print(f"❌ Entry {args.entry} tidak ada di arsip")
+    elif args.image:
+        from face_recog.main import generate_face_encoding, current_face_model
+        query = generate_face_encoding(args.image)
+        if query is None:
+            print("❌ Gagal membuat encoding dari gambar")
+            return
+        store = EmbeddingStore(current_face_model(), len(query))
+        _print_results(store, store.search(query, args.top_k, args.since, args.until))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# utils/entry_cache.py
+import threading
+
+import numpy as np
+
+from utils import database
+from utils.db_writer import AsyncDBWriter
+from utils.cache_channel import CacheChannel
+from utils.plate_index import PlateIndex, normalize_plate
+from utils.priority import submit_background
+from face_recog.verification import to_templates
+
+
+EXITED_MEMORY = 10_000
+
+
+class ActiveEntryCache:
+    """
+    Cache write-through untuk entry active, key by ID dan plat.
+    face_vector disimpan sebagai NumPy float32 (sudah di-decode dari JSON), plus
+    face_templates: matriks template ternormalisasi [k, dim] untuk verifikasi 1:N.
+    Perubahan dari proses lain diterima lewat CacheChannel (lihat sync()); event membawa row /
+    template-nya sendiri, jadi sync() tidak pernah query DB di jalur keputusan gate.
+    """
+
+    def __init__(self, channel=None, writer=None):
+        self.channel = channel or CacheChannel()
+        self.writer = writer or AsyncDBWriter()
+        self.plate_index = PlateIndex()
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._ids_by_plate = {}  # plate -> [entry_id] urut entry_time (terbaru di akhir)
+        self._exited = {}        # entry_id exit terakhir (urut), insert yang di-replay diabaikan
+
+    def __len__(self):
+        return len(self._by_id)
+
+    @staticmethod
+    def _decode(entry):
+        entry = dict(entry)
+        entry['face_vector'] = np.asarray(entry['face_vector'], dtype=np.float32)
+        entry['face_templates'] = to_templates(entry['face_vector'])
+        return entry
+
+    def warm(self):
+        """Isi cache dengan satu bulk query saat startup."""
+        # Ambil posisi channel dulu; event yang masuk selama query akan di-replay (idempotent)
+        self.channel.seek_end()
+        rows = database.get_active_entries()
+
+        with self._lock:
+            self._by_id.clear()
+            self._ids_by_plate.clear()
+            self.plate_index.rebuild([])
+            for row in rows:
+                self._put(row)
+
+        print(f"[CACHE] Warm-up selesai: {len(rows)} entry active")
+
+    def _put(self, entry):
+        entry = self._decode(entry)
+        entry_id = entry['id']
+        if entry_id in self._by_id:
+            return
+
+        plate = normalize_plate(entry['plate_text'])
+        self._by_id[entry_id] = entry
+        self._ids_by_plate.setdefault(plate, []).append(entry_id)
+        self.plate_index.add(entry_id, plate)
+
+    def _remove(self, entry_id):
+        entry = self._by_id.pop(entry_id, None)
+        if entry is None:
+            return None
+
+        plate = normalize_plate(entry['plate_text'])
+        ids = self._ids_by_plate.get(plate, [])
+        if entry_id in ids:
+            ids.remove(entry_id)
+        if not ids:
+            self._ids_by_plate.pop(plate, None)
+        self.plate_index.remove(entry_id)
+        return entry
+
+    def sync(self):
+        """Terapkan event insert/update/exit dari proses lain (hanya memori, tanpa query DB)."""
+        for event in self.channel.read_events():
+            entry_id = event.get("id")
+            op = event.get("op")
+            with self._lock:
+                if op == "insert":
+                    if entry_id in self._by_id or entry_id in self._exited:
+                        continue
+                    if event.get("entry"):
+                        self._put(event["entry"])
+                    else:
+                        submit_background(self._refresh, entry_id)  # event lama tanpa row
+                elif op == "exit":
+                    self._remove(entry_id)
+                    self._remember_exit(entry_id)
+                elif op == "update" and entry_id in self._by_id:
+                    # Template wajah bertambah
+                    if event.get("templates"):
+                        entry = self._remove(entry_id)
+                        self._put(dict(entry, face_vector=event["templates"]))
+                    else:
+                        submit_background(self._refresh, entry_id)
+
+    def _remember_exit(self, entry_id):
+        self._exited[entry_id] = True
+        while len(self._exited) > EXITED_MEMORY:
+            self._exited.pop(next(iter(self._exited)))
+
+    def _refresh(self, entry_id):
+        """Muat ulang satu entry dari DB di thread latar (event tanpa payload)."""
+        try:
+            entry = database.get_entry_by_id(entry_id)
+        except Exception as e:
+            print(f"[CACHE] Gagal memuat entry {entry_id}: {e}")
+            return
+        with self._lock:
+            self._remove(entry_id)
+            if entry and entry['status'] == 'active' and entry_id not in self._exited:
+                self._put(entry)
+
+    def get_by_id(self, entry_id):
+        with self._lock:
+            return self._by_id.get(entry_id)
+
+    def get_by_plate(self, plate_text):
+        """Entry active terbaru untuk plat ini (pengganti get_active_entry_by_plate)."""
+        with self._lock:
+            ids = self._ids_by_plate.get(normalize_plate(plate_text))
+            if not ids:
+                return None
+            return self._by_id[ids[-1]]
+
+    def find_fuzzy(self, plate_text, max_distance=1.0, limit=5):
+        """Entry active dengan plat mirip, urut jarak."""
+        with self._lock:
+            results = []
+            for match in self.plate_index.search(plate_text, max_distance, limit):
+                for entry_id in match["ids"]:
+                    entry = dict(self._by_id[entry_id])
+                    entry['plate_distance'] = match["distance"]
+                    results.append(entry)
+            return results
+
+    def insert_entry(self, plate_text, plate_conf, face_vector, plate_path, face_path, face_model=None):
+        """Write-through: masuk cache sekarang, INSERT ke DB lewat writer asinkron."""
+        entry_id = self.writer.submit_insert(plate_text, plate_conf, face_vector, plate_path, face_path,
+                                             face_model)
+        with self._lock:
+            self._put({
+                'id': entry_id,
+                'plate_text': plate_text,
+                'plate_conf': plate_conf,
+                'face_vector': face_vector,
+                'face_model': face_model,
+                'face_dim': len(face_vector),
+                'plate_image': plate_path,
+                'face_image': face_path,
+                'status': 'active'
+            })
+        return entry_id
+
+    def mark_exited(self, entry_id):
+        """Hapus dari cache sekarang, UPDATE ke DB lewat writer asinkron."""
+        with self._lock:
+            entry = self._remove(entry_id)
+            self._remember_exit(entry_id)
+        self.writer.submit_exit(entry_id)
+        return entry
+
+    def close(self):
+        """Tunggu semua penulisan DB selesai (atau masuk spool)."""
+        self.writer.flush()
+        self.writer.close()
@@ -0,0 +1,117 @@
+# utils/events.py
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+
+from utils.cache_channel import CacheChannel, append_event
+
+# Event gate dari semua proses (in_validation, out_validation, api_server) dikumpulkan di sini,
+# lalu di-relay oleh API server ke client stream (SSE / WebSocket)
+GATE_EVENTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gate_events.log")
+
+EVENT_TYPES = ("entry", "exit", "rejection", "duplicate", "manual_open", "manual_mute",
+               "decision", "escalation", "lane_ready")
+
+
+class Subscription:
+    """Antrian event untuk satu subscriber. Client lambat tidak memblok publisher (event lama dibuang)."""
+
+    def __init__(self, maxsize=100):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription:
+    """Subscription untuk event loop asyncio (dipakai oleh server ASGI)."""
+
+    def __init__(self, loop, maxsize=100):
+        import asyncio
+        self.loop = loop
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _put_nowait(self, event):
+        if self._queue.full():
+            self.dropped += 1
+            return
+        self._queue.put_nowait(event)
+
+    def put(self, event):
+        # publish bisa datang dari thread lain
+        self.loop.call_soon_threadsafe(self._put_nowait, event)
+
+    async def get(self):
+        return await self._queue.get()
+
+
+class EventBus:
+    """Pub/sub in-process sederhana untuk event gate."""
+
+    def __init__(self, history=50):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self.recent = deque(maxlen=history)
+
+    def subscribe(self, subscription=None):
+        subscription = subscription or Subscription()
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event):
+        with self._lock:
+            self.recent.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+
+
+bus = EventBus()
+
+
+def emit_gate_event(event_type, **data):
+    """
+    Kirim event gate: langsung ke subscriber di proses ini, dan ke file event
+    supaya API server (proses lain) bisa me-relay ke client.
+    """
+    event = {"type": event_type, "time": datetime.now().isoformat(timespec="seconds"), **data}
+    bus.publish(event)
+    append_event(event, GATE_EVENTS_PATH)
+    return event
+
+
+def relay_file_events(channel):
+    """Pindahkan event dari file (proses lain) ke bus lokal. Returns jumlah event."""
+    count = 0
+    for event in channel.read_events():
+        # Event dari proses ini sendiri sudah dipublish langsung
+        if event.pop("pid", None) == os.getpid():
+            continue
+        bus.publish(event)
+        count += 1
+    return count
+
+
+def gate_event_channel():
+    """Channel pembaca file event gate, mulai dari event terbaru."""
+    channel = CacheChannel(GATE_EVENTS_PATH)
+    channel.seek_end()
+    return channel
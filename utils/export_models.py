@@ -0,0 +1,129 @@
+# utils/export_models.py
+# Build step: export model YOLO (.pt) ke ONNX (+ opsional INT8) dan benchmark vs .pt.
+#
+#   python utils/export_models.py                      -> export detection & ocr ke ONNX
+#   python utils/export_models.py --int8               -> + versi INT8 (dynamic quantization)
+#   python utils/export_models.py --benchmark DIR      -> bandingkan latency & hasil di gambar DIR
+import argparse
+import glob
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from utils.yolo_runtime import OnnxYOLO, load_yolo
+
+MODEL_DIR = os.path.join(project_root, "model")
+MODELS = {
+    "detection": os.path.join(MODEL_DIR, "detection.pt"),
+    "ocr": os.path.join(MODEL_DIR, "ocr.pt"),
+}
+IMGSZ = 640
+
+
+def export_onnx(pt_path, imgsz=IMGSZ, int8=False):
+    """Export .pt -> .onnx dengan input shape tetap (batch 1, imgsz x imgsz)."""
+    from ultralytics import YOLO
+
+    onnx_path = YOLO(pt_path).export(format="onnx", imgsz=imgsz, dynamic=False, simplify=True)
+    print(f"✅ ONNX: {onnx_path}")
+
+    if int8:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        int8_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+        print(f"✅ ONNX INT8: {int8_path}")
+
+    return onnx_path
+
+
+def _box_iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _detections(model, image):
+    boxes = model(image, verbose=False)[0].boxes
+    return [(int(c), [float(v) for v in xyxy]) for xyxy, c in zip(boxes.xyxy, boxes.cls)]
+
+
+def _agreement(reference, candidate, iou_threshold=0.5):
+    """Precision / recall deteksi kandidat terhadap hasil .pt (kelas sama + IoU >= threshold)."""
+    matched = 0
+    used = set()
+    for cls_ref, box_ref in reference:
+        for j, (cls_c, box_c) in enumerate(candidate):
+            if j not in used and cls_c == cls_ref and _box_iou(box_ref, box_c) >= iou_threshold:
+                used.add(j)
+                matched += 1
+                break
+    return matched, len(reference), len(candidate)
+
+
+def benchmark(image_dir, backends=("onnx", "onnx-int8"), num_threads=None, warmup=3):
+    import cv2
+
+    images = [cv2.imread(p) for p in sorted(glob.glob(os.path.join(image_dir, "*.jpg")))]
+    images = [img for img in images if img is not None]
+    if not images:
+        print(f"❌ Tidak ada gambar .jpg di {image_dir}")
+        return
+
+    for name, pt_path in MODELS.items():
+        reference_model = load_yolo(pt_path, backend="pt", num_threads=num_threads)
+        runs = {"pt": reference_model}
+        for backend in backends:
+            model = load_yolo(pt_path, backend=backend, num_threads=num_threads)
+            if isinstance(model, OnnxYOLO):
+                runs[backend] = model
+
+        reference = None
+        print(f"\n📊 {name} ({len(images)} gambar)")
+        for backend, model in runs.items():
+            for img in images[:warmup]:
+                model(img, verbose=False)
+
+            start = time.perf_counter()
+            outputs = [_detections(model, img) for img in images]
+            latency_ms = (time.perf_counter() - start) * 1000 / len(images)
+
+            if reference is None:
+                reference = outputs
+                print(f"   {backend:<10} {latency_ms:7.1f} ms/gambar (referensi)")
+                continue
+
+            matched = n_ref = n_cand = 0
+            for ref, cand in zip(reference, outputs):
+                m, r, c = _agreement(ref, cand)
+                matched, n_ref, n_cand = matched + m, n_ref + r, n_cand + c
+            recall = matched / n_ref if n_ref else 1.0
+            precision = matched / n_cand if n_cand else 1.0
+            print(f"   {backend:<10} {latency_ms:7.1f} ms/gambar | "
+                  f"recall {recall:.3f} precision {precision:.3f} vs .pt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export YOLO ke ONNX dan benchmark")
+    parser.add_argument("--int8", action="store_true", help="buat juga versi INT8")
+    parser.add_argument("--imgsz", type=int, default=IMGSZ)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--benchmark", metavar="DIR", help="folder gambar untuk benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, num_threads=args.threads)
+        return
+
+    for pt_path in MODELS.values():
+        export_onnx(pt_path, imgsz=args.imgsz, int8=args.int8)
+
+
+if __name__ == "__main__":
+    main()
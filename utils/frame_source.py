@@ -0,0 +1,331 @@
+# utils/frame_source.py
+# Sumber frame yang bisa diganti tanpa mengubah pipeline:
+#   "0" / "/dev/video0"  -> kamera (V4L2 di Linux), device tetap terbuka
+#   "rtsp://..."         -> kamera IP
+#   "video.mp4"          -> file video (replay)
+#   "folder/"            -> folder gambar .jpg / .png (replay, urut nama)
+# Decode berjalan di thread sendiri; read() mengambil frame dari buffer.
+#
+#   python utils/frame_source.py SOURCE      -> benchmark decode (fps, lag timestamp)
+import glob
+import os
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+
+# Sumber kamera per lane, contoh: CAMERA_SOURCE_OUT="rtsp://10.0.0.5/stream1"
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "0")
+
+BACKOFF_MIN_S = 0.5
+BACKOFF_MAX_S = 10.0
+MAX_READ_FAILURES = 10   # read gagal berturut-turut -> device dianggap putus, reconnect
+
+# image: array BGR, timestamp: epoch detik saat frame diambil (atau posisi di file), seq: nomor frame
+FramePacket = namedtuple("FramePacket", ["image", "timestamp", "seq"])
+
+
+class FrameSource:
+    """
+    Interface sumber frame dengan thread decode di belakang.
+    Sumber live (kamera / RTSP): hanya frame terbaru yang disimpan (frame lama dibuang),
+    putus -> reconnect dengan backoff eksponensial.
+    Sumber replay (file / folder): semua frame dikirim berurutan, buffer terbatas (backpressure).
+    API read() / release() / isOpened() sama dengan cv2.VideoCapture.
+    """
+
+    live = True
+
+    def __init__(self, name, buffer_size=4):
+        self.name = name
+        self.buffer_size = 1 if self.live else buffer_size
+        self.stats = {"frames": 0, "dropped": 0, "reconnects": 0}
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._opened = False
+        self._finished = False
+        self._seq = 0
+        self._thread = None
+
+    # ---------- diimplementasikan subclass ----------
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _grab(self):
+        """Returns (image, timestamp) atau None kalau gagal / stream habis."""
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    # ---------- thread decode ----------
+
+    def start(self, wait_s=5.0):
+        """Mulai thread decode, tunggu frame pertama maks. wait_s detik. Returns True kalau siap."""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"frames-{self.name}", daemon=True)
+        self._thread.start()
+        with self._cond:
+            self._cond.wait_for(lambda: self._buffer or self._finished, wait_s)
+            return bool(self._buffer)
+
+    def _run(self):
+        backoff = BACKOFF_MIN_S
+        failures = 0
+        while self._running:
+            if not self._opened:
+                if self._open():
+                    self._opened = True
+                    failures = 0
+                elif not self.live:
+                    print(f"❌ {self.name} tidak bisa dibuka")
+                    break
+                else:
+                    print(f"⚠️ {self.name} gagal dibuka, coba lagi dalam {backoff:.1f} s")
+                    with self._cond:  # bisa dibangunkan oleh release()
+                        self._cond.wait_for(lambda: not self._running, backoff)
+                    backoff = min(BACKOFF_MAX_S, backoff * 2)
+                    continue
+
+            grabbed = self._grab()
+            if grabbed is None:
+                if not self.live:
+                    break  # stream habis
+                failures += 1
+                if failures >= MAX_READ_FAILURES:
+                    print(f"⚠️ {self.name} terputus, reconnect...")
+                    self._close()
+                    self._opened = False
+                    self.stats["reconnects"] += 1
+                else:
+                    time.sleep(0.01)
+                continue
+
+            failures = 0
+            backoff = BACKOFF_MIN_S
+            image, timestamp = grabbed
+            self._seq += 1
+            self._push(FramePacket(image, timestamp, self._seq))
+
+        self._close()
+        self._opened = False
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+
+    def _push(self, packet):
+        with self._cond:
+            if self.live:
+                self.stats["dropped"] += len(self._buffer)
+                self._buffer.clear()
+            else:
+                self._cond.wait_for(lambda: len(self._buffer) < self.buffer_size or not self._running)
+            self._buffer.append(packet)
+            self.stats["frames"] += 1
+            self._cond.notify_all()
+
+    # ---------- API pipeline ----------
+
+    def read_packet(self, timeout=2.0):
+        """Frame berikutnya (FramePacket) atau None kalau timeout / stream habis."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._buffer or self._finished, timeout)
+            if not self._buffer:
+                return None
+            packet = self._buffer.popleft()
+            self._cond.notify_all()
+            return packet
+
+    def read(self, timeout=2.0):
+        packet = self.read_packet(timeout)
+        return (True, packet.image) if packet is not None else (False, None)
+
+    @property
+    def finished(self):
+        """Replay selesai (file / folder habis) dan buffer kosong."""
+        return self._finished and not self._buffer
+
+    def isOpened(self):
+        return self._running and not self.finished
+
+    def release(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+
+
+class CameraSource(FrameSource):
+    """Kamera lokal (index / /dev/videoN), dibuka sekali dan tetap terbuka."""
+
+    def __init__(self, device=0, width=None, height=None, fps=None):
+        super().__init__(f"Kamera {device}")
+        self.device = device
+        self.props = {cv2.CAP_PROP_FRAME_WIDTH: width, cv2.CAP_PROP_FRAME_HEIGHT: height,
+                      cv2.CAP_PROP_FPS: fps}
+        self._cap = None
+
+    def _backend(self):
+        return cv2.CAP_V4L2 if sys.platform.startswith("linux") else cv2.CAP_ANY
+
+    def _open(self):
+        self._cap = cv2.VideoCapture(self.device, self._backend())
+        if not self._cap.isOpened():
+            self._cap.release()
+            return False
+        for prop, value in self.props.items():
+            if value:
+                self._cap.set(prop, value)
+        # Buffer driver minimal: frame yang dibaca selalu yang terbaru
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return True
+
+    def _grab(self):
+        ret, frame = self._cap.read()
+        return (frame, time.time()) if ret else None
+
+    def _close(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class RtspSource(CameraSource):
+    """Kamera IP (RTSP / HTTP) lewat FFmpeg."""
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.name = f"RTSP {url.split('@')[-1]}"  # jangan tampilkan user:password
+
+    def _backend(self):
+        return cv2.CAP_FFMPEG
+
+
+class VideoFileSource(FrameSource):
+    """
+    File video untuk replay. realtime=True: frame dikirim sesuai fps file (simulasi kamera);
+    default secepat konsumen membaca (benchmark). timestamp = posisi frame di file.
+    """
+
+    live = False
+
+    def __init__(self, path, realtime=False, loop=False):
+        super().__init__(os.path.basename(path))
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self._cap = None
+        self._start = None
+
+    def _open(self):
+        self._cap = cv2.VideoCapture(self.path)
+        self._start = time.time()
+        return self._cap.isOpened()
+
+    def _grab(self):
+        ret, frame = self._cap.read()
+        if not ret and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self._start = time.time()
+            ret, frame = self._cap.read()
+        if not ret:
+            return None
+
+        position = self._cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if self.realtime:
+            time.sleep(max(0.0, self._start + position - time.time()))
+        return frame, position
+
+    def _close(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class ImageDirSource(FrameSource):
+    """Folder gambar (urut nama) untuk replay. timestamp = mtime file; fps opsional untuk pacing."""
+
+    live = False
+
+    def __init__(self, directory, fps=None, patterns=("*.jpg", "*.jpeg", "*.png")):
+        super().__init__(os.path.basename(os.path.normpath(directory)))
+        self.directory = directory
+        self.interval = 1.0 / fps if fps else 0.0
+        self.patterns = patterns
+        self._files = deque()
+
+    def _open(self):
+        files = []
+        for pattern in self.patterns:
+            files.extend(glob.glob(os.path.join(self.directory, pattern)))
+        self._files = deque(sorted(files))
+        return bool(self._files)
+
+    def _grab(self):
+        while self._files:
+            path = self._files.popleft()
+            frame = cv2.imread(path)
+            if frame is not None:
+                if self.interval:
+                    time.sleep(self.interval)
+                return frame, os.path.getmtime(path)
+        return None
+
+
+def open_source(spec=None, lane=None, start=True, **kwargs):
+    """
+    Buat FrameSource dari string spec (lihat header file). Tanpa spec: CAMERA_SOURCE_<LANE>
+    atau CAMERA_SOURCE dari environment.
+    """
+    if spec is None:
+        spec = os.environ.get(f"CAMERA_SOURCE_{lane.upper()}", CAMERA_SOURCE) if lane else CAMERA_SOURCE
+    spec = str(spec)
+
+    if spec.isdigit():
+        source = CameraSource(int(spec), **kwargs)
+    elif spec.startswith(("rtsp://", "rtsps://", "http://", "https://")):
+        source = RtspSource(spec)
+    elif os.path.isdir(spec):
+        source = ImageDirSource(spec, **kwargs)
+    elif spec.startswith("/dev/"):
+        source = CameraSource(spec, **kwargs)
+    else:
+        source = VideoFileSource(spec, **kwargs)
+
+    if start:
+        source.start()
+    return source
+
+
+def benchmark(spec, seconds=10.0):
+    """Decode throughput & lag (waktu baca - timestamp frame) untuk satu sumber."""
+    source = open_source(spec)
+    count, lags = 0, []
+    started = time.time()
+    while time.time() - started < seconds:
+        packet = source.read_packet()
+        if packet is None:
+            if source.finished:
+                break
+            continue
+        count += 1
+        if source.live:
+            lags.append(time.time() - packet.timestamp)
+    elapsed = time.time() - started
+    source.release()
+
+    print(f"📊 {source.name}: {count} frame dalam {elapsed:.1f} s ({count / elapsed:.1f} fps) | "
+          f"dibuang {source.stats['dropped']} | reconnect {source.stats['reconnects']}")
+    if lags:
+        lags.sort()
+        print(f"   lag median {lags[len(lags) // 2] * 1000:.1f} ms, maks {lags[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else CAMERA_SOURCE)
@@ -0,0 +1,34 @@
+# utils/gate_control.py
+import os
+from datetime import datetime
+
+from utils.events import emit_gate_event
+
+# Trigger file dibaca oleh out_validation.main.check_manual_trigger()
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUT_VALIDATION_DIR = os.path.join(PROJECT_ROOT, "out_validation")
+
+
+def _write_trigger(filename, content, log_message):
+    os.makedirs(OUT_VALIDATION_DIR, exist_ok=True)
+
+    # 1. Buat file trigger
+    trigger_path = os.path.join(OUT_VALIDATION_DIR, filename)
+    with open(trigger_path, "w") as f:
+        f.write(content)
+
+    # 2. Catat Log
+    with open("manual_logs.txt", "a") as f:
+        f.write(f"{datetime.now()} - {log_message}\n")
+
+
+def request_open_gate(source="app"):
+    """Minta out_validation membuka gate (lewat trigger_open.txt)."""
+    _write_trigger("trigger_open.txt", "OPEN", "Gate dibuka manual via App")
+    emit_gate_event("manual_open", source=source, status="requested")
+
+
+def request_stop_buzzer(source="app"):
+    """Minta out_validation mematikan buzzer (lewat trigger_mute.txt)."""
+    _write_trigger("trigger_mute.txt", "MUTE", "Buzzer dimatikan manual via App")
+    emit_gate_event("manual_mute", source=source, status="requested")
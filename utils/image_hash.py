@@ -0,0 +1,27 @@
+# utils/image_hash.py
+import hashlib
+
+import cv2
+import numpy as np
+
+
+def dhash(image, hash_size=8):
+    """Difference hash 64-bit (BGR / grayscale). Tahan terhadap noise kecil & resize."""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def content_hash(image):
+    """SHA-1 dari piksel crop (+ shape / dtype). Hanya crop yang persis sama yang sama hash-nya:
+    dipakai sebagai key cache hasil (embedding, OCR), bukan dhash yang sengaja toleran."""
+    image = np.ascontiguousarray(image)
+    digest = hashlib.sha1(f"{image.shape}|{image.dtype}".encode("ascii"))
+    digest.update(image.data)
+    return digest.hexdigest()
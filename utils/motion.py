@@ -0,0 +1,164 @@
+# utils/motion.py
+import os
+import time
+
+import cv2
+
+from utils.roi import lane_roi
+
+# Mode trigger:
+#   "sensor"  - hanya sensor serial (perilaku lama) + cooldown anti-chatter
+#   "confirm" - trigger sensor hanya dijalankan kalau kamera melihat kendaraan berhenti di ROI
+#   "motion"  - kamera saja sebagai trigger (sensor diabaikan)
+#   "either"  - sensor atau kamera, mana yang duluan
+TRIGGER_MODE = os.environ.get("TRIGGER_MODE", "sensor")
+
+
+class MotionGate:
+    """
+    Deteksi kehadiran & gerakan murah di frame kecil (grayscale, lebar scale_width):
+    - presence: rasio foreground (background subtraction MOG2) di ROI
+    - motion: rasio piksel berubah antar frame berurutan (frame differencing)
+    Kendaraan dianggap "berhenti" kalau hadir dan diam selama still_frames frame.
+    Presence memakai hysteresis (presence_on / presence_off) agar tidak berkedip.
+    """
+
+    def __init__(self, lane=None, roi=None, scale_width=160,
+                 presence_on=0.20, presence_off=0.08,
+                 motion_still=0.02, still_frames=5, cooldown_s=5.0, confirm_window_s=3.0,
+                 warmup_frames=30, max_freeze_s=120.0):
+        self.roi = roi or (lane_roi(lane) if lane else (0.0, 0.0, 1.0, 1.0))
+        self.scale_width = scale_width
+        self.presence_on = presence_on
+        self.presence_off = presence_off
+        self.motion_still = motion_still
+        self.still_frames = still_frames
+        self.cooldown_s = cooldown_s
+        self.confirm_window_s = confirm_window_s
+        self.warmup_frames = warmup_frames
+        self.max_freeze_s = max_freeze_s
+
+        self._bg = cv2.createBackgroundSubtractorMOG2(history=300, varThreshold=25, detectShadows=False)
+        self._prev = None
+        self._still_count = 0
+        self._last_trigger = 0.0
+        self._pending_until = 0.0
+        self._frames = 0
+        self._present_since = 0.0
+        self._held_edge = False    # kendaraan berhenti saat lane ditahan -> dipicu setelah hold
+
+        self.present = False
+        self.stopped = False
+        self.armed = True          # trigger kamera baru aktif lagi setelah kendaraan pergi
+        self.presence_ratio = 0.0
+        self.motion_ratio = 0.0
+
+    def _prepare(self, frame):
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = self.roi
+        roi = frame[int(y1 * h):int(y2 * h), int(x1 * w):int(x2 * w)]
+        rh, rw = roi.shape[:2]
+        small = cv2.resize(roi, (self.scale_width, max(1, int(rh * self.scale_width / rw))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def update(self, frame):
+        """Proses satu frame. Returns True satu kali saat kendaraan baru saja berhenti."""
+        gray = self._prepare(frame)
+
+        self._frames += 1
+
+        # Background tidak di-update selama kendaraan ada, supaya mobil diam tidak "hilang".
+        # Batas max_freeze_s mencegah model macet kalau scene berubah permanen (cahaya, dll).
+        frozen = self.present and time.time() - self._present_since < self.max_freeze_s
+        fg = self._bg.apply(gray, learningRate=0 if frozen else -1)
+        self.presence_ratio = cv2.countNonZero(fg) / fg.size
+
+        # Model background masih belajar
+        if self._frames <= self.warmup_frames:
+            self._prev = gray
+            return False
+
+        if self._prev is None:
+            self.motion_ratio = 0.0
+        else:
+            diff = cv2.absdiff(gray, self._prev)
+            self.motion_ratio = cv2.countNonZero(cv2.threshold(diff, 25, 255, cv2.THRESH_BINARY)[1]) / diff.size
+        self._prev = gray
+
+        # Hysteresis presence
+        if self.present:
+            self.present = self.presence_ratio >= self.presence_off
+        elif self.presence_ratio >= self.presence_on:
+            self.present = True
+            self._present_since = time.time()
+
+        if not self.present:
+            self.armed = True
+            self._still_count = 0
+            self.stopped = False
+            self._held_edge = False
+            return False
+
+        self._still_count = self._still_count + 1 if self.motion_ratio <= self.motion_still else 0
+        was_stopped = self.stopped
+        self.stopped = self._still_count >= self.still_frames
+
+        return self.stopped and not was_stopped and self.armed
+
+    def in_cooldown(self):
+        return time.time() - self._last_trigger < self.cooldown_s
+
+    def mark_triggered(self):
+        self._last_trigger = time.time()
+        self.armed = False
+
+    def hold(self, sensor_fired, stopped_edge, hold_s, mode=None):
+        """
+        Dipanggil tiap frame selama lane ditahan (pengganti decide()). Edge berhenti dari update()
+        hanya muncul sekali, jadi disimpan sampai hold selesai; di mode confirm trigger sensor
+        tetap membuka jendela konfirmasi yang dihitung dari akhir hold.
+        """
+        mode = mode or TRIGGER_MODE
+        if stopped_edge:
+            self._held_edge = True
+        if mode == "confirm" and sensor_fired:
+            self._pending_until = time.time() + hold_s + self.confirm_window_s
+
+    def decide(self, sensor_fired, stopped_edge, mode=None):
+        """
+        Gabungkan sinyal sensor dan kamera sesuai mode. Dipanggil tiap frame.
+        Returns True kalau pipeline (YOLO + DeepFace) harus dijalankan sekarang.
+        """
+        mode = mode or TRIGGER_MODE
+        now = time.time()
+        # Edge yang tertahan selama hold / cooldown hanya berlaku kalau kendaraan masih berhenti
+        stopped_edge = stopped_edge or (self._held_edge and self.stopped and self.armed)
+
+        # Mode confirm: trigger sensor ditahan sebentar sampai kamera melihat kendaraan berhenti
+        if mode == "confirm" and sensor_fired:
+            self._pending_until = now + self.confirm_window_s
+            if not self.stopped:
+                print("⏳ Trigger sensor menunggu konfirmasi kamera...")
+
+        if self.in_cooldown():
+            if sensor_fired:
+                print("🔕 Trigger sensor diabaikan (cooldown)")
+            self._held_edge = stopped_edge
+            return False
+        self._held_edge = False
+
+        if mode == "sensor":
+            fire = sensor_fired
+        elif mode == "confirm":
+            fire = self.stopped and now <= self._pending_until
+        elif mode == "motion":
+            fire = stopped_edge
+        else:  # either
+            fire = sensor_fired or stopped_edge
+
+        if fire:
+            self._pending_until = 0.0
+            self.mark_triggered()
+        return fire
@@ -0,0 +1,213 @@
+# utils/plate_index.py
+import threading
+from collections import defaultdict
+
+# Pasangan karakter yang sering tertukar OCR -> dipetakan ke bentuk kanonik yang sama
+CANONICAL_CHARS = {
+    "8": "B",
+    "0": "O", "D": "O", "Q": "O",
+    "1": "I", "L": "I",
+    "5": "S",
+    "2": "Z",
+    "6": "G",
+    "4": "A",
+    "7": "T",
+}
+
+CONFUSION_COST = 0.5    # biaya substitusi antar karakter yang sering tertukar
+EDIT_COST = 1.0         # biaya insert / delete / substitusi biasa
+
+
+def normalize_plate(plate_text):
+    """Uppercase dan buang spasi / tanda baca."""
+    return "".join(ch for ch in plate_text.upper() if ch.isalnum())
+
+
+def canonical_plate(plate_text):
+    return "".join(CANONICAL_CHARS.get(ch, ch) for ch in normalize_plate(plate_text))
+
+
+def plate_distance(a, b):
+    """Edit distance berbobot: substitusi karakter yang mirip (8/B, 0/D, 1/I, ...) lebih murah."""
+    a, b = normalize_plate(a), normalize_plate(b)
+    prev = [j * EDIT_COST for j in range(len(b) + 1)]
+
+    for i, ca in enumerate(a, 1):
+        cur = [i * EDIT_COST]
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                sub = 0.0
+            elif CANONICAL_CHARS.get(ca, ca) == CANONICAL_CHARS.get(cb, cb):
+                sub = CONFUSION_COST
+            else:
+                sub = EDIT_COST
+            cur.append(min(prev[j] + EDIT_COST, cur[j - 1] + EDIT_COST, prev[j - 1] + sub))
+        prev = cur
+
+    return prev[-1]
+
+
+def _deletion_keys(text, max_edits):
+    """Semua varian text dengan maksimal max_edits karakter dihapus (gaya SymSpell)."""
+    keys = {text}
+    frontier = {text}
+    for _ in range(max_edits):
+        nxt = set()
+        for word in frontier:
+            for i in range(len(word)):
+                nxt.add(word[:i] + word[i + 1:])
+        keys |= nxt
+        frontier = nxt
+    return keys
+
+
+class PlateIndex:
+    """
+    Index in-memory plat yang masih active untuk lookup fuzzy.
+    Plat disimpan dalam bentuk kanonik (karakter mirip disamakan) plus varian hapus-karakter,
+    jadi lookup cukup beberapa dict lookup lalu verifikasi dengan plate_distance.
+    """
+
+    def __init__(self, max_edits=1):
+        self.max_edits = max_edits
+        self._lock = threading.Lock()
+        self._plate_by_id = {}                  # entry_id -> plate
+        self._ids_by_plate = defaultdict(set)   # plate -> {entry_id}
+        self._plates_by_key = defaultdict(set)  # deletion key -> {plate}
+
+    def __len__(self):
+        return len(self._plate_by_id)
+
+    def _index_plate(self, plate, plates_by_key=None):
+        plates_by_key = self._plates_by_key if plates_by_key is None else plates_by_key
+        for key in _deletion_keys(canonical_plate(plate), self.max_edits):
+            plates_by_key[key].add(plate)
+
+    def _unindex_plate(self, plate):
+        for key in _deletion_keys(canonical_plate(plate), self.max_edits):
+            plates = self._plates_by_key.get(key)
+            if plates is None:
+                continue
+            plates.discard(plate)
+            if not plates:
+                del self._plates_by_key[key]
+
+    def add(self, entry_id, plate_text):
+        plate = normalize_plate(plate_text)
+        if not plate:
+            return
+
+        with self._lock:
+            if entry_id in self._plate_by_id:
+                return
+            self._plate_by_id[entry_id] = plate
+            if not self._ids_by_plate[plate]:
+                self._index_plate(plate)
+            self._ids_by_plate[plate].add(entry_id)
+
+    def remove(self, entry_id):
+        with self._lock:
+            plate = self._plate_by_id.pop(entry_id, None)
+            if plate is None:
+                return
+
+            ids = self._ids_by_plate[plate]
+            ids.discard(entry_id)
+            if not ids:
+                del self._ids_by_plate[plate]
+                self._unindex_plate(plate)
+
+    def rebuild(self, entries):
+        """
+        entries: iterable (entry_id, plate_text) dari semua entry active.
+        Index baru dibangun di samping tanpa lock, lalu ditukar sekaligus: search() selama
+        rebuild melihat index lama yang lengkap, bukan index kosong / setengah jadi.
+        """
+        plate_by_id, ids_by_plate, plates_by_key = {}, defaultdict(set), defaultdict(set)
+        for entry_id, plate_text in entries:
+            plate = normalize_plate(plate_text)
+            if not plate or entry_id in plate_by_id:
+                continue
+            plate_by_id[entry_id] = plate
+            if not ids_by_plate[plate]:
+                self._index_plate(plate, plates_by_key)
+            ids_by_plate[plate].add(entry_id)
+
+        with self._lock:
+            self._plate_by_id = plate_by_id
+            self._ids_by_plate = ids_by_plate
+            self._plates_by_key = plates_by_key
+
+    def search(self, plate_text, max_distance=1.0, limit=5):
+        """
+        Cari plat active dalam jarak plate_distance <= max_distance.
+        Returns: list {plate, distance, ids} urut jarak terdekat
+        """
+        query = normalize_plate(plate_text)
+        if not query:
+            return []
+
+        with self._lock:
+            candidates = set()
+            for key in _deletion_keys(canonical_plate(query), self.max_edits):
+                candidates |= self._plates_by_key.get(key, set())
+
+            results = []
+            for plate in candidates:
+                distance = plate_distance(query, plate)
+                if distance <= max_distance:
+                    results.append({
+                        "plate": plate,
+                        "distance": distance,
+                        "ids": sorted(self._ids_by_plate[plate])
+                    })
+
+        results.sort(key=lambda r: (r["distance"], r["plate"]))
+        return results[:limit]
+
+
+# ================================ #
+#            BENCHMARK             #
+# ================================ #
+
+def _random_plate(rng):
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    prefix = rng.choice(["B", "D", "F", "AB", "BK", "DK", "L", "N"])
+    digits = str(rng.randint(1, 9999))
+    suffix = "".join(rng.choice(letters) for _ in range(rng.randint(0, 3)))
+    return prefix + digits + suffix
+
+
+def _misread(plate, rng):
+    """Simulasi salah baca OCR: satu substitusi karakter mirip atau satu karakter hilang."""
+    i = rng.randrange(len(plate))
+    swaps = {"B": "8", "8": "B", "0": "D", "D": "0", "1": "I", "I": "1", "5": "S", "S": "5"}
+    if plate[i] in swaps:
+        return plate[:i] + swaps[plate[i]] + plate[i + 1:]
+    return plate[:i] + plate[i + 1:]
+
+
+def benchmark(sizes=(10_000, 100_000), queries=2_000, seed=42):
+    import random
+    import time
+
+    rng = random.Random(seed)
+    for size in sizes:
+        plates = [_random_plate(rng) for _ in range(size)]
+
+        index = PlateIndex()
+        start = time.perf_counter()
+        index.rebuild((f"id-{i}", p) for i, p in enumerate(plates))
+        build_s = time.perf_counter() - start
+
+        probes = [_misread(rng.choice(plates), rng) for _ in range(queries)]
+        start = time.perf_counter()
+        hits = sum(1 for q in probes if index.search(q))
+        per_query_ms = (time.perf_counter() - start) * 1000 / queries
+
+        print(f"📊 {size:>7} plat active | build {build_s:.2f}s | "
+              f"query {per_query_ms:.3f} ms | hit {hits}/{queries}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,166 @@
+# utils/preview.py
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+# HEADLESS=1 -> tidak ada cv2.imshow / waitKey sama sekali (box lane tanpa monitor)
+HEADLESS = os.environ.get("HEADLESS", "0") == "1"
+# Preview MJPEG lewat HTTP lokal (0 = mati), contoh: PREVIEW_PORT=8090
+PREVIEW_PORT = int(os.environ.get("PREVIEW_PORT", "0"))
+PREVIEW_FPS = float(os.environ.get("PREVIEW_FPS", "5"))
+PREVIEW_WIDTH = int(os.environ.get("PREVIEW_WIDTH", "480"))
+PREVIEW_QUALITY = 70
+
+INDEX_HTML = b"""<!doctype html>
+<html><head><title>Live Preview</title></head>
+<body style="margin:0;background:#111"><img src="/stream.mjpg" style="width:100%"></body></html>"""
+
+
+class PreviewSink:
+    """
+    Preview kamera yang tidak pernah menahan loop utama:
+    - publish(frame) hanya menyimpan referensi frame terakhir (O(1), tanpa copy / encode)
+    - thread encoder mengambil frame terbaru maks. fps kali per detik, resize + encode JPEG
+    - server HTTP lokal mengirim JPEG terakhir: /snapshot.jpg atau /stream.mjpg (MJPEG)
+    Frame yang datang saat encoder sibuk langsung tertimpa (drop), bukan antri.
+    """
+
+    def __init__(self, port=PREVIEW_PORT, fps=PREVIEW_FPS, width=PREVIEW_WIDTH,
+                 host="127.0.0.1", quality=PREVIEW_QUALITY):
+        self.interval = 1.0 / max(0.1, fps)
+        self.width = width
+        self.quality = quality
+
+        self._frame = None
+        self._frame_seq = 0
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._cond = threading.Condition()
+        self._running = True
+
+        self._encoder = threading.Thread(target=self._encode_loop, daemon=True)
+        self._encoder.start()
+
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"🖥️ Preview: http://{host}:{port}/ (maks. {fps:g} fps, lebar {width}px)")
+
+    def publish(self, frame):
+        self._frame = frame
+        self._frame_seq += 1
+
+    def _encode_loop(self):
+        last_seq = 0
+        while self._running:
+            started = time.time()
+            frame, seq = self._frame, self._frame_seq
+            if frame is not None and seq != last_seq:
+                last_seq = seq
+                h, w = frame.shape[:2]
+                if w > self.width:
+                    frame = cv2.resize(frame, (self.width, int(h * self.width / w)),
+                                       interpolation=cv2.INTER_AREA)
+                ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if ok:
+                    with self._cond:
+                        self._jpeg = buf.tobytes()
+                        self._jpeg_seq += 1
+                        self._cond.notify_all()
+            time.sleep(max(0.0, self.interval - (time.time() - started)))
+
+    def wait_jpeg(self, last_seq, timeout=5.0):
+        """Tunggu JPEG yang lebih baru dari last_seq. Returns (seq, jpeg)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._jpeg_seq != last_seq or not self._running, timeout)
+            return self._jpeg_seq, self._jpeg
+
+    def _handler(self):
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/":
+                    self._send(200, "text/html", INDEX_HTML)
+                elif self.path == "/snapshot.jpg":
+                    _, jpeg = sink.wait_jpeg(-1, timeout=0)
+                    if jpeg is None:
+                        self._send(503, "text/plain", b"no frame yet")
+                    else:
+                        self._send(200, "image/jpeg", jpeg)
+                elif self.path == "/stream.mjpg":
+                    self._stream()
+                else:
+                    self._send(404, "text/plain", b"not found")
+
+            def _send(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                seq = 0
+                try:
+                    while sink._running:
+                        seq, jpeg = sink.wait_jpeg(seq)
+                        if jpeg is None:
+                            continue
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n")
+                        self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                        self.wfile.write(jpeg + b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # viewer ditutup
+
+        return Handler
+
+    def close(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class LiveView:
+    """
+    Pengganti cv2.imshow + cv2.waitKey di loop kamera.
+    headless=True: tidak ada panggilan GUI; berhenti lewat Ctrl+C.
+    preview_port: aktifkan PreviewSink (bisa bersamaan dengan window lokal).
+    """
+
+    def __init__(self, window="LIVE CAMERA", headless=HEADLESS, preview_port=PREVIEW_PORT):
+        self.window = window
+        self.headless = headless
+        self.sink = PreviewSink(port=preview_port) if preview_port else None
+        if headless:
+            print("🕶️ Mode headless: tanpa window kamera" + ("" if self.sink else ", tanpa preview"))
+
+    def show(self, frame):
+        if self.sink:
+            self.sink.publish(frame)
+        if not self.headless:
+            cv2.imshow(self.window, frame)
+
+    def should_quit(self):
+        """Tombol 'q' di window lokal. Di mode headless selalu False."""
+        if self.headless:
+            return False
+        return cv2.waitKey(1) & 0xFF == ord('q')
+
+    def close(self):
+        if self.sink:
+            self.sink.close()
+        if not self.headless:
+            cv2.destroyAllWindows()
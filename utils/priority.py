@@ -0,0 +1,250 @@
+# utils/priority.py
+# Penjadwalan berbasis prioritas antara pekerjaan live (validasi keluar, pengemudi menunggu
+# di palang) dan pekerjaan latar (backlog masuk, tulis artefak / grid, query histori).
+#
+# Tiga lapis:
+#   1. PriorityExecutor: antrian terpisah per kelas di dalam satu proses. Worker selalu
+#      mengambil kelas tertinggi dulu; kelas rendah dibatasi jumlah thread-nya (slot) supaya
+#      tidak pernah memakai semua thread.
+#   2. apply_thread_budget(role): partisi CPU antar proses. Proses live dan latar dipin ke
+#      core yang berbeda (sched_setaffinity), thread intra-op torch / TF / OpenCV mengikuti.
+#   3. Preemption di batas batch: proses latar (worker pool, reprocess dead-letter) memanggil
+#      yield_to_live() sebelum tiap file; selama lane keluar sedang memutuskan (penanda file
+#      "live sibuk"), batch berikutnya ditunda.
+# Waktu tunggu antrian dicatat per kelas (stats()).
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+PRIORITY_CLASSES = ("live", "normal", "background")  # urutan = prioritas
+
+SCHED_WORKERS = int(os.environ.get("SCHED_WORKERS", "4"))
+# Maks. thread bersamaan per kelas; live boleh memakai semua worker
+CLASS_SLOTS = {"live": SCHED_WORKERS, "normal": max(1, SCHED_WORKERS // 2), "background": 1}
+STATS_INTERVAL_S = 60.0
+WAIT_SAMPLES = 1000
+
+# Bagian core CPU untuk proses live (sisanya untuk proses latar)
+LIVE_CPU_SHARE = float(os.environ.get("LIVE_CPU_SHARE", "0.6"))
+BACKGROUND_NICE = 10
+
+LIVE_MARKER_PATH = os.path.join(os.path.dirname(__file__), "live_busy")
+LIVE_BUSY_TTL_S = 5.0   # penanda lebih tua dari ini dianggap basi (proses live crash)
+
+
+class _Job:
+    __slots__ = ("future", "fn", "args", "kwargs", "cls", "enqueued")
+
+    def __init__(self, future, fn, args, kwargs, cls):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cls = cls
+        self.enqueued = time.perf_counter()
+
+
+class PriorityExecutor:
+    """
+    Thread pool dengan antrian per kelas prioritas. submit() mengembalikan
+    concurrent.futures.Future, jadi bisa menggantikan ThreadPoolExecutor.submit().
+    """
+
+    def __init__(self, workers=SCHED_WORKERS, slots=None, name="sched"):
+        self.slots = dict(CLASS_SLOTS, **(slots or {}))
+        self._queues = {cls: deque() for cls in PRIORITY_CLASSES}
+        self._running = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._waits = {cls: deque(maxlen=WAIT_SAMPLES) for cls in PRIORITY_CLASSES}
+        self._counts = {cls: {"submitted": 0, "done": 0} for cls in PRIORITY_CLASSES}
+        self._last_report = time.monotonic()
+        self._threads = [threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _check_class(self, cls):
+        if cls not in self._queues:
+            raise ValueError(f"Kelas prioritas tidak dikenal: {cls} (pilih {PRIORITY_CLASSES})")
+
+    def submit(self, cls, fn, *args, **kwargs):
+        """Jalankan fn(*args, **kwargs) di kelas cls. Returns Future."""
+        self._check_class(cls)
+        future = Future()
+        self._enqueue(_Job(future, fn, args, kwargs, cls))
+        return future
+
+    def _enqueue(self, job):
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("PriorityExecutor sudah dimatikan")
+            self._queues[job.cls].append(job)
+            self._counts[job.cls]["submitted"] += 1
+            self._cond.notify()
+
+    def _next_job(self):
+        """Kelas tertinggi yang punya job dan belum melebihi slot-nya (dipanggil dengan lock)."""
+        for cls in PRIORITY_CLASSES:
+            if self._queues[cls] and self._running[cls] < self.slots[cls]:
+                return self._queues[cls].popleft()
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if self._shutdown and not any(self._queues.values()):
+                        return
+                    self._cond.wait()
+                    job = self._next_job()
+                self._running[job.cls] += 1
+                self._waits[job.cls].append((time.perf_counter() - job.enqueued) * 1000)
+
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.fn(*job.args, **job.kwargs))
+                except BaseException as e:
+                    job.future.set_exception(e)
+
+            with self._cond:
+                self._running[job.cls] -= 1
+                self._counts[job.cls]["done"] += 1
+                self._cond.notify_all()
+            self._maybe_report()
+
+    def stats(self):
+        """Per kelas: jumlah job, antrian, dan waktu tunggu antrian (ms)."""
+        with self._cond:
+            result = {}
+            for cls in PRIORITY_CLASSES:
+                waits = sorted(self._waits[cls])
+                result[cls] = dict(
+                    self._counts[cls],
+                    queued=len(self._queues[cls]),
+                    running=self._running[cls],
+                    wait_ms_p50=round(waits[len(waits) // 2], 2) if waits else 0.0,
+                    wait_ms_p95=round(waits[int(len(waits) * 0.95)], 2) if waits else 0.0,
+                    wait_ms_max=round(waits[-1], 2) if waits else 0.0
+                )
+            return result
+
+    def _maybe_report(self):
+        now = time.monotonic()
+        if now - self._last_report < STATS_INTERVAL_S:
+            return
+        self._last_report = now
+        parts = [f"{cls} {s['done']} job, tunggu p95 {s['wait_ms_p95']} ms"
+                 for cls, s in self.stats().items() if s["submitted"]]
+        if parts:
+            print(f"[SCHED] {' | '.join(parts)}")
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """PriorityExecutor bersama untuk proses ini (dibuat saat pertama dipakai)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = PriorityExecutor()
+            # Artefak yang masih antri tetap ditulis sebelum proses keluar
+            atexit.register(_executor.shutdown)
+        return _executor
+
+
+def submit_background(fn, *args, **kwargs):
+    """Pekerjaan yang boleh menunggu (tulis artefak, grid debug, query histori)."""
+    return get_executor().submit("background", fn, *args, **kwargs)
+
+
+# ---------- Partisi CPU antar proses ----------
+
+def cpu_partition(role, share=LIVE_CPU_SHARE):
+    """Core untuk role "live" / "background". Satu core saja -> dipakai bersama."""
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") \
+        else list(range(os.cpu_count() or 1))
+    if len(cpus) < 2:
+        return cpus
+    n_live = min(len(cpus) - 1, max(1, round(len(cpus) * share)))
+    return cpus[:n_live] if role == "live" else cpus[n_live:]
+
+
+def apply_thread_budget(role, nice=True):
+    """
+    Pin proses ke partisi core-nya dan samakan thread intra-op torch / TF / OpenCV dengan
+    jumlah core itu. Dipanggil sekali di awal proses, sebelum model dimuat.
+    Returns jumlah thread.
+    """
+    import cv2
+
+    cpus = cpu_partition(role)
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            print(f"⚠️ sched_setaffinity gagal: {e}")
+    threads = len(cpus)
+
+    from utils.yolo_runtime import configure_threads
+    configure_threads(threads)
+    cv2.setNumThreads(threads)
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1 if role == "background" else 2)
+    except (ImportError, RuntimeError):
+        pass  # TF tidak ada / runtime sudah jalan (hanya bisa diatur sebelum inisialisasi)
+
+    if role == "background" and nice:
+        try:
+            os.nice(BACKGROUND_NICE)
+        except (AttributeError, OSError):
+            pass
+
+    print(f"🧮 Thread budget {role}: {threads} thread, core {cpus}")
+    return threads
+
+
+# ---------- Penanda live sibuk (antar proses) ----------
+
+def mark_live_busy():
+    """Dipanggil proses live saat mulai memutuskan; proses latar mengalah di batas batch."""
+    with open(LIVE_MARKER_PATH, "a"):
+        os.utime(LIVE_MARKER_PATH)
+
+
+def clear_live_busy():
+    try:
+        os.remove(LIVE_MARKER_PATH)
+    except OSError:
+        pass
+
+
+def live_busy():
+    try:
+        return time.time() - os.path.getmtime(LIVE_MARKER_PATH) < LIVE_BUSY_TTL_S
+    except OSError:
+        return False
+
+
+def yield_to_live(max_wait_s=LIVE_BUSY_TTL_S, poll_s=0.05):
+    """Tunggu (maks. max_wait_s) selama lane live sibuk. Returns detik yang dipakai menunggu."""
+    started = time.monotonic()
+    while live_busy() and time.monotonic() - started < max_wait_s:
+        time.sleep(poll_s)
+    return time.monotonic() - started
@@ -0,0 +1,121 @@
+# utils/roi.py
+import os
+
+import numpy as np
+
+from utils.yolo_runtime import Boxes, OnnxYOLO
+
+# ROI per lane dalam koordinat relatif (x1, y1, x2, y2) terhadap frame kamera.
+# Kamera lane tetap, jadi plat & wajah pengemudi selalu muncul di area yang sama.
+# Override lewat environment, contoh: LANE_ROI_IN="0.1,0.2,0.9,1.0"
+# Tanpa ROI (full frame) deteksi cukup satu pass; dua tahap hanya dipakai kalau ROI diset.
+FULL_FRAME = (0.0, 0.0, 1.0, 1.0)
+DEFAULT_ROIS = {
+    "in": FULL_FRAME,
+    "out": FULL_FRAME,
+}
+
+COARSE_IMGSZ = 320   # pass kasar resolusi rendah untuk mencari region objek
+FINE_IMGSZ = 640     # pass detail hanya di region hasil pass kasar
+COARSE_CONF = 0.15   # threshold rendah: pass kasar cukup menemukan lokasi
+REGION_MARGIN = 0.15 # perbesar region (relatif ke ukuran region) agar objek tidak terpotong
+REGION_MIN_IMGSZ = 160
+# Region objek menutupi sebagian besar ROI -> pass detail per region tidak lebih murah dari satu
+# pass di ROI, jadi pass kasar dilewati untuk COARSE_REPROBE frame berikutnya di lane itu
+SKIP_COARSE_COVERAGE = 0.5
+COARSE_REPROBE = 20
+
+_skip_coarse = {}  # lane -> sisa frame tanpa pass kasar
+
+
+def lane_roi(lane):
+    env = os.environ.get(f"LANE_ROI_{lane.upper()}")
+    if env:
+        return tuple(float(v) for v in env.split(","))
+    return DEFAULT_ROIS.get(lane, FULL_FRAME)
+
+
+def _to_numpy(values):
+    return values.cpu().numpy() if hasattr(values, "cpu") else np.asarray(values)
+
+
+def _predict(model, image, imgsz, conf):
+    boxes = model(image, imgsz=imgsz, conf=conf, verbose=False)[0].boxes
+    return (_to_numpy(boxes.xyxy).astype(np.float32).reshape(-1, 4),
+            _to_numpy(boxes.conf).astype(np.float32).reshape(-1),
+            _to_numpy(boxes.cls).astype(np.float32).reshape(-1))
+
+
+def _single_pass(model, image, imgsz, conf, ox, oy):
+    xyxy, confs, cls = _predict(model, image, imgsz, conf)
+    xyxy += np.array([ox, oy, ox, oy], dtype=np.float32)
+    return xyxy, confs, cls
+
+
+def object_regions(xyxy, width, height, margin=REGION_MARGIN):
+    """Box pass kasar -> region per objek (+ margin, di-clamp); region yang overlap digabung."""
+    regions = []
+    for x1, y1, x2, y2 in xyxy:
+        mx, my = (x2 - x1) * margin, (y2 - y1) * margin
+        regions.append([int(max(0, x1 - mx)), int(max(0, y1 - my)),
+                        int(min(width, x2 + mx)), int(min(height, y2 + my))])
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [r for r in regions if r[2] > r[0] and r[3] > r[1]]
+
+
+def detect_in_roi(frame, model, lane=None, roi=None, conf=0.25,
+                  coarse_imgsz=COARSE_IMGSZ, fine_imgsz=FINE_IMGSZ):
+    """
+    Deteksi di dalam ROI lane:
+      - ROI tidak dikonfigurasi / model ONNX (input tetap, tiap pass sama mahal) / ROI kecil
+        -> satu pass detail di ROI (sama dengan deteksi biasa)
+      - selain itu: pass kasar (coarse_imgsz) untuk lokasi objek, lalu pass detail per region
+        objek (imgsz mengikuti ukuran region, maks. fine_imgsz)
+    Koordinat dikembalikan dalam frame asli (full resolution), jadi crop tetap tajam.
+    Returns: Boxes (xyxy, conf, cls) seperti result.boxes
+    """
+    h, w = frame.shape[:2]
+    roi = roi or (lane_roi(lane) if lane else FULL_FRAME)
+    rx1, ry1, rx2, ry2 = roi
+    ox, oy = int(rx1 * w), int(ry1 * h)
+    roi_img = frame[oy:int(ry2 * h), ox:int(rx2 * w)]
+    rh, rw = roi_img.shape[:2]
+
+    skip_left = _skip_coarse.get(lane, 0)
+    if tuple(roi) == FULL_FRAME or isinstance(model, OnnxYOLO) \
+            or max(rh, rw) <= coarse_imgsz * 1.5 or skip_left > 0:
+        _skip_coarse[lane] = max(0, skip_left - 1)
+        return Boxes(*_single_pass(model, roi_img, fine_imgsz, conf, ox, oy))
+
+    xyxy, _, _ = _predict(model, roi_img, coarse_imgsz, COARSE_CONF)
+    if len(xyxy) == 0:
+        return Boxes(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.float32))
+
+    regions = object_regions(xyxy, rw, rh)
+    sizes = [min(fine_imgsz, max(REGION_MIN_IMGSZ, -(-max(x2 - x1, y2 - y1) // 32) * 32))
+             for x1, y1, x2, y2 in regions]
+    coverage = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions) / float(rw * rh)
+    # Biaya inferensi ~ imgsz^2: per region harus lebih murah dari satu pass detail di ROI
+    if coverage >= SKIP_COARSE_COVERAGE or sum(s * s for s in sizes) >= fine_imgsz * fine_imgsz:
+        _skip_coarse[lane] = COARSE_REPROBE
+        return Boxes(*_single_pass(model, roi_img, fine_imgsz, conf, ox, oy))
+
+    parts = []
+    for (x1, y1, x2, y2), imgsz in zip(regions, sizes):
+        parts.append(_single_pass(model, roi_img[y1:y2, x1:x2], imgsz, conf, ox + x1, oy + y1))
+    return Boxes(np.concatenate([p[0] for p in parts]),
+                 np.concatenate([p[1] for p in parts]),
+                 np.concatenate([p[2] for p in parts]))
@@ -6,6 +6,18 @@ import time
 ser_instance = None
 _last_detect_time = 0  
 
+# Firmware lane masuk & keluar mengirim string yang berbeda
+SENSOR_LINES = ("VEHICLE DETECTED", "VEHICLE_DETECTED")
+
+
+def is_vehicle_line(line):
+    """
+    True kalau baris serial berisi event kendaraan terdeteksi (kedua format).
+    Dicocokkan sebagai substring seperti sebelumnya: firmware bisa menambah prefix / timestamp.
+    """
+    text = line.upper()
+    return any(marker in text for marker in SENSOR_LINES)
+
 
 def init_sensor(port='COM3'):
     """Init serial hanya sekali di awal."""
@@ -46,7 +58,7 @@ def sensor_detect_vehicle_continuous(port='COM3', debounce_ms=1500):
             except:
                 text = raw.decode('latin-1').strip()
 
-            if "VEHICLE_DETECTED" in text:
+            if is_vehicle_line(text):
                 now = time.time() * 1000
                 if now - _last_detect_time > debounce_ms:
                     _last_detect_time = now
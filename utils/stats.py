@@ -0,0 +1,332 @@
+# utils/stats.py
+# Statistik parkir inkremental untuk dashboard operator (tanpa scan tabel per request):
+#   - occupancy: kendaraan di dalam sekarang
+#   - histogram per jam (masuk / keluar per jam-dalam-hari + 24 jam terakhir)
+#   - dwell time: rata-rata + persentil lewat sketch log-bucket (akurasi relatif ~2%)
+#
+# Sumber update: event insert / exit di utils/cache_events.log yang ditulis oleh
+# insert_entry / mark_entry_exited / AsyncDBWriter. Saat startup dibangun ulang dari DB
+# sekali (satu query streaming), lalu hanya event baru yang dibaca.
+#
+#   python utils/stats.py      -> cek akurasi sketch + benchmark dengan event sintetis
+import math
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from utils.cache_channel import CacheChannel
+
+DWELL_ACCURACY = 0.02        # error relatif persentil dwell
+DWELL_MIN_S = 1.0            # dwell di bawah ini masuk bucket terkecil
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+EXITED_MEMORY = 10_000       # entry_id exit terakhir yang diingat (insert di-replay diabaikan)
+
+
+def to_epoch(value):
+    """entry_time / exit_time dari DB (datetime) atau event channel (string) -> epoch detik."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.strptime(str(value)[:19], TIME_FORMAT).timestamp()
+
+
+class DwellSketch:
+    """
+    Sketch kuantil dengan bucket logaritmik (gaya DDSketch): nilai x masuk bucket
+    ceil(log_gamma(x)). Jumlah bucket terbatas (~400 untuk 1 detik .. 30 hari), jadi
+    add() O(1) dan quantile() O(jumlah bucket) = konstan, tidak bergantung jumlah data.
+    """
+
+    def __init__(self, relative_accuracy=DWELL_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        value = max(DWELL_MIN_S, float(value))
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # Titik tengah bucket (gamma^(k-1), gamma^k] -> error relatif <= akurasi
+                return min(self.max, 2 * self.gamma ** key / (self.gamma + 1))
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class OccupancyStats:
+    """Agregat parkir yang diperbarui per event (O(1)); snapshot dibaca tanpa query DB."""
+
+    def __init__(self, channel=None):
+        self.channel = channel or CacheChannel()
+        self._lock = threading.Lock()
+        self.built = False
+        self._reset()
+
+    def _reset(self):
+        self.active = {}                # entry_id -> entry_time (epoch); len = occupancy
+        self._exited = {}               # entry_id exit terakhir (urut, dibatasi EXITED_MEMORY)
+        self.entries_total = 0
+        self.exits_total = 0
+        self.hour_of_day = [[0, 0] for _ in range(24)]   # [masuk, keluar] per jam 0..23
+        self._recent = [[-1, 0, 0] for _ in range(24)]   # ring 24 jam: [jam epoch, masuk, keluar]
+        self.dwell = DwellSketch()
+        self.last_event = None
+
+    # ---------- update inkremental ----------
+
+    def _count_hour(self, ts, column):
+        self.hour_of_day[datetime.fromtimestamp(ts).hour][column] += 1
+        hour = int(ts // 3600)
+        slot = self._recent[hour % 24]
+        if slot[0] != hour:
+            if slot[0] > hour:
+                return  # event lebih tua dari 24 jam terakhir
+            slot[:] = [hour, 0, 0]
+        slot[1 + column] += 1
+
+    def on_entry(self, entry_id, entry_time):
+        ts = to_epoch(entry_time) or time.time()
+        with self._lock:
+            if entry_id in self.active or entry_id in self._exited:
+                return  # event diulang (replay spool), termasuk insert yang sudah keluar
+            self.active[entry_id] = ts
+            self.entries_total += 1
+            self._count_hour(ts, 0)
+            self.last_event = max(self.last_event or ts, ts)
+
+    def on_exit(self, entry_id, exit_time, entry_time=None):
+        ts = to_epoch(exit_time) or time.time()
+        with self._lock:
+            entered = self.active.pop(entry_id, None)
+            if entered is None:
+                entered = to_epoch(entry_time)
+                if entered is None or entry_id in self._exited:
+                    return  # entry tidak dikenal / exit sudah dihitung
+            self._remember_exit(entry_id)
+            self.exits_total += 1
+            self._count_hour(ts, 1)
+            self.dwell.add(ts - entered)
+            self.last_event = max(self.last_event or ts, ts)
+
+    def _remember_exit(self, entry_id):
+        self._exited[entry_id] = True
+        while len(self._exited) > EXITED_MEMORY:
+            self._exited.pop(next(iter(self._exited)))
+
+    def sync(self):
+        """Terapkan event insert / exit baru dari channel. Returns jumlah event."""
+        count = 0
+        for event in self.channel.read_events():
+            if event.get("op") == "insert":
+                self.on_entry(event["id"], event.get("time"))
+                count += 1
+            elif event.get("op") == "exit":
+                self.on_exit(event["id"], event.get("time"))
+                count += 1
+        return count
+
+    def rebuild_from_db(self, batch_size=5000):
+        """Bangun ulang semua agregat dari tabel entries (sekali saat startup)."""
+        from utils.database import get_connection
+
+        # Posisi channel diambil dulu: event selama query di-replay (on_entry / on_exit idempotent)
+        self.channel.seek_end()
+        with self._lock:
+            self._reset()
+
+        conn = get_connection()
+        cursor = conn.cursor()
+        # Entry yang sudah diarsip (utils/archiver.py) tetap masuk histogram + dwell
+        cursor.execute("""
+        SELECT id, entry_time, exit_time, status FROM entries
+        UNION ALL
+        SELECT id, entry_time, exit_time, status FROM entries_archive
+        ORDER BY entry_time
+        """)
+        rows = 0
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for entry_id, entry_time, exit_time, status in batch:
+                self.on_entry(entry_id, entry_time)
+                if status == "exited":
+                    self.on_exit(entry_id, exit_time or entry_time)
+            rows += len(batch)
+        cursor.close()
+        conn.close()
+
+        self.built = True
+        print(f"[STATS] Dibangun ulang dari {rows} entry ({len(self.active)} di dalam)")
+        return rows
+
+    # ---------- snapshot (O(1)) ----------
+
+    def occupancy(self):
+        with self._lock:
+            return {
+                "inside": len(self.active),
+                "entries_total": self.entries_total,
+                "exits_total": self.exits_total,
+                "last_event": datetime.fromtimestamp(self.last_event).strftime(TIME_FORMAT)
+                if self.last_event else None
+            }
+
+    def hourly(self, now=None):
+        current = int((now or time.time()) // 3600)
+        with self._lock:
+            last_24h = []
+            for hour in range(current - 23, current + 1):
+                slot = self._recent[hour % 24]
+                entries, exits = (slot[1], slot[2]) if slot[0] == hour else (0, 0)
+                last_24h.append({
+                    "hour": datetime.fromtimestamp(hour * 3600).strftime("%Y-%m-%d %H:00"),
+                    "entries": entries,
+                    "exits": exits
+                })
+            return {
+                "hour_of_day": [{"hour": h, "entries": e, "exits": x}
+                                for h, (e, x) in enumerate(self.hour_of_day)],
+                "last_24h": last_24h
+            }
+
+    def dwell_stats(self, quantiles=DEFAULT_QUANTILES):
+        with self._lock:
+            mean = self.dwell.mean()
+            return {
+                "count": self.dwell.count,
+                "mean_s": round(mean, 1) if mean is not None else None,
+                "max_s": round(self.dwell.max, 1),
+                "percentiles_s": {f"p{round(q * 100, 1):g}": round(v, 1) if v is not None else None
+                                  for q in quantiles for v in [self.dwell.quantile(q)]},
+                "relative_accuracy": DWELL_ACCURACY
+            }
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def warm_stats():
+    """Bangun statistik di thread latar saat server start, bukan di request pertama."""
+    def build():
+        try:
+            get_stats()
+        except Exception as e:
+            print(f"[STATS] Gagal membangun statistik saat startup (dicoba lagi saat request): {e}")
+
+    thread = threading.Thread(target=build, name="stats-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_stats():
+    """OccupancyStats proses ini: dibangun dari DB saat pertama dipakai, lalu sync event baru."""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            stats = OccupancyStats()
+            stats.rebuild_from_db()
+            _stats = stats
+    _stats.sync()
+    return _stats
+
+
+def parse_quantiles(arg):
+    """Query ?q=50,90,99 (persen) atau ?q=0.5,0.9 -> tuple kuantil 0..1."""
+    if not arg:
+        return DEFAULT_QUANTILES
+    quantiles = []
+    for part in arg.split(","):
+        q = float(part)
+        q = q / 100 if q > 1 else q
+        if not 0 <= q <= 1:
+            raise ValueError(f"Kuantil di luar rentang: {part}")
+        quantiles.append(q)
+    return tuple(quantiles)
+
+
+def stats_payload(kind="all", quantiles=DEFAULT_QUANTILES):
+    """Data untuk endpoint /api/stats[/occupancy|/hourly|/dwell]."""
+    stats = get_stats()
+    if kind == "occupancy":
+        return stats.occupancy()
+    if kind == "hourly":
+        return stats.hourly()
+    if kind == "dwell":
+        return stats.dwell_stats(quantiles)
+    return {
+        "occupancy": stats.occupancy(),
+        "hourly": stats.hourly(),
+        "dwell": stats.dwell_stats(quantiles)
+    }
+
+
+def benchmark(n=200_000, seed=0):
+    """Event sintetis: akurasi persentil sketch vs sort penuh, dan biaya per event / snapshot."""
+    rng = random.Random(seed)
+    stats = OccupancyStats(channel=CacheChannel(os.devnull))
+    start = time.time() - n * 30
+    exact = []
+
+    t0 = time.perf_counter()
+    for i in range(n):
+        entered = start + i * 30
+        stats.on_entry(i, entered)
+        if rng.random() < 0.9:
+            dwell = rng.lognormvariate(8, 1)  # median ~50 menit
+            stats.on_exit(i, entered + dwell)
+            exact.append(max(DWELL_MIN_S, dwell))
+    update_us = (time.perf_counter() - t0) / n * 1e6
+
+    t0 = time.perf_counter()
+    for _ in range(100):
+        stats.occupancy(), stats.hourly(), stats.dwell_stats()
+    snapshot_ms = (time.perf_counter() - t0) / 100 * 1000
+
+    # Replay spool: insert untuk entry yang sudah keluar tidak boleh menambah occupancy
+    inside = stats.occupancy()["inside"]
+    for i in range(n - 1000, n):
+        stats.on_entry(i, start + i * 30)
+    assert stats.occupancy()["inside"] == inside, "insert yang di-replay menghidupkan entry exited"
+
+    exact.sort()
+    print(f"📊 {n} entry, {stats.occupancy()['inside']} di dalam, {len(stats.dwell.buckets)} bucket sketch")
+    for q in DEFAULT_QUANTILES:
+        truth = exact[int(q * (len(exact) - 1))]
+        estimate = stats.dwell.quantile(q)
+        print(f"   p{q * 100:g}: sketch {estimate:.0f} s vs exact {truth:.0f} s "
+              f"(error {abs(estimate - truth) / truth:.2%})")
+    print(f"   update {update_us:.1f} µs/event, snapshot {snapshot_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    benchmark()
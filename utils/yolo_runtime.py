@@ -0,0 +1,177 @@
+# utils/yolo_runtime.py
+import os
+import ast
+
+import cv2
+import numpy as np
+
+# Backend YOLO: "pt" (PyTorch, default), "onnx", atau "onnx-int8"
+YOLO_BACKEND = os.environ.get("YOLO_BACKEND", "pt")
+# Jumlah thread inferensi CPU (None = default runtime)
+YOLO_THREADS = int(os.environ["YOLO_THREADS"]) if os.environ.get("YOLO_THREADS") else None
+
+ONNX_SUFFIX = {"onnx": ".onnx", "onnx-int8": ".int8.onnx"}
+
+
+def letterbox(image, size):
+    """Resize dengan rasio tetap + padding abu-abu (114) ke size x size, seperti ultralytics."""
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+    bottom, right = size - new_h - top, size - new_w - left
+    padded = cv2.copyMakeBorder(resized, top, bottom, left, right,
+                                cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return padded, scale, (left, top)
+
+
+def nms(boxes, scores, classes, iou_threshold):
+    """NMS per kelas (offset box per kelas supaya kelas berbeda tidak saling menekan)."""
+    offset = classes[:, None] * 7680.0
+    b = boxes + offset
+    x1, y1, x2, y2 = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+        order = order[1:][iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class Boxes:
+    """Meniru ultralytics Boxes: atribut array (xyxy, conf, cls) + iterasi per box."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __getitem__(self, i):
+        return Boxes(self.xyxy[i:i + 1], self.conf[i:i + 1], self.cls[i:i + 1])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class YoloResult:
+    def __init__(self, orig_img, boxes, names):
+        self.orig_img = orig_img
+        self.boxes = boxes
+        self.names = names
+
+    def plot(self):
+        """Gambar box + label di atas salinan gambar asli."""
+        img = self.orig_img.copy()
+        for (x1, y1, x2, y2), conf, cls in zip(self.boxes.xyxy.astype(int), self.boxes.conf, self.boxes.cls):
+            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(img, f"{self.names[int(cls)]} {conf:.2f}", (x1, max(0, y1 - 4)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        return img
+
+
+class OnnxYOLO:
+    """
+    Adapter YOLOv8 ONNX (onnxruntime CPU) dengan interface yang sama seperti ultralytics YOLO:
+    model(frame, conf=..., verbose=False) -> [result] dengan result.boxes dan result.plot(),
+    plus model.names. Input shape tetap (imgsz dari export).
+    """
+
+    def __init__(self, onnx_path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = int(self.session.get_inputs()[0].shape[2])
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(meta["names"]) if "names" in meta else {}
+
+    def __call__(self, source, conf=0.25, iou=0.7, verbose=True, **kwargs):
+        image = source if isinstance(source, np.ndarray) else cv2.imread(source)
+
+        padded, scale, (pad_x, pad_y) = letterbox(image, self.imgsz)
+        blob = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[np.newaxis]
+        blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+
+        # Output YOLOv8: [1, 4 + num_classes, num_anchors] (cx, cy, w, h, skor kelas...)
+        pred = self.session.run(None, {self.input_name: blob})[0][0].T
+        scores = pred[:, 4:]
+        cls = scores.argmax(axis=1)
+        confs = scores[np.arange(len(cls)), cls]
+
+        mask = confs >= conf
+        pred, cls, confs = pred[mask], cls[mask], confs[mask]
+
+        cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+        xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+        keep = nms(xyxy, confs, cls, iou) if len(confs) else np.array([], dtype=np.int64)
+        xyxy, confs, cls = xyxy[keep], confs[keep], cls[keep]
+
+        # Kembalikan koordinat ke gambar asli
+        xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - pad_x) / scale
+        xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - pad_y) / scale
+        hh, ww = image.shape[:2]
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, ww)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, hh)
+
+        if verbose:
+            print(f"[ONNX] {len(confs)} objek terdeteksi")
+
+        boxes = Boxes(xyxy.astype(np.float32), confs.astype(np.float32), cls.astype(np.float32))
+        return [YoloResult(image, boxes, self.names)]
+
+
+def configure_threads(num_threads):
+    """Batasi thread PyTorch untuk backend .pt (ONNX diatur lewat SessionOptions)."""
+    if not num_threads:
+        return
+    os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+
+def load_yolo(pt_path, backend=None, num_threads=None):
+    """
+    Load model YOLO sesuai backend. Untuk ONNX, file hasil utils/export_models.py dicari
+    di sebelah file .pt (detection.onnx / detection.int8.onnx); kalau tidak ada, pakai .pt.
+    """
+    backend = backend or YOLO_BACKEND
+    num_threads = num_threads or YOLO_THREADS
+
+    if backend in ONNX_SUFFIX:
+        onnx_path = os.path.splitext(pt_path)[0] + ONNX_SUFFIX[backend]
+        if os.path.exists(onnx_path):
+            print(f"✅ YOLO {backend}: {os.path.basename(onnx_path)}")
+            return OnnxYOLO(onnx_path, num_threads)
+        print(f"⚠️ {os.path.basename(onnx_path)} tidak ada, fallback ke .pt")
+
+    from ultralytics import YOLO
+
+    configure_threads(num_threads)
+    return YOLO(pt_path)